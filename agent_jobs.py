@@ -0,0 +1,109 @@
+import os
+import time
+import uuid
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+AGENT_MAX_CONCURRENCY = int(os.getenv("AGENT_MAX_CONCURRENCY", "8"))
+JOB_TTL_SECONDS = int(os.getenv("AGENT_JOB_TTL_SECONDS", "600"))
+
+
+class AgentJob:
+    """
+    A running agent request: its events are queued as they are produced.
+    """
+
+    def __init__(self, job_id: str, owner: str = None):
+        self.job_id = job_id
+        self.owner = owner
+        self.events = queue.Queue()
+        self.created_at = time.time()
+        self.done = False
+
+
+class AgentJobRunner:
+    """
+    Runs agent requests on a bounded thread pool so HTTP workers are not blocked.
+
+    `submit` starts a job and returns its id right away; `events` follows the job and
+    yields each event produced by the event generator, ending with {'event': 'done'}. A job
+    submitted with an owner (the session user_id) is only streamed to that owner.
+
+    Jobs live in the memory of the process that started them: the app must run as a single
+    process (one gunicorn worker, with threads for concurrency), or `/stream/<job_id>` may
+    land on a worker that does not know the job.
+    """
+
+    def __init__(self, max_workers: int = AGENT_MAX_CONCURRENCY, ttl_seconds: int = JOB_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="agent-job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, event_source, *args, on_event=None, owner: str = None) -> str:
+        """
+        Starts a job.
+
+        Args:
+            event_source (callable): Generator function yielding the job events.
+            *args: Arguments of `event_source`.
+            on_event (callable, optional): Called with each event before it is queued;
+                its return value, if not None, replaces the event.
+            owner (str, optional): Owner of the job; `events` requires the same owner.
+
+        Returns:
+            str: The job id.
+        """
+        job = AgentJob(uuid.uuid4().hex, owner)
+        with self._lock:
+            self._evict_expired()
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, event_source, args, on_event)
+        return job.job_id
+
+    def _run(self, job, event_source, args, on_event):
+        try:
+            for event in event_source(*args):
+                if on_event is not None:
+                    event = on_event(event) or event
+                job.events.put(event)
+        except Exception as e:
+            print(f"Agent job {job.job_id} failed: {e}")
+            job.events.put({"event": "error", "content": str(e)})
+        finally:
+            job.done = True
+            job.events.put({"event": "done"})
+
+    def events(self, job_id: str, owner: str = None, heartbeat_seconds: float = 15.0):
+        """
+        Yields the events of a job as they are produced. While the job is idle a
+        {'event': 'heartbeat'} is yielded every `heartbeat_seconds`. The stream always ends
+        with {'event': 'done'}, also for unknown or expired jobs and for jobs of another owner
+        (reported as unknown, so job ids of other sessions cannot be probed).
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            yield {"event": "error", "content": "Unknown job."}
+            yield {"event": "done"}
+            return
+        while True:
+            try:
+                event = job.events.get(timeout=heartbeat_seconds)
+            except queue.Empty:
+                yield {"event": "heartbeat"}
+                continue
+            yield event
+            if event["event"] == "done":
+                with self._lock:
+                    self._jobs.pop(job_id, None)
+                return
+
+    def _evict_expired(self):
+        now = time.time()
+        for job_id in [j for j, job in self._jobs.items() if now - job.created_at > self.ttl_seconds]:
+            del self._jobs[job_id]
+
+
+job_runner = AgentJobRunner()
@@ -1,17 +1,192 @@
 import pandas as pd
 import numpy as np
 import random
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
+from typing import TYPE_CHECKING
+from agents.model_registry import registry
+from agents.prediction_cache import memoize_prediction
+from db.ingest import data_versions
+from tracing import tracer
 
+if TYPE_CHECKING:
+    from sklearn.ensemble import RandomForestRegressor
 
 
-def predict_overdue_risk(df_receivable: pd.DataFrame, increase_only: bool = True) -> str:
+OVERDUE_FEATURES = ['dso', 'sales', 'cei', 'art', 'month', 'year', 'country_encoded']
+OVERDUE_TARGET = 'overdue_ratio'
+
+LIQUIDITY_FEATURES = ['month', 'year', 'country_encoded', 'due_interval_encoded']
+LIQUIDITY_TARGET = 'working_capital'
+
+CATEGORY_COLUMNS = ['country', 'due_interval']
+
+
+def prepare_receivable_features(df_receivable: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the overdue ratio and calendar columns used by the overdue risk model.
+    """
+    df = df_receivable.copy()
+    month_year = pd.to_datetime(df['month_year'])
+    df['overdue_ratio'] = df['overdue'] / df['trades_receivable']
+    df['month'] = month_year.dt.month
+    df['year'] = month_year.dt.year
+    return df
+
+
+def prepare_working_capital_features(df_working_capital: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds the calendar columns used by the liquidity risk model.
+    """
+    df = df_working_capital.copy()
+    month_year = pd.to_datetime(df['month_year'])
+    df['month'] = month_year.dt.month
+    df['year'] = month_year.dt.year
+    return df
+
+
+def category_columns(features: list) -> list:
+    """Returns the category columns whose codes are model features."""
+    return [column for column in CATEGORY_COLUMNS if f'{column}_encoded' in features]
+
+
+def fit_categories(df: pd.DataFrame, columns: list) -> dict:
+    """
+    Builds the vocabulary of each category column: its sorted distinct values.
+    """
+    return {column: sorted(df[column].dropna().unique().tolist()) for column in columns}
+
+
+def encode_categories(df: pd.DataFrame, categories: dict) -> pd.DataFrame:
+    """
+    Adds the `<column>_encoded` columns using the vocabulary persisted with a model.
+
+    The code of a value is its position in the vocabulary, so codes do not depend on which
+    rows were loaded. Values outside the vocabulary get the unknown code -1. A column may also be
+    the index of `df` (e.g. the country index of the next-month rows).
+    """
+    for column, vocabulary in categories.items():
+        values = df.index if df.index.name == column else df[column]
+        df[f'{column}_encoded'] = pd.Categorical(values, categories=vocabulary).codes.astype(int)
+    return df
+
+
+def fit_regressor(df: pd.DataFrame, features: list, target: str) -> "RandomForestRegressor":
+    """
+    Trains the Random Forest used by the forecasting tools on a prepared DataFrame.
+    """
+    # Imported here: scikit-learn takes over a second to import and is only needed to train
+    # (registered models load it when they are unpickled).
+    from sklearn.ensemble import RandomForestRegressor
+    from sklearn.model_selection import train_test_split
+
+    X = df[features]
+    y = df[target]
+
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, random_state=42
+    )
+
+    model = RandomForestRegressor(n_estimators=100, random_state=42)
+    with tracer.span("model.fit", target=target) as span:
+        span.set("model.rows", len(X_train))
+        model.fit(X_train, y_train)
+    return model
+
+
+def fit_forecast_model(df: pd.DataFrame, features: list, target: str, categories: dict) -> dict:
+    """
+    Trains a forecasting model and bundles it with its category vocabulary.
+
+    The returned artifact is a plain dict ({'model', 'categories'}) so it can be loaded with
+    joblib alone, e.g. by the Azure Function.
+    """
+    df = encode_categories(df.copy(), categories)
+    return {"model": fit_regressor(df, features, target), "categories": categories}
+
+
+def train_from_store(table_name: str, features: list, target: str, store) -> dict:
+    """
+    Trains a forecasting model on the materialized features of a table.
+
+    Only the raw feature, category and target columns are read. The vocabulary is the
+    append-only one of the feature store, so codes stay the same across retrainings.
+    """
+    columns = category_columns(features)
+    raw_features = [feature for feature in features if feature not in {f'{c}_encoded' for c in columns}]
+    history = store.read(table_name, raw_features + columns + [target])
+    return fit_forecast_model(history, features, target, {column: store.categories(column) for column in columns})
+
+
+def next_month_features(df: pd.DataFrame, next_month: pd.Timestamp) -> pd.DataFrame:
+    """
+    Builds the next-month feature matrix for every country in a single pass.
+
+    The latest row of each country is taken with one groupby over the frame sorted by
+    `month_year` and its calendar features are moved to `next_month`. Rows keep the order
+    in which the countries first appear in `df`.
+    """
+    last_rows = (
+        df.sort_values('month_year', kind='stable')
+        .groupby('country', sort=False)
+        .tail(1)
+        .set_index('country')
+        .reindex(df['country'].unique())
+    )
+    last_rows['month'] = next_month.month
+    last_rows['year'] = next_month.year
+    return last_rows
+
+
+def forecast_inputs(table_name: str, df: pd.DataFrame, prepare, features: list, target: str, store=None) -> tuple:
+    """
+    Returns the model and the next-month feature rows of a forecast.
+
+    With a feature store, `df` only sets the scope of the forecast (its countries and latest
+    month): the store is brought up to date, the latest materialized row of each country is read
+    and, on a registry miss, the model is trained on the feature/target columns of the store.
+    Without one, the features are computed from `df` itself. Either way the categories of the
+    next-month rows are encoded with the vocabulary stored with the model.
+
+    Returns:
+    --------
+    tuple
+        (model, last_rows, next_month), with `last_rows` indexed by country.
+    """
+    latest_month = pd.to_datetime(df['month_year'].max())
+    next_month = latest_month + pd.DateOffset(months=1)
+
+    if store is not None:
+        store.refresh(table_name)
+        artifact = registry.get_or_train(
+            table_name, features, store.fingerprint(table_name),
+            lambda: train_from_store(table_name, features, target, store),
+        )
+        last_rows = store.latest_rows(table_name, df['country'].unique(), latest_month)
+        last_rows['month'] = next_month.month
+        last_rows['year'] = next_month.year
+    else:
+        df = prepare(df)
+        # Keyed by the ingestion version of the table, not by the content of the query frame: the
+        # queries over one version share a model instead of retraining and evicting each other.
+        artifact = registry.get_or_train(
+            table_name, features, f"v{data_versions().get(table_name, 0)}",
+            lambda: fit_forecast_model(df, features, target, fit_categories(df, category_columns(features))),
+        )
+        last_rows = next_month_features(df, next_month)
+
+    last_rows = encode_categories(last_rows, artifact["categories"])
+    return artifact["model"], last_rows, next_month
+
+
+@memoize_prediction("trades_receivable")
+def predict_overdue_risk(df_receivable: pd.DataFrame, increase_only: bool = True, store=None) -> str:
     """
     Predicts future overdue risk based on the ratio of overdue amounts to total accounts receivable.
 
-    This function trains a regression model (Random Forest) using historical receivables data
-    to forecast the overdue ratio for the next month, for each country.
+    This function uses a regression model (Random Forest) trained on historical receivables data
+    to forecast the overdue ratio for the next month, for each country. The model is fetched from
+    the model registry and only trained when the data fingerprint changes. When a feature store is
+    given, the features are read from it instead of being computed over `df_receivable`. Reports
+    are memoized by the content of `df_receivable`, the parameters and the store snapshot.
 
     Parameters:
     -----------
@@ -23,6 +198,9 @@ def predict_overdue_risk(df_receivable: pd.DataFrame, increase_only: bool = True
         If True, returns only countries where the predicted overdue ratio increases.
         If False, returns all countries with current and predicted values.
 
+    store : FeatureStore, optional (default=None)
+        Materialized features of the ledger (see `db.feature_store`).
+
     Returns:
     --------
     str
@@ -30,55 +208,39 @@ def predict_overdue_risk(df_receivable: pd.DataFrame, increase_only: bool = True
         with increased risk, including current, predicted values, and percentage change.
     """
 
-    df = df_receivable.copy()
-    df['overdue_ratio'] = df['overdue'] / df['trades_receivable']
-    df['month'] = pd.to_datetime(df['month_year']).dt.month
-    df['year'] = pd.to_datetime(df['month_year']).dt.year
-    df['country_encoded'] = df['country'].astype('category').cat.codes
-
-    features = ['dso', 'sales', 'cei', 'art', 'month', 'year', 'country_encoded']
-    target = 'overdue_ratio'
-
-    X = df[features]
-    y = df[target]
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
+    features = OVERDUE_FEATURES
+    model, last_rows, next_month = forecast_inputs(
+        "trades_receivable", df_receivable, prepare_receivable_features, features, OVERDUE_TARGET, store
     )
 
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-
-    latest_month = pd.to_datetime(df['month_year'].max())
-    next_month = latest_month + pd.DateOffset(months=1)
-
     result = f"⚠️ *Overdue Risk Forecast* for {next_month.strftime('%B/%Y')}:\n\n"
 
-    for country in df['country'].unique():
-        last_row = df[df['country'] == country].sort_values('month_year').iloc[-1].copy()
-        last_ratio = last_row['overdue_ratio']
-
-        last_row['month'] = next_month.month
-        last_row['year'] = next_month.year
-        X_pred = pd.DataFrame([last_row[features]])
-        predicted_ratio = model.predict(X_pred)[0]
-
-        delta = predicted_ratio - last_ratio
-        if increase_only and delta <= 0:
-            continue
+    last_ratios = last_rows['overdue_ratio'].to_numpy()
+    with tracer.span("model.predict", target=OVERDUE_TARGET) as span:
+        span.set("model.rows", len(last_rows))
+        predicted_ratios = model.predict(last_rows[features])
+    deltas = predicted_ratios - last_ratios
 
+    selected = deltas > 0 if increase_only else np.ones(len(deltas), dtype=bool)
+    for country, last_ratio, predicted_ratio, delta in zip(
+        last_rows.index[selected], last_ratios[selected], predicted_ratios[selected], deltas[selected]
+    ):
         emoji = "🔺" if delta > 0 else "✅"
         result += f"{emoji} {country}: from {last_ratio:.2%} to {predicted_ratio:.2%} ({delta:+.2%})\n"
 
     return result.strip()
 
 
-def forecast_liquidity_risk(df_working_capital: pd.DataFrame, threshold: float = 0.0) -> str:
+@memoize_prediction("working_capital")
+def forecast_liquidity_risk(df_working_capital: pd.DataFrame, threshold: float = 0.0, store=None) -> str:
     """
     Forecasts liquidity risk based on historical working capital by country.
 
-    The function trains a regression model to predict working capital for the next month.
-    Countries with predictions below a specified threshold are flagged as being at liquidity risk.
+    The function uses a regression model to predict working capital for the next month. The model
+    is fetched from the model registry and only trained when the data fingerprint changes; when a
+    feature store is given, the features are read from it. Reports are memoized by the content of
+    the frame, the parameters and the store snapshot. Countries with predictions below a
+    specified threshold are flagged as being at liquidity risk.
 
     Parameters:
     -----------
@@ -90,6 +252,9 @@ def forecast_liquidity_risk(df_working_capital: pd.DataFrame, threshold: float =
         Minimum expected working capital. Countries with forecasts below this value
         will be flagged as at liquidity risk.
 
+    store : FeatureStore, optional (default=None)
+        Materialized features of the ledger (see `db.feature_store`).
+
     Returns:
     --------
     str
@@ -97,45 +262,26 @@ def forecast_liquidity_risk(df_working_capital: pd.DataFrame, threshold: float =
         including actual, predicted values and their difference.
     """
 
-    df = df_working_capital.copy()
-    df['month'] = pd.to_datetime(df['month_year']).dt.month
-    df['year'] = pd.to_datetime(df['month_year']).dt.year
-    df['country_encoded'] = df['country'].astype('category').cat.codes
-    df['due_interval_encoded'] = df['due_interval'].astype('category').cat.codes
-
-    features = ['month', 'year', 'country_encoded', 'due_interval_encoded']
-    target = 'working_capital'
-
-    X = df[features]
-    y = df[target]
-
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42
+    features = LIQUIDITY_FEATURES
+    model, last_rows, next_month = forecast_inputs(
+        "working_capital", df_working_capital, prepare_working_capital_features, features, LIQUIDITY_TARGET, store
     )
 
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
-    model.fit(X_train, y_train)
-
-    latest_month = pd.to_datetime(df['month_year'].max())
-    next_month = latest_month + pd.DateOffset(months=1)
-
     result = f"🔍 *Liquidity Risk Forecast* for {next_month.strftime('%B/%Y')} (threshold = {threshold}):\n\n"
 
-    for country in df['country'].unique():
-        last_row = df[df['country'] == country].sort_values('month_year').iloc[-1].copy()
-        last_value = last_row['working_capital']
-
-        last_row['month'] = next_month.month
-        last_row['year'] = next_month.year
-        X_pred = pd.DataFrame([last_row[features]])
-        predicted_value = model.predict(X_pred)[0]
-
-        delta = predicted_value - last_value
-
-        if predicted_value < threshold:
-            result += (
-                f"⚠️ {country}: {last_value:,.2f} → {predicted_value:,.2f} "
-                f"({delta:+,.2f}) → liquidity risk\n"
-            )
+    last_values = last_rows['working_capital'].to_numpy()
+    with tracer.span("model.predict", target=LIQUIDITY_TARGET) as span:
+        span.set("model.rows", len(last_rows))
+        predicted_values = model.predict(last_rows[features])
+    deltas = predicted_values - last_values
+
+    at_risk = predicted_values < threshold
+    for country, last_value, predicted_value, delta in zip(
+        last_rows.index[at_risk], last_values[at_risk], predicted_values[at_risk], deltas[at_risk]
+    ):
+        result += (
+            f"⚠️ {country}: {last_value:,.2f} → {predicted_value:,.2f} "
+            f"({delta:+,.2f}) → liquidity risk\n"
+        )
 
     return result.strip()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import os
+import sqlite3
+import threading
+from collections import defaultdict
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+
+CHECKPOINT_DB = os.getenv("AGENT_CHECKPOINT_DB", "db/checkpoints.db")
+CHECKPOINT_KEEP_LAST = int(os.getenv("AGENT_CHECKPOINT_KEEP_LAST", "20"))
+CHECKPOINT_MAX_BYTES = int(os.getenv("AGENT_CHECKPOINT_MAX_BYTES", str(256 * 1024 * 1024)))
+
+
+class CompactingSqliteSaver(SqliteSaver):
+    """
+    LangGraph checkpointer backed by a local SQLite file in WAL mode.
+
+    Several worker processes can share the same file, so conversation state survives restarts
+    and is visible to every worker. Every `compact_every` checkpoints of a thread, only its
+    `keep_last` most recent checkpoints (and their pending writes) are kept; the database is
+    then capped at `max_bytes` of live pages by evicting the least recently active threads.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_DB, keep_last: int = CHECKPOINT_KEEP_LAST,
+                 max_bytes: int = CHECKPOINT_MAX_BYTES, compact_every: int = 10):
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        super().__init__(conn)
+        self.keep_last = keep_last
+        self.max_bytes = max_bytes
+        self.compact_every = compact_every
+        self._puts = defaultdict(int)
+        self._puts_lock = threading.Lock()
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        thread_id = str(config["configurable"]["thread_id"])
+        with self._puts_lock:
+            self._puts[thread_id] += 1
+            should_compact = self._puts[thread_id] % self.compact_every == 0
+        if should_compact:
+            self.compact(thread_id)
+            self.enforce_size_cap()
+        return next_config
+
+    def compact(self, thread_id: str):
+        """
+        Keeps only the `keep_last` most recent checkpoints of a thread, per namespace.
+        """
+        with self.cursor() as cur:
+            cur.execute(
+                """
+                DELETE FROM checkpoints
+                WHERE thread_id = ? AND checkpoint_id NOT IN (
+                    SELECT checkpoint_id FROM checkpoints AS recent
+                    WHERE recent.thread_id = checkpoints.thread_id
+                      AND recent.checkpoint_ns = checkpoints.checkpoint_ns
+                    ORDER BY checkpoint_id DESC LIMIT ?
+                )
+                """,
+                (thread_id, self.keep_last),
+            )
+            cur.execute(
+                """
+                DELETE FROM writes
+                WHERE thread_id = ? AND NOT EXISTS (
+                    SELECT 1 FROM checkpoints AS c
+                    WHERE c.thread_id = writes.thread_id
+                      AND c.checkpoint_ns = writes.checkpoint_ns
+                      AND c.checkpoint_id = writes.checkpoint_id
+                )
+                """,
+                (thread_id,),
+            )
+
+    def live_bytes(self) -> int:
+        """Returns the size of the pages in use by the database."""
+        with self.cursor(transaction=False) as cur:
+            page_size = cur.execute("PRAGMA page_size").fetchone()[0]
+            page_count = cur.execute("PRAGMA page_count").fetchone()[0]
+            freelist_count = cur.execute("PRAGMA freelist_count").fetchone()[0]
+        return (page_count - freelist_count) * page_size
+
+    def enforce_size_cap(self):
+        """
+        Evicts the least recently active threads while the database exceeds `max_bytes`.
+        """
+        while self.live_bytes() > self.max_bytes:
+            with self.cursor(transaction=False) as cur:
+                row = cur.execute(
+                    "SELECT thread_id FROM checkpoints GROUP BY thread_id ORDER BY MAX(checkpoint_id) LIMIT 1"
+                ).fetchone()
+            if row is None:
+                break
+            self.delete_thread(row[0])
+        with self.cursor() as cur:
+            cur.execute("PRAGMA incremental_vacuum")
+
+    def delete_thread(self, thread_id: str):
+        """
+        Deletes every checkpoint and pending write of a thread.
+        """
+        with self.cursor() as cur:
+            cur.execute("DELETE FROM checkpoints WHERE thread_id = ?", (str(thread_id),))
+            cur.execute("DELETE FROM writes WHERE thread_id = ?", (str(thread_id),))
+        with self._puts_lock:
+            self._puts.pop(str(thread_id), None)
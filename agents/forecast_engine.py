@@ -0,0 +1,219 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+from agents.agent_predict_tools import (
+    OVERDUE_FEATURES, OVERDUE_TARGET, LIQUIDITY_FEATURES, LIQUIDITY_TARGET,
+    category_columns, encode_categories, fit_forecast_model,
+)
+from agents.model_registry import registry
+
+
+FORECAST_HORIZONS = (3, 6, 12)
+FORECAST_N_JOBS = int(os.getenv("FORECAST_N_JOBS", "-1"))
+# Grids smaller than this per worker are predicted in-process: a pool would cost more than it saves.
+MIN_ROWS_PER_JOB = int(os.getenv("FORECAST_MIN_ROWS_PER_JOB", "4096"))
+
+FORECAST_MODELS = {
+    "trades_receivable": (OVERDUE_FEATURES, OVERDUE_TARGET),
+    "working_capital": (LIQUIDITY_FEATURES, LIQUIDITY_TARGET),
+}
+
+# Models loaded by each pool worker, memory-mapped from the registry artifact.
+_worker_models = {}
+
+
+def _predict_chunk(model_path: str, X: np.ndarray, features: list, start: int, stop: int) -> np.ndarray:
+    model = _worker_models.get(model_path)
+    if model is None:
+        model = joblib.load(model_path, mmap_mode="r")["model"]
+        _worker_models[model_path] = model
+    return model.predict(pd.DataFrame(X[start:stop], columns=features))
+
+
+def predict_grid(model, model_path: str, X: np.ndarray, features: list, n_jobs: int = FORECAST_N_JOBS) -> np.ndarray:
+    """
+    Predicts a feature matrix, split across a process pool when it is large enough.
+
+    Workers load the model artifact memory-mapped (the tree arrays are shared through the page
+    cache) and receive `X` as a read-only memmap, so neither is copied per worker.
+
+    Parameters:
+    -----------
+    model : RandomForestRegressor
+        The loaded model, used when the grid is predicted in-process.
+
+    model_path : str
+        Registry artifact of the model, loaded by the workers.
+
+    n_jobs : int, optional
+        Maximum number of workers (joblib convention, -1 = every core).
+    """
+    n_jobs = min(effective_n_jobs(n_jobs), max(1, len(X) // MIN_ROWS_PER_JOB))
+    if n_jobs == 1:
+        return model.predict(pd.DataFrame(X, columns=features))
+
+    bounds = np.linspace(0, len(X), n_jobs + 1, dtype=int)
+    chunks = Parallel(n_jobs=n_jobs, max_nbytes="1M", mmap_mode="r")(
+        delayed(_predict_chunk)(model_path, X, features, start, stop)
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    )
+    return np.concatenate(chunks)
+
+
+def horizon_training_frame(history: pd.DataFrame, keys: list, target: str, horizon: int) -> pd.DataFrame:
+    """
+    Pairs each row of a series with the target of the same series `horizon` months later.
+
+    Months are matched by calendar (not by position), so gaps in a series never pair a row with
+    the wrong month. Rows without a value `horizon` months ahead are dropped.
+    """
+    month_year = pd.to_datetime(history["month_year"])
+    history = history.assign(_month=month_year.dt.year * 12 + month_year.dt.month)
+    future = (
+        history[keys + ["_month", target]]
+        .drop_duplicates(keys + ["_month"], keep="last")
+        .assign(_month=lambda frame: frame["_month"] - horizon)
+        .rename(columns={target: "_future"})
+    )
+    paired = history.drop(columns=target).merge(future, on=keys + ["_month"], how="inner")
+    return paired.rename(columns={"_future": target}).drop(columns="_month")
+
+
+def train_horizon_model(table_name: str, features: list, target: str, store, horizon: int) -> dict:
+    """
+    Trains the direct model of one horizon: the features of a month predict the target of the
+    same series `horizon` months later.
+    """
+    keys = category_columns(features)
+    encoded = {f"{key}_encoded" for key in keys}
+    raw_features = [feature for feature in features if feature not in encoded]
+    history = store.read(table_name, list(dict.fromkeys(raw_features + keys + ["month_year", target])))
+    paired = horizon_training_frame(history, keys, target, horizon)
+    if len(paired) < 2:
+        raise ValueError(f"Not enough history in {table_name} to train a {horizon}-month model.")
+    return fit_forecast_model(paired, features, target, {key: store.categories(key) for key in keys})
+
+
+def forecast_horizon(table_name: str, store, fingerprint: str, latest: pd.DataFrame, horizon: int,
+                     n_jobs: int = 1):
+    """
+    Trains (or loads) the model of one horizon and projects every series of `latest` with it.
+
+    Returns None when the table has not enough history to train the horizon.
+    """
+    features, target = FORECAST_MODELS[table_name]
+    keys = category_columns(features)
+    model_name = f"{table_name}-h{horizon}"
+    try:
+        artifact = registry.get_or_train(
+            model_name, features, fingerprint,
+            lambda: train_horizon_model(table_name, features, target, store, horizon),
+        )
+    except ValueError as e:
+        print(f"Forecast engine: {e}")
+        return None
+    rows = encode_categories(latest.copy(), artifact["categories"])
+    X = rows[features].to_numpy(dtype=np.float64)
+    last_values = rows[target].to_numpy(dtype=np.float64)
+    predicted = predict_grid(
+        artifact["model"], registry.path_for(model_name, features, fingerprint), X, features, n_jobs
+    ) if len(rows) else np.empty(0)
+    frame = {key: rows[key].to_numpy() for key in keys}
+    frame.update({
+        "horizon": np.full(len(rows), horizon, dtype=np.int8),
+        "last_month": rows["month_year"].to_numpy(),
+        "month_year": (rows["month_year"] + pd.DateOffset(months=horizon)).to_numpy(),
+        "last_value": last_values.astype(np.float32),
+        "predicted": predicted.astype(np.float32),
+        "delta": (predicted - last_values).astype(np.float32),
+    })
+    return pd.DataFrame(frame)
+
+
+def multi_horizon_forecast(table_name: str, store, horizons=FORECAST_HORIZONS, countries=None,
+                           n_jobs: int = FORECAST_N_JOBS) -> pd.DataFrame:
+    """
+    Projects a table several months ahead for every series, with one direct model per horizon.
+
+    A series is a combination of the category columns the model uses (country for the overdue
+    ratio, country and due_interval for working capital). The model of horizon h is trained on
+    the features of each month paired with the target of the same series h months later (see
+    `horizon_training_frame`) and registered in the model registry like the one-month models.
+    Each series is projected from its own latest materialized row, so a series whose data stops
+    before the latest month of the table is projected from its own last month.
+
+    The horizons are trained and predicted in parallel, one thread each (forest training and
+    prediction release the GIL, and threads share the feature store and the registry), whatever
+    the number of series; the workers left over go to `predict_grid` for large grids.
+
+    Parameters:
+    -----------
+    table_name : str
+        'trades_receivable' (overdue ratio) or 'working_capital'.
+
+    store : FeatureStore
+        Materialized features of the ledger (see `db.feature_store`).
+
+    horizons : iterable of int, optional (default=(3, 6, 12))
+        Months ahead of the latest month of each series.
+
+    countries : iterable of str, optional
+        Restricts the forecast to these countries (all by default).
+
+    n_jobs : int, optional
+        Maximum number of workers (joblib convention, -1 = every core).
+
+    Returns:
+    --------
+    pd.DataFrame
+        One row per series and horizon, with categorical keys, an int8 'horizon', the base month
+        'last_month', the target 'month_year' and float32 'last_value', 'predicted' and 'delta'
+        columns. Horizons without enough history to train are left out.
+    """
+    features, _ = FORECAST_MODELS[table_name]
+    keys = category_columns(features)
+
+    store.refresh(table_name)
+    fingerprint = store.fingerprint(table_name)
+    latest = store.latest_by(table_name, keys)
+    if countries is not None:
+        latest = latest[latest["country"].isin(list(countries))]
+
+    horizons = sorted(set(int(h) for h in horizons))
+    workers = effective_n_jobs(n_jobs)
+    threads = max(1, min(workers, len(horizons)))
+    frames = Parallel(n_jobs=threads, prefer="threads")(
+        delayed(forecast_horizon)(table_name, store, fingerprint, latest, horizon, max(1, workers // threads))
+        for horizon in horizons
+    )
+    frames = [frame for frame in frames if frame is not None]
+
+    columns = keys + ["horizon", "last_month", "month_year", "last_value", "predicted", "delta"]
+    forecast = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+    for key in keys:
+        forecast[key] = pd.Categorical(forecast[key])
+    return forecast.sort_values(keys + ["horizon"], kind="stable", ignore_index=True)
+
+
+def horizon_report(forecast: pd.DataFrame, table_name: str) -> str:
+    """
+    Formats a `multi_horizon_forecast` frame as text for the answer: one line per series with
+    the projected value of each horizon.
+    """
+    if forecast.empty:
+        return "Not enough history to project this data."
+    keys = category_columns(FORECAST_MODELS[table_name][0])
+    ratio = table_name == "trades_receivable"
+    value = (lambda v: f"{v:.2%}") if ratio else (lambda v: f"{v:,.2f}")
+    title = "Overdue Ratio" if ratio else "Working Capital"
+    lines = [f"📈 *{title} Forecast* ({', '.join(f'{h} months' for h in sorted(forecast['horizon'].unique()))}):\n"]
+    for series, rows in forecast.groupby(keys, sort=False, observed=True):
+        name = " / ".join(map(str, series if isinstance(series, tuple) else (series,)))
+        projections = "; ".join(
+            f"{row.month_year:%b/%Y}: {value(row.predicted)} ({'+' if row.delta >= 0 else '-'}{value(abs(row.delta))})"
+            for row in rows.itertuples()
+        )
+        lines.append(f"{name} (last {value(rows['last_value'].iloc[0])} in {rows['last_month'].iloc[0]:%b/%Y}): {projections}")
+    return "\n".join(lines)
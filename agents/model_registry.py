@@ -0,0 +1,107 @@
+import os
+import json
+import glob
+import hashlib
+import threading
+import joblib
+
+
+MODELS_DIR = os.getenv("MODELS_DIR", "models")
+# Bumped when the layout of the stored artifacts changes, so older artifacts are never loaded.
+ARTIFACT_FORMAT = 2
+# Trainings of different keys run concurrently; a key is guarded by one of these locks.
+KEY_LOCK_STRIPES = 64
+
+
+class ModelRegistry:
+    """
+    Registry of trained models persisted on disk.
+
+    Models are keyed by table, feature list and data fingerprint (the feature-store fingerprint,
+    or the ingestion version of the table, see `db.ingest.data_versions`). An artifact is trained
+    once (offline through `train_overdue_model.py` or lazily on the first request), dumped
+    with joblib and loaded memory-mapped afterwards. When the fingerprint of a table changes
+    a new artifact is trained and only the `max_versions` most recent artifacts of that
+    table/feature list are kept.
+    """
+
+    def __init__(self, models_dir: str = MODELS_DIR, mmap_mode: str = "r", max_versions: int = 4):
+        self.models_dir = models_dir
+        self.mmap_mode = mmap_mode
+        self.max_versions = max_versions
+        self._models = {}
+        self._lock = threading.Lock()
+        self._key_locks = [threading.Lock() for _ in range(KEY_LOCK_STRIPES)]
+
+    @staticmethod
+    def _digest(value) -> str:
+        return hashlib.sha1(json.dumps(value).encode("utf-8")).hexdigest()[:12]
+
+    def _prefix(self, table_name: str, features: list) -> str:
+        return f"{table_name}-{self._digest(list(features))}"
+
+    def path_for(self, table_name: str, features: list, fingerprint: str) -> str:
+        """Returns the artifact path for the given key."""
+        name = f"{self._prefix(table_name, features)}-{self._digest([ARTIFACT_FORMAT, fingerprint])}.joblib"
+        return os.path.join(self.models_dir, name)
+
+    def get(self, table_name: str, features: list, fingerprint: str):
+        """
+        Returns the model registered for the key, or None if it was never trained.
+        Models are looked up in memory first and then loaded memory-mapped from disk.
+        """
+        path = self.path_for(table_name, features, fingerprint)
+        model = self._models.get(path)
+        if model is None and os.path.exists(path):
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+            self._models[path] = model
+        return model
+
+    def register(self, table_name: str, features: list, fingerprint: str, model) -> str:
+        """
+        Persists a trained model and discards the oldest artifacts of the same table/features.
+
+        Returns:
+        --------
+        str
+            Path of the stored artifact.
+        """
+        os.makedirs(self.models_dir, exist_ok=True)
+        path = self.path_for(table_name, features, fingerprint)
+        tmp_path = f"{path}.tmp"
+        joblib.dump(model, tmp_path)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            pattern = os.path.join(self.models_dir, f"{self._prefix(table_name, features)}-*.joblib")
+            artifacts = sorted(glob.glob(pattern), key=os.path.getmtime, reverse=True)
+            for stale in artifacts[self.max_versions:]:
+                os.remove(stale)
+                self._models.pop(stale, None)
+            self._models[path] = model
+        return path
+
+    def get_or_train(self, table_name: str, features: list, fingerprint: str, train_fn):
+        """
+        Returns the registered model for the key, training and registering it once if needed.
+
+        Parameters:
+        -----------
+        train_fn : callable
+            Zero-argument function returning a fitted model. Only called on a registry miss.
+        """
+        model = self.get(table_name, features, fingerprint)
+        if model is not None:
+            return model
+
+        path = self.path_for(table_name, features, fingerprint)
+        key_lock = self._key_locks[int(hashlib.sha1(path.encode("utf-8")).hexdigest(), 16) % len(self._key_locks)]
+        with key_lock:
+            model = self.get(table_name, features, fingerprint)
+            if model is None:
+                model = train_fn()
+                self.register(table_name, features, fingerprint, model)
+        return model
+
+
+registry = ModelRegistry()
@@ -0,0 +1,141 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+import pandas as pd
+from startup import lazy_singleton
+
+
+PREDICTION_CACHE_DB = os.getenv("PREDICTION_CACHE_DB", "")  # empty = memory only
+PREDICTION_CACHE_MAX_ENTRIES = int(os.getenv("PREDICTION_CACHE_MAX_ENTRIES", "256"))
+
+
+def frame_digest(df: pd.DataFrame) -> str:
+    """
+    Content hash of a DataFrame: its columns, dtypes and the vectorized row hashes of
+    `pd.util.hash_pandas_object` (the index is ignored).
+    """
+    digest = hashlib.sha1(json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class PredictionCache:
+    """
+    Memoized forecast reports, keyed by the content of the input frame and the parameters.
+
+    Entries are evicted by LRU (`max_entries`). With a `path`, they are also written through to
+    a SQLite file and the most recent ones are reloaded at startup. Concurrent calls for the same
+    key are single-flighted: one computes, the others wait for its result.
+    """
+
+    def __init__(self, path: str = None, max_entries: int = PREDICTION_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS prediction_cache (key TEXT PRIMARY KEY, result TEXT, used_at REAL)"
+            )
+            rows = self._conn.execute(
+                "SELECT key, result FROM prediction_cache ORDER BY used_at DESC LIMIT ?", (max_entries,)
+            ).fetchall()
+            for key, result in reversed(rows):
+                self._entries[key] = result
+
+    def _store(self, key: str, result: str):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        evicted = []
+        while len(self._entries) > self.max_entries:
+            evicted.append(self._entries.popitem(last=False)[0])
+        if self._conn is not None:
+            self._conn.execute("INSERT OR REPLACE INTO prediction_cache VALUES (?, ?, ?)", (key, result, time.time()))
+            self._conn.executemany("DELETE FROM prediction_cache WHERE key = ?", [(k,) for k in evicted])
+            self._conn.commit()
+
+    def get_or_compute(self, key: str, compute) -> str:
+        """
+        Returns the cached result for the key, computing it once if needed.
+
+        Parameters:
+        -----------
+        compute : callable
+            Zero-argument function returning the result. Only one caller runs it per key at a time.
+        """
+        while True:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                flight = self._inflight.get(key)
+                if flight is None:
+                    flight = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+                self.coalesced += 1
+            # Another caller is computing this key: wait and read its result (or retry if it failed).
+            flight.wait()
+
+        try:
+            result = compute()
+            with self._lock:
+                self._store(key, result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.set()
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters, the calls that waited on a running computation and the number of entries.
+        """
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self._entries)}
+
+
+@lazy_singleton
+def get_prediction_cache() -> PredictionCache:
+    return PredictionCache(PREDICTION_CACHE_DB)
+
+
+def memoize_prediction(table_name: str, cache: PredictionCache = None):
+    """
+    Memoizes a forecast function `fn(df, ..., store=None)` in `cache` (by default the shared
+    cache of `get_prediction_cache`, created on the first call).
+
+    The key is the function name, the content hash of `df`, the other arguments and, when a
+    feature store is given, the fingerprint of its `table_name` features (the model is trained
+    on the store, so its snapshot is part of the input).
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+        frame_parameter = next(iter(signature.parameters))
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            df = arguments.pop(frame_parameter)
+            store = arguments.pop("store", None)
+            snapshot = ""
+            if store is not None:
+                store.refresh(table_name)
+                snapshot = store.fingerprint(table_name)
+            key = "|".join([fn.__name__, frame_digest(df), json.dumps(arguments, sort_keys=True, default=str), snapshot])
+            return (cache or get_prediction_cache()).get_or_compute(key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -0,0 +1,121 @@
+import re
+import threading
+from collections import OrderedDict
+from agents.result_store import QueryResult
+from db.schema_context import SchemaContextCache
+
+
+_SQL_TOKENS = re.compile(r"('(?:[^']|'')*')|(\"(?:[^\"]|\"\")*\")|(\s+)|([^'\"\s]+)")
+
+
+def canonicalize_sql(query: str) -> str:
+    """
+    Canonical form of a SQL query used as cache key: whitespace collapsed and keywords/identifiers
+    lowercased, while string literals are preserved as written.
+    """
+    parts = []
+    for literal, quoted, space, token in _SQL_TOKENS.findall(query.strip()):
+        if literal or quoted:
+            parts.append(literal or quoted)
+        elif space:
+            parts.append(" ")
+        else:
+            parts.append(token.lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def result_size(result: QueryResult) -> int:
+    """Approximate memory footprint of a query result, in bytes."""
+    return int(result.frame.memory_usage(index=True, deep=True).sum()) + len(result.query)
+
+
+class QueryResultCache:
+    """
+    Cache of query results in front of execute_query.
+
+    Keys are the canonicalized SQL plus the data version of the tables the query touches: the
+    per-table ingestion version of `db.ingest.data_versions`, or the database pair
+    (`PRAGMA schema_version` / `data_version`) for tables never ingested. Loading new months of
+    one table therefore only drops the entries that read it. Storage is bounded in bytes with
+    LRU eviction.
+    """
+
+    def __init__(self, schema_context: SchemaContextCache, max_bytes: int = 64 * 1024 * 1024):
+        self.schema_context = schema_context
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._version = None
+        self._lock = threading.Lock()
+
+    def table_versions(self, canonical_query: str) -> tuple:
+        """
+        Returns the (table, version) pairs of the tables referenced by the query.
+        """
+        versions = self.schema_context.table_versions()
+        return tuple(
+            (table_name, version) for table_name, version in versions.items()
+            if re.search(rf"\b{re.escape(table_name.lower())}\b", canonical_query)
+        )
+
+    def _key(self, query: str):
+        canonical = canonicalize_sql(query)
+        if not canonical.startswith(("select", "with")):
+            return None
+        return canonical, self.table_versions(canonical)
+
+    def _purge_stale(self):
+        version = self.schema_context.version()
+        if version == self._version:
+            return
+        # Something was committed: drop the entries of the tables whose version moved.
+        versions = self.schema_context.table_versions()
+        for key in [k for k in self._entries if any(versions.get(t) != v for t, v in k[1])]:
+            self._bytes -= self._entries.pop(key)[1]
+        self._version = version
+
+    def get(self, query: str):
+        """
+        Returns the cached QueryResult for the query, or None on a miss.
+        """
+        key = self._key(query)
+        if key is None:
+            return None
+        with self._lock:
+            self._purge_stale()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, query: str, result: QueryResult):
+        """
+        Stores a query result, evicting least recently used entries beyond `max_bytes`.
+        """
+        key = self._key(query)
+        if key is None or not result.columns:
+            return
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._purge_stale()
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters, the number of entries and the bytes in use.
+        """
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._entries), "bytes": self._bytes}
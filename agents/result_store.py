@@ -0,0 +1,194 @@
+import os
+import uuid
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import pandas as pd
+from sqlalchemy import Engine
+from sqlalchemy.exc import SQLAlchemyError
+
+
+PREVIEW_ROWS = 50
+PREVIEW_MAX_CHARS = 8000
+QUERY_FETCH_SIZE = int(os.getenv("QUERY_FETCH_SIZE", "5000"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "500000"))
+SUMMARY_MAX_GROUPS = 50
+SUMMARY_MAX_COLUMNS = 8
+
+
+@dataclass
+class QueryResult:
+    """
+    Columnar result of a SQL query.
+
+    `columns` comes straight from the cursor description, so aliases and column subsets
+    selected by the query are preserved, and `frame` holds the rows as a DataFrame that the
+    prediction tools consume without any text round trip. `truncated` is set when the rows
+    were capped at QUERY_MAX_ROWS; `summary` holds the aggregated statistics shown to the
+    LLM instead of raw rows when the result is larger than the preview.
+    """
+    query: str
+    columns: list
+    frame: pd.DataFrame
+    result_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    truncated: bool = False
+    summary: str = ""
+
+    @property
+    def row_count(self) -> int:
+        return len(self.frame)
+
+    def preview(self, max_rows: int = PREVIEW_ROWS, max_chars: int = PREVIEW_MAX_CHARS) -> str:
+        """
+        Renders a truncated text preview of the rows for the LLM, or the summary of a large result.
+        """
+        if not self.row_count:
+            return ""
+        if self.summary:
+            return self.summary if len(self.summary) <= max_chars else self.summary[:max_chars] + "..."
+        head = self.frame.head(max_rows)
+        text = f"Columns: {self.columns}\n{list(head.itertuples(index=False, name=None))}"
+        if len(text) > max_chars:
+            text = text[:max_chars] + "..."
+        if self.row_count > len(head):
+            text += f"\n(showing {len(head)} of {self.row_count} rows)"
+        return text
+
+
+def run_query(engine: Engine, query: str, fetch_size: int = QUERY_FETCH_SIZE, max_rows: int = QUERY_MAX_ROWS) -> QueryResult:
+    """
+    Executes a SQL query and returns its rows in columnar form.
+
+    The cursor is read in chunks of `fetch_size` rows with `fetchmany`, each chunk converted to
+    a DataFrame right away, and at most `max_rows` rows are kept, so memory stays bounded
+    whatever the query. Results larger than the LLM preview get an aggregated summary.
+
+    Args:
+        engine (Engine): SQLAlchemy engine of the finance database.
+        query (str): SQL query to execute.
+
+    Returns:
+        QueryResult: Cursor column names and a DataFrame with the rows.
+    """
+    chunks = []
+    kept = 0
+    truncated = False
+    with engine.connect() as conn:
+        cursor = conn.exec_driver_sql(query)
+        if not cursor.returns_rows:
+            return QueryResult(query=query, columns=[], frame=pd.DataFrame())
+        columns = list(cursor.keys())
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            if kept + len(rows) > max_rows:
+                rows = rows[:max_rows - kept]
+                truncated = True
+            chunks.append(pd.DataFrame.from_records(rows, columns=columns))
+            kept += len(rows)
+            if truncated:
+                cursor.close()
+                break
+    frame = pd.concat(chunks, ignore_index=True) if len(chunks) > 1 else (chunks[0] if chunks else pd.DataFrame(columns=columns))
+
+    result = QueryResult(query=query, columns=columns, frame=frame, truncated=truncated)
+    if truncated or result.row_count > PREVIEW_ROWS:
+        result.summary = summarize_result(engine, result)
+    return result
+
+
+def summary_plan(frame: pd.DataFrame) -> tuple:
+    """
+    Chooses how to summarize a result: the low-cardinality text column to group by (or None)
+    and the numeric columns to aggregate, identifier columns excluded.
+    """
+    numeric = [
+        column for column in frame.select_dtypes("number").columns
+        if column != "id" and not str(column).startswith("id_")
+    ][:SUMMARY_MAX_COLUMNS]
+    candidates = [
+        (frame[column].nunique(), column) for column in frame.select_dtypes(exclude="number").columns
+        if column != "month_year"
+    ]
+    candidates = [(count, column) for count, column in candidates if 1 < count <= SUMMARY_MAX_GROUPS]
+    group = "country" if any(column == "country" for _, column in candidates) else min(candidates, default=(0, None))[1]
+    return group, numeric
+
+
+def summarize_result(engine: Engine, result: QueryResult) -> str:
+    """
+    Renders count, sum, min and max per group of a large result for the LLM.
+
+    The aggregation runs in SQLite over the original query, so it covers every row even when
+    the kept frame was truncated; if that fails, the kept frame is aggregated with pandas. The
+    row total is counted over the whole result before the groups are capped at
+    SUMMARY_MAX_GROUPS, and the text says when the list of groups is truncated.
+    """
+    group, numeric = summary_plan(result.frame)
+    select = ['COUNT(*) AS "count"'] + [
+        f'{fn}("{column}") AS "{column}_{fn.lower()}"' for column in numeric for fn in ("SUM", "MIN", "MAX")
+    ]
+    if group is not None:
+        select.insert(0, f'"{group}"')
+    source = f"({result.query.strip().rstrip(';')})"
+    sql = f"SELECT {', '.join(select)} FROM {source}"
+    if group is not None:
+        sql += f' GROUP BY "{group}" ORDER BY "{group}" LIMIT {SUMMARY_MAX_GROUPS}'
+    totals = 'SELECT COUNT(*) AS "rows"' + (f', COUNT(DISTINCT "{group}") AS "groups"' if group is not None else "")
+    try:
+        summary = run_query(engine, sql, max_rows=SUMMARY_MAX_GROUPS).frame
+        counts = run_query(engine, f"{totals} FROM {source}").frame.iloc[0]
+        total = f"{int(counts['rows'])}"
+        groups = int(counts["groups"]) if group is not None else 1
+    except SQLAlchemyError:
+        frame = result.frame
+        grouped = frame.groupby(group) if group is not None else frame.groupby(lambda _: "all")
+        summary = grouped[numeric].agg(["sum", "min", "max"]) if numeric else pd.DataFrame(index=grouped.size().index)
+        summary.columns = [f"{column}_{fn}" for column, fn in summary.columns] if numeric else []
+        summary.insert(0, "count", grouped.size())
+        summary = summary.reset_index() if group is not None else summary.reset_index(drop=True)
+        total = f"{len(frame)}+" if result.truncated else f"{len(frame)}"
+        groups = len(summary)
+        summary = summary.head(SUMMARY_MAX_GROUPS)
+
+    by = f" grouped by {group}" if group is not None else ""
+    shown = f"; first {len(summary)} of {groups} groups shown" if groups > len(summary) else ""
+    return (
+        f"Columns: {result.columns}\n"
+        f"Result too large to list ({total} rows); summary{by}{shown} (count, sum/min/max per numeric column):\n"
+        f"Summary columns: {list(summary.columns)}\n"
+        f"{list(summary.round(2).itertuples(index=False, name=None))}"
+    )
+
+
+class ResultStore:
+    """
+    Bounded in-process store of query results, addressed by `result_id`.
+
+    The graph state only carries the id; the prediction tools fetch the DataFrame
+    from here instead of parsing the text rendered for the LLM.
+    """
+
+    def __init__(self, max_results: int = 32):
+        self.max_results = max_results
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, result: QueryResult) -> str:
+        with self._lock:
+            self._results[result.result_id] = result
+            self._results.move_to_end(result.result_id)
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+        return result.result_id
+
+    def get(self, result_id: str):
+        with self._lock:
+            result = self._results.get(result_id)
+            if result is not None:
+                self._results.move_to_end(result_id)
+        return result
+
+
+result_store = ResultStore()
@@ -0,0 +1,286 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+import unicodedata
+from collections import OrderedDict
+import numpy as np
+from loguru import logger
+from langchain_core.embeddings import Embeddings
+
+
+SQL_CACHE_DB = os.getenv("SQL_CACHE_DB", "db/sql_cache.db")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Normalizes a user question for cache lookups: removes the "@" database markers,
+    accents, punctuation and case, and collapses whitespace.
+    """
+    text = re.sub(r"@[\w+]+", " ", question or "")
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return " ".join(text.split())
+
+
+def question_literals(question: str, vocabulary=None) -> frozenset:
+    """
+    Returns the literals of a question that must match for two questions to share the same SQL:
+    its numbers and the category values it mentions. With a `vocabulary` (the known countries,
+    due intervals...), values are found by matching its normalized terms against the normalized
+    question, so "do brasil" and "do Brasil" give the same literal; without one, capitalized words
+    stand in for them.
+    """
+    normalized = normalize_question(question)
+    literals = {word for word in normalized.split() if word.isdigit()}
+    if vocabulary:
+        padded = f" {normalized} "
+        literals.update(term for term in vocabulary if f" {term} " in padded)
+    else:
+        text = re.sub(r"@[\w+]+", " ", question or "")
+        words = re.findall(r"\w+", text)
+        literals.update(w.lower() for i, w in enumerate(words) if i > 0 and w[:1].isupper())
+    return frozenset(literals)
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local, deterministic embeddings built from hashed character trigrams.
+
+    Stand-in for `create_azure_embeddings_llm` in tests and offline runs.
+    """
+
+    def __init__(self, dimensions: int = 256):
+        self.dimensions = dimensions
+
+    def embed_query(self, text: str) -> list:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        padded = f"  {text.lower()}  "
+        for i in range(len(padded) - 2):
+            digest = hashlib.md5(padded[i:i + 3].encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.dimensions] += 1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self.embed_query(text) for text in texts]
+
+
+class SQLQueryCache:
+    """
+    Cache of generated SQL in front of the write_query LLM call.
+
+    Entries are keyed by the normalized question, the selected database markers and the schema
+    version. An exact key match returns the stored SQL directly; otherwise, when an embeddings
+    model is configured, the most similar question with the same markers/schema version is used
+    if its cosine similarity reaches `similarity_threshold` and its literals match (see
+    `question_literals`; `vocabulary` returns the known category values, e.g. the countries).
+    Entries are evicted by LRU (`max_entries`) and TTL, and persisted in a SQLite file. Each
+    entry records the embeddings model of its vector: after a change of provider or model the
+    old vectors are ignored (the entries still answer exact matches).
+    """
+
+    def __init__(self, path: str = SQL_CACHE_DB, embeddings: Embeddings = None,
+                 max_entries: int = 1024, ttl_seconds: float = 7 * 24 * 3600,
+                 similarity_threshold: float = 0.97, vocabulary=None):
+        self.embeddings = embeddings
+        self.vocabulary = vocabulary
+        self._vocabulary_terms = (None, frozenset())
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._vectors = OrderedDict()
+        self._lock = threading.Lock()
+        self.embedding_model = self._model_name(embeddings)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sql_cache ("
+            "key TEXT PRIMARY KEY, scope TEXT, question TEXT, literals TEXT, "
+            "query TEXT, embedding BLOB, created_at REAL, embedding_model TEXT)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(sql_cache)")}
+        if "embedding_model" not in columns:
+            self._conn.execute("ALTER TABLE sql_cache ADD COLUMN embedding_model TEXT")
+        self._load()
+
+    @staticmethod
+    def _model_name(embeddings: Embeddings):
+        if embeddings is None:
+            return None
+        model = getattr(embeddings, "model", None) or getattr(embeddings, "deployment", None)
+        dimensions = getattr(embeddings, "dimensions", None)
+        return ":".join(str(part) for part in (type(embeddings).__name__, model, dimensions) if part)
+
+    def _terms(self) -> frozenset:
+        """
+        Returns the normalized vocabulary terms, normalized again only when the values change.
+        """
+        if self.vocabulary is None:
+            return frozenset()
+        values = self.vocabulary()
+        cached_values, terms = self._vocabulary_terms
+        if values is not cached_values:
+            terms = frozenset(filter(None, (normalize_question(str(value)) for value in values)))
+            self._vocabulary_terms = (values, terms)
+        return terms
+
+    @staticmethod
+    def _scope(markers: list, schema_version) -> str:
+        return f"{'+'.join(sorted(markers or []))}|{schema_version}"
+
+    def _load(self):
+        now = time.time()
+        rows = self._conn.execute(
+            "SELECT key, scope, question, literals, query, embedding, created_at, embedding_model "
+            "FROM sql_cache ORDER BY created_at"
+        ).fetchall()
+        for key, scope, question, literals, query, embedding, created_at, embedding_model in rows:
+            if now - created_at > self.ttl_seconds:
+                continue
+            # Vectors of another embeddings model are not comparable with the current ones.
+            vector = None
+            if embedding and embedding_model == self.embedding_model:
+                vector = np.frombuffer(embedding, dtype=np.float32)
+            self._entries[key] = {
+                "scope": scope, "question": question, "literals": frozenset(literals.split("|")) - {""},
+                "query": query, "vector": vector, "created_at": created_at,
+            }
+        self._evict()
+
+    def _embed(self, normalized: str):
+        """
+        Embeds a normalized question. Called without holding the lock: the embeddings call
+        may go over the network and must not serialize the other requests.
+        """
+        if self.embeddings is None:
+            return None
+        with self._lock:
+            vector = self._vectors.get(normalized)
+        if vector is not None:
+            return vector
+        try:
+            vector = np.asarray(self.embeddings.embed_query(normalized), dtype=np.float32)
+        except Exception as e:
+            logger.warning(f"SQL cache: embedding failed, using exact matches only ({e})")
+            return None
+        norm = np.linalg.norm(vector)
+        vector = vector / norm if norm else vector
+        with self._lock:
+            self._vectors[normalized] = vector
+            while len(self._vectors) > self.max_entries:
+                self._vectors.popitem(last=False)
+        return vector
+
+    def _delete(self, key: str):
+        self._entries.pop(key, None)
+        self._conn.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries:
+            key, _ = self._entries.popitem(last=False)
+            self._conn.execute("DELETE FROM sql_cache WHERE key = ?", (key,))
+        self._conn.commit()
+
+    def get(self, question: str, markers: list, schema_version):
+        """
+        Returns the cached SQL for the question, or None on a miss.
+        """
+        normalized = normalize_question(question)
+        scope = self._scope(markers, schema_version)
+        key = f"{scope}|{normalized}"
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and now - entry["created_at"] > self.ttl_seconds:
+                self._delete(key)
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["query"]
+
+        vector = self._embed(normalized)
+        with self._lock:
+            if vector is not None:
+                literals = question_literals(question, self._terms())
+                candidates = [
+                    (k, e) for k, e in self._entries.items()
+                    if e["scope"] == scope and e["vector"] is not None and e["vector"].shape == vector.shape
+                    and e["literals"] == literals and now - e["created_at"] <= self.ttl_seconds
+                ]
+                if candidates:
+                    scores = np.stack([e["vector"] for _, e in candidates]) @ vector
+                    best = int(np.argmax(scores))
+                    if scores[best] >= self.similarity_threshold:
+                        best_key, best_entry = candidates[best]
+                        self._entries.move_to_end(best_key)
+                        self.semantic_hits += 1
+                        return best_entry["query"]
+
+            self.misses += 1
+            return None
+
+    def put(self, question: str, markers: list, schema_version, query: str):
+        """
+        Stores the SQL generated for the question (a no-op if it is already the cached SQL).
+        """
+        normalized = normalize_question(question)
+        scope = self._scope(markers, schema_version)
+        key = f"{scope}|{normalized}"
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["query"] == query:
+                return
+        literals = question_literals(question, self._terms())
+        now = time.time()
+        vector = self._embed(normalized)
+
+        with self._lock:
+            self._entries[key] = {
+                "scope": scope, "question": normalized, "literals": literals,
+                "query": query, "vector": vector, "created_at": now,
+            }
+            self._entries.move_to_end(key)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sql_cache "
+                "(key, scope, question, literals, query, embedding, created_at, embedding_model) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, scope, normalized, "|".join(sorted(literals)), query,
+                 vector.tobytes() if vector is not None else None, now, self.embedding_model),
+            )
+            self._evict()
+
+    def invalidate(self, question: str, markers: list, schema_version, query: str = None):
+        """
+        Removes the SQL cached for the question, e.g. after it failed to execute. With `query`,
+        every entry of the same markers/schema version holding that SQL is removed instead (a
+        semantic hit may have served it for another question).
+        """
+        scope = self._scope(markers, schema_version)
+        key = f"{scope}|{normalize_question(question)}"
+        with self._lock:
+            if query is None:
+                stale = [key] if key in self._entries else []
+            else:
+                stale = [k for k, e in self._entries.items() if e["scope"] == scope and e["query"] == query]
+            for k in stale:
+                self._delete(k)
+
+    def stats(self) -> dict:
+        """
+        Returns hit/miss counters and the current number of entries.
+        """
+        return {
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+        }
@@ -1,90 +1,210 @@
 from typing_extensions import TypedDict
-from typing_extensions import Annotated
+from typing_extensions import Annotated, NotRequired
 from langchain_community.utilities import SQLDatabase
-from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
 from langchain_core.prompts import PromptTemplate
 from langgraph.prebuilt import create_react_agent
-from langgraph.checkpoint.memory import MemorySaver
-from sqlalchemy import create_engine
-from llm.azure_llm import create_azure_chat_llm
+from langgraph.graph import StateGraph, START, END
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from langgraph.errors import GraphRecursionError
+from sqlalchemy.exc import SQLAlchemyError
+from llm.azure_llm import create_azure_chat_llm, create_azure_embeddings_llm
 import json
+import os
+import re
+import time
+from dataclasses import dataclass
 import pandas as pd
 from agents.agent_predict_tools import predict_overdue_risk, forecast_liquidity_risk
-import ast
-from utils import get_column_names
-
-# CONFIG (memory)
-memory = MemorySaver()
-config = {"configurable": {"thread_id": "2"}}
+from agents.prediction_cache import get_prediction_cache
+from agents.forecast_engine import FORECAST_HORIZONS, multi_horizon_forecast, horizon_report
+from utils import parse_databases_markers
+from db.schema_context import SchemaContextCache
+from db.feature_store import get_feature_store
+from db.sqlite_access import create_read_engine
+from db.ingest import LEDGER_TABLES
+from agents.result_store import result_store, run_query
+from agents.sql_cache import SQLQueryCache, HashingEmbeddings
+from agents.query_result_cache import QueryResultCache
+from agents.checkpointer import CompactingSqliteSaver
+from tracing import tracer, traced, current_span
+from startup import lazy_singleton
+
+# CONFIG (memory): every run names its conversation thread (config_for); there is no shared default.
+HISTORY_MAX_MESSAGES = int(os.getenv("AGENT_HISTORY_MAX_MESSAGES", "40"))
+AGENT_DEADLINE_SECONDS = float(os.getenv("AGENT_DEADLINE_SECONDS", "120"))
+AGENT_MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "25"))
+
+
+def config_for(thread_id: str) -> dict:
+    """Returns the graph config of a conversation thread."""
+    return {"configurable": {"thread_id": thread_id}}
+
+# The database, LLM, caches and graphs below are built on first use (or by warm_up), not at import:
+# importing this module (app.py at startup) does not touch the database, the network or the prompts.
+@lazy_singleton
+def get_memory() -> CompactingSqliteSaver:
+    return CompactingSqliteSaver()
 
 ################################ BANCOS DE DADOS ################################
 db_name = "db/aa-finance-predict.db"
-engine = create_engine(f"sqlite:///{db_name}")
-db = SQLDatabase(engine)
+
+
+# Read-only: the read-path indexes are built by the ingestion (db/ingest.py) or by
+# `python -m db.sqlite_access`, never at runtime.
+@lazy_singleton
+def get_engine():
+    return create_read_engine(db_name)
+
+
+@lazy_singleton
+def get_db() -> SQLDatabase:
+    return SQLDatabase(get_engine(), include_tables=list(LEDGER_TABLES))  # leaves out _data_versions (db/ingest.py)
+
+
+@lazy_singleton
+def get_schema_context() -> SchemaContextCache:
+    schema_context = SchemaContextCache(get_db(), db_name)
+    schema_context.warm()
+    return schema_context
 
 ################################ MODELO ################################
-llm = create_azure_chat_llm()
+@lazy_singleton
+def get_llm():
+    return create_azure_chat_llm()
+
+################################ CACHE ################################
+# SQL cache in front of write_query: "azure" (default), "local" (hashing embeddings) or "none" (exact matches only)
+sql_cache_embeddings = os.getenv("SQL_CACHE_EMBEDDINGS", "azure")
+
+
+def category_values():
+    # Countries and due intervals of the ledger: the literals that keep a semantic hit in its scope.
+    return get_schema_context().category_values()
+
+
+@lazy_singleton
+def get_sql_cache() -> SQLQueryCache:
+    if sql_cache_embeddings == "azure":
+        return SQLQueryCache(embeddings=create_azure_embeddings_llm(), vocabulary=category_values)
+    if sql_cache_embeddings == "local":
+        return SQLQueryCache(embeddings=HashingEmbeddings(), vocabulary=category_values)
+    return SQLQueryCache(vocabulary=category_values)
+
+
+# Query result cache in front of execute_query
+@lazy_singleton
+def get_query_result_cache() -> QueryResultCache:
+    return QueryResultCache(get_schema_context())
 
 ################################ PROMPT ################################
 # Query prompt template
-with open("inputs/Prompts/prompt_query_predict_v2.txt", "r", encoding='utf-8') as file:
-    query_prompt = file.read()
-    query_prompt_template = PromptTemplate.from_template(query_prompt)
-file.close()
+@lazy_singleton
+def get_query_prompt_template() -> PromptTemplate:
+    with open("inputs/Prompts/prompt_query_predict_v2.txt", "r", encoding='utf-8') as file:
+        return PromptTemplate.from_template(file.read())
 
 ################################ STATES ################################
 class State(TypedDict):
     question: str
     query: str
     result: str
+    result_id: NotRequired[str]  # Handle of the columnar result kept in agents.result_store
     predict: str
     answer: str
     increase_only: bool  # Added for predict_overdue_risk
     threshold: float  # Added for forecast_liquidity_risk
+    horizons: NotRequired[list]  # Months ahead for forecast_horizons_tool (default 3, 6 and 12)
+
+@dataclass
+class FinalAnswer:
+    """Terminal event of an agent run, carried as the artifact of the generate_answer tool message."""
+    answer: str
+
 
 class QueryOutput(TypedDict):
     """Generated SQL query."""
     query: Annotated[str, ..., "Syntactically valid SQL query."]
 
 ################################ TOOLS ################################
+@traced()
 def write_query(state: State):
     """
     Generate a syntactically correct SQL query to retrieve relevant data for the user's question.
 
+    Queries are served from the SQL cache when a similar question was answered before; new ones
+    are only cached by execute_query, once they ran successfully.
+
     Args:
         state (State): The current state of the interaction, including the user's question.
 
     Returns:
         dict: A dictionary containing the generated SQL query string under the 'query' key.
     """
-    prompt = query_prompt_template.invoke(
+    markers = parse_databases_markers(state["question"])
+    schema_context = get_schema_context()
+    schema_version = schema_context.version()[0]
+    cached_query = get_sql_cache().get(state["question"], markers, schema_version)
+    current_span().set("sql_cache.hit", cached_query is not None)
+    if cached_query is not None:
+        print(cached_query)
+        return {"query": cached_query}
+
+    prompt = get_query_prompt_template().invoke(
         {
-            "dialect": db.dialect,
+            "dialect": get_db().dialect,
             "top_k": 10,
-            "tables_info": "\n".join([db.get_table_info([table_name]) for table_name in db.get_usable_table_names()]),
+            "tables_info": schema_context.tables_info(markers),
             "input": state["question"],
         }
     )
-    structured_llm = llm.with_structured_output(QueryOutput)
-    result = structured_llm.invoke(prompt, config=config)
+    structured_llm = get_llm().with_structured_output(QueryOutput)
+    result = structured_llm.invoke(prompt)
     print(result["query"])
     return {"query": result["query"]}
 
 
+@traced()
 def execute_query(state: State):
     """
     Execute the SQL query generated by the write_query tool.
 
+    Identical queries are answered from the query result cache while the tables do not change.
+    A query that runs successfully is stored in the SQL cache for the question; one that fails is
+    evicted from it, so broken SQL is never served again.
+    The rows are read in chunks and kept as a DataFrame in the result store; only a truncated
+    preview (or, for large results, count/sum/min/max per group) is returned as text, together
+    with the 'result_id' the prediction tools use to load the data.
+
     Args:
         state (State): The current state containing the SQL query.
 
     Returns:
-        dict: A dictionary with the query result under the 'result' key.
+        dict: A dictionary with the result preview under the 'result' key and its handle under 'result_id'.
     """
-    execute_query_tool = QuerySQLDatabaseTool(db=db)
-    return {"result": execute_query_tool.invoke(state["query"], config=config)}
-
-
+    markers = parse_databases_markers(state["question"])
+    schema_version = get_schema_context().version()[0]
+    query_result_cache = get_query_result_cache()
+    query_result = query_result_cache.get(state["query"])
+    span = current_span()
+    span.set("result_cache.hit", query_result is not None)
+    if query_result is None:
+        try:
+            query_result = run_query(get_engine(), state["query"])
+        except SQLAlchemyError as e:
+            span.status = "error"
+            span.set("error", str(e)[:500])
+            get_sql_cache().invalidate(state["question"], markers, schema_version, state["query"])
+            return {"result": f"Error: {e}"}
+        query_result_cache.put(state["query"], query_result)
+    get_sql_cache().put(state["question"], markers, schema_version, state["query"])
+    span.set("sql.rows", query_result.row_count)
+    span.set("sql.truncated", query_result.truncated)
+    result_id = result_store.put(query_result)
+    return {"result": query_result.preview(), "result_id": result_id}
+
+
+@traced()
 def generate_answer(state: State):
     """
     Generate a final answer for the user by combining the question, SQL query, and query results.
@@ -109,70 +229,452 @@ def generate_answer(state: State):
         f'SQL Result: {state["result"]}\n'
         f'Prediction Result: {state["predict"]}'
     )
-    response = llm.invoke(prompt, config=config)
+    response = get_llm().invoke(prompt)
     return {"answer": response.content}
 
 
+def load_result_frame(state: State) -> pd.DataFrame:
+    """
+    Load the rows returned by execute_query as a DataFrame.
+
+    Uses the columnar result referenced by 'result_id'. When the handle has expired from the
+    result store, the SQL query of the state is run again (through the query result cache).
+
+    Args:
+        state (State): The current state containing the result handle and the SQL query.
+
+    Returns:
+        pd.DataFrame: The query rows.
+
+    Raises:
+        ValueError: If the result expired and the state has no SQL query to run again.
+    """
+    query_result = result_store.get(state.get("result_id", ""))
+    if query_result is not None:
+        return query_result.frame
+    if not state.get("query"):
+        raise ValueError("The query result expired and there is no SQL query to run again.")
+    query_result_cache = get_query_result_cache()
+    query_result = query_result_cache.get(state["query"])
+    if query_result is None:
+        query_result = run_query(get_engine(), state["query"])
+        query_result_cache.put(state["query"], query_result)
+    return query_result.frame
+
+
+@traced()
 def predict_overdue_risk_tool(state: State):
     """
     Predict the risk of overdue payments using historical accounts receivable data.
 
-    This tool parses the query results into a DataFrame and applies a prediction model.
+    This tool loads the query results as a DataFrame and applies a prediction model.
 
     Args:
-        state (State): The current state containing the raw SQL result and prediction options.
+        state (State): The current state containing the result handle and prediction options.
 
     Returns:
         dict: A dictionary with the prediction output under the 'predict' key.
     """
-    raw_result = state["result"]
-    rows = ast.literal_eval(raw_result)
-    columns = get_column_names(db, "trades_receivable")
-    df = pd.DataFrame(rows, columns=columns)
+    df = load_result_frame(state).copy()
     df["month_year"] = pd.to_datetime(df["month_year"])
     increase_only = state.get("increase_only", True)
-    prediction = predict_overdue_risk(df, increase_only)
+    prediction = predict_overdue_risk(df, increase_only, store=get_feature_store())
     return {"predict": prediction}
 
 
+@traced()
 def forecast_liquidity_risk_tool(state: State):
     """
     Forecast liquidity risk based on historical working capital data.
 
-    This tool parses the SQL query result, builds a DataFrame, and applies
+    This tool loads the SQL query result as a DataFrame and applies
     a machine learning model to generate liquidity risk predictions.
 
     Args:
-        state (State): The current state containing the raw SQL result.
+        state (State): The current state containing the result handle.
 
     Returns:
         dict: A dictionary with the forecast output under the 'predict' key.
     """
-    raw_result = state["result"]
-    rows = ast.literal_eval(raw_result)
-    columns = get_column_names(db, "working_capital")
-    df = pd.DataFrame(rows, columns=columns)
-    forecast = forecast_liquidity_risk(df)
+    df = load_result_frame(state)
+    forecast = forecast_liquidity_risk(df, store=get_feature_store())
     return {"predict": forecast}
 
 
+@traced()
+def forecast_horizons_tool(state: State):
+    """
+    Project overdue ratios or working capital several months ahead (e.g. 3, 6 and 12 months).
+
+    This tool loads the SQL query result to find the dataset (working capital when the result
+    has a 'working_capital' column, receivables otherwise) and its countries, then projects
+    every country (and due interval, for working capital) with one model per horizon.
+
+    Args:
+        state (State): The current state containing the result handle and, optionally, 'horizons'.
+
+    Returns:
+        dict: A dictionary with the multi-horizon forecast under the 'predict' key.
+    """
+    df = load_result_frame(state)
+    table_name = "working_capital" if "working_capital" in df.columns else "trades_receivable"
+    countries = df["country"].unique() if "country" in df.columns else None
+    forecast = multi_horizon_forecast(
+        table_name, get_feature_store(), state.get("horizons") or FORECAST_HORIZONS, countries
+    )
+    return {"predict": horizon_report(forecast, table_name)}
+
+
+def generate_answer_tool(state: State):
+    output = generate_answer(state)
+    return json.dumps(output, ensure_ascii=False), FinalAnswer(answer=output["answer"])
+
+
+# generate_answer ends the agent run: its tool message carries a FinalAnswer artifact and,
+# being return_direct, the agent does not make another LLM call after it.
+answer_tool = StructuredTool.from_function(
+    generate_answer_tool,
+    name="generate_answer",
+    description=generate_answer.__doc__,
+    response_format="content_and_artifact",
+    return_direct=True,
+)
+
 # Adding the new tools to the list
-tools = [write_query, execute_query, generate_answer, predict_overdue_risk_tool, forecast_liquidity_risk_tool]
+tools = [
+    write_query, execute_query, answer_tool, predict_overdue_risk_tool, forecast_liquidity_risk_tool,
+    forecast_horizons_tool,
+]
 
 ################################ REACT AGENT ################################
-graph = create_react_agent(llm, tools=tools, checkpointer=memory)
+def window_history(state) -> list:
+    """
+    Keep only the most recent turns of the conversation in the agent prompt.
+
+    The window always starts at a user message, so tool calls stay paired with their
+    results, and it always includes the current turn even when it alone exceeds the limit.
+    """
+    messages = state["messages"]
+    human_indexes = [i for i, message in enumerate(messages) if isinstance(message, HumanMessage)]
+    if not human_indexes:
+        return messages
+    start = next((i for i in human_indexes if len(messages) - i <= HISTORY_MAX_MESSAGES), human_indexes[-1])
+    return messages[start:]
+
+
+@lazy_singleton
+def get_graph():
+    return create_react_agent(get_llm(), tools=tools, checkpointer=get_memory(), prompt=window_history)
+
+
+def forget_thread(thread_id: str):
+    """
+    Release the checkpoints kept for a conversation thread.
+    """
+    get_memory().delete_thread(thread_id)
+
+################################ PLANNER ################################
+# Predictive questions follow a fixed sequence (prompt_query_predict_v2.txt): write SQL, execute,
+# predict, answer. They run on an explicit pipeline instead of paying one agent LLM call per tool hop.
+OVERDUE_FORECAST = "overdue_forecast"
+LIQUIDITY_FORECAST = "liquidity_forecast"
+FREE_FORM = "free_form"
+
+FORECAST_PATTERN = re.compile(
+    r"pr[oó]xim[oa]s? m[eê]s|m[eê]s que vem|previs|estimativa futura|proje[cç]|forecast|predict|next month",
+    re.IGNORECASE,
+)
+OVERDUE_PATTERN = re.compile(
+    r"inadimpl|contas a receber|receb[ií]ve|overdue|trades[ _]receivable",
+    re.IGNORECASE,
+)
+LIQUIDITY_PATTERN = re.compile(
+    r"liquidez|capital de giro|risco financeiro|working[ _]capital|liquidity",
+    re.IGNORECASE,
+)
+# "próximos 3, 6 e 12 meses", "next 12 months", "daqui a 6 meses": multi-horizon projections. Only
+# forward wording counts: "últimos 12 meses" / "last 6 months" is the history window, not a horizon.
+HORIZONS_PATTERN = re.compile(
+    r"(?:pr[oó]xim[oa]s|next|daqui a)\s+((?:\d+\s*(?:,|e|and|/)\s*)*\d+)\s*(?:meses|months)",
+    re.IGNORECASE,
+)
+NEXT_MONTH_PATTERN = re.compile(r"pr[oó]xim[oa] m[eê]s|m[eê]s que vem|next month", re.IGNORECASE)
+
+
+def parse_horizons(question: str) -> list:
+    """
+    Return the horizons (months ahead) asked in a question, e.g. [3, 6, 12]; [1] for next month only.
+    """
+    horizons = set()
+    for match in HORIZONS_PATTERN.finditer(question):
+        horizons.update(int(h) for h in re.findall(r"\d+", match.group(1)))
+    if NEXT_MONTH_PATTERN.search(question) or not horizons:
+        horizons.add(1)
+    return sorted(h for h in horizons if 1 <= h <= 36)
+
+
+def classify_intent(question: str) -> str:
+    """
+    Classify a question into a forecast pipeline or the free-form ReAct agent.
+
+    Args:
+        question (str): The user message, prefixed with the database markers.
+
+    Returns:
+        str: OVERDUE_FORECAST, LIQUIDITY_FORECAST or FREE_FORM.
+    """
+    if not (FORECAST_PATTERN.search(question) or HORIZONS_PATTERN.search(question)):
+        return FREE_FORM
+    overdue = bool(OVERDUE_PATTERN.search(question))
+    liquidity = bool(LIQUIDITY_PATTERN.search(question))
+    if overdue == liquidity:
+        return FREE_FORM
+    return OVERDUE_FORECAST if overdue else LIQUIDITY_FORECAST
+
+
+class PipelineState(State, total=False):
+    intent: str
+
+
+def route_forecast(state: PipelineState) -> str:
+    """Send the loaded data to the prediction tool of the intent, or stop if the query failed."""
+    if not state.get("result_id"):
+        return END
+    if any(horizon > 1 for horizon in state.get("horizons") or []):
+        return "forecast_horizons_tool"
+    if state["intent"] == OVERDUE_FORECAST:
+        return "predict_overdue_risk_tool"
+    return "forecast_liquidity_risk_tool"
+
+
+pipeline_builder = StateGraph(PipelineState)
+pipeline_builder.add_node("write_query", write_query, input=PipelineState)
+pipeline_builder.add_node("execute_query", execute_query, input=PipelineState)
+pipeline_builder.add_node("predict_overdue_risk_tool", predict_overdue_risk_tool, input=PipelineState)
+pipeline_builder.add_node("forecast_liquidity_risk_tool", forecast_liquidity_risk_tool, input=PipelineState)
+pipeline_builder.add_node("forecast_horizons_tool", forecast_horizons_tool, input=PipelineState)
+pipeline_builder.add_node("generate_answer", generate_answer, input=PipelineState)
+pipeline_builder.add_edge(START, "write_query")
+pipeline_builder.add_edge("write_query", "execute_query")
+pipeline_builder.add_conditional_edges(
+    "execute_query", route_forecast,
+    ["predict_overdue_risk_tool", "forecast_liquidity_risk_tool", "forecast_horizons_tool", END],
+)
+pipeline_builder.add_edge("predict_overdue_risk_tool", "generate_answer")
+pipeline_builder.add_edge("forecast_liquidity_risk_tool", "generate_answer")
+pipeline_builder.add_edge("forecast_horizons_tool", "generate_answer")
+pipeline_builder.add_edge("generate_answer", END)
+
+
+@lazy_singleton
+def get_forecast_pipeline():
+    return pipeline_builder.compile()
+
+
+def pipeline_inputs(user_command: str, intent: str) -> dict:
+    return {
+        "question": user_command, "intent": intent, "predict": "", "increase_only": True, "threshold": 0.0,
+        "horizons": parse_horizons(user_command),
+    }
+
+
+def remember_turn(user_command: str, answer: str, thread_id: str):
+    """
+    Record a turn answered by the forecast pipeline in the agent memory, so follow-up
+    questions handled by the ReAct agent still see it.
+    """
+    get_graph().update_state(
+        config_for(thread_id),
+        {"messages": [HumanMessage(content=user_command), AIMessage(content=answer)]},
+        as_node="agent",
+    )
 
 ################################ MAIN ################################
-def analytics_accelerator_function(user_command):
-    inputs = {"messages": user_command}
-    stream = graph.stream(inputs, stream_mode="values", config=config)
-    for s in stream:
-        message = s["messages"][-1]
-        message_content = message.content
-        print(message_content)
-        if ("answer" in message_content):
-            answer_dict_str = message_content.replace("\n", "\\n")
-            answer_dict = json.loads(answer_dict_str)
-            return(answer_dict["answer"])
+def warm_up():
+    """
+    Build the agent singletons ahead of the first request: database engine and schema context,
+    chat model, caches, prompt, checkpointer, feature store and both graphs.
+    """
+    for get in (get_schema_context, get_sql_cache, get_query_result_cache, get_query_prompt_template,
+                get_feature_store, get_prediction_cache, get_graph, get_forecast_pipeline):
+        get()
+
+
+def final_answer(message):
+    """
+    Return the FinalAnswer carried by a generate_answer tool message, or None.
+    """
+    if isinstance(message, ToolMessage) and isinstance(message.artifact, FinalAnswer):
+        return message.artifact
+    return None
+
+
+def analytics_accelerator_function(user_command, thread_id, deadline_seconds=None, max_steps=None):
+    """
+    Run the agent and return its final answer.
+
+    Streaming stops as soon as the answer arrives. When the run exceeds the deadline or the
+    step budget, a message saying no answer could be produced is returned instead.
+    """
+    for event in stream_agent_events(user_command, thread_id, deadline_seconds, max_steps):
+        if event["event"] == "answer":
+            return event["content"]
+        if event["event"] == "error":
+            return f"⚠️ Não foi possível gerar a resposta: {event['content']}"
+    return "⚠️ Não foi possível gerar a resposta para esta pergunta."
+
 
+def _bounded(stream, deadline: float):
+    """
+    Iterate a graph stream until it ends or the deadline passes. The stream is closed
+    when the caller stops early, which stops the graph run.
+    """
+    try:
+        for chunk in stream:
+            yield chunk
+            if time.monotonic() > deadline:
+                raise TimeoutError("deadline exceeded")
+    finally:
+        stream.close()
+
+
+def stream_agent_events(user_command, thread_id, deadline_seconds=None, max_steps=None):
+    """
+    Run the agent and yield its progress as events, as they happen.
+
+    Events are dicts with an 'event' key:
+        - 'tool_started': the agent called a tool ('tool', 'args').
+        - 'sql_generated': write_query produced a query ('query').
+        - 'rows_fetched': execute_query returned rows ('rows', 'preview').
+        - 'token': a token of the final answer being generated ('content').
+        - 'answer': the final answer from generate_answer ('content').
+        - 'error': the run exceeded its deadline or step budget ('content').
 
+    Args:
+        user_command (str): The user message, prefixed with the database markers.
+        thread_id (str): Conversation thread whose memory the agent uses.
+        deadline_seconds (float, optional): Overall time budget. Defaults to AGENT_DEADLINE_SECONDS.
+        max_steps (int, optional): Graph step budget. Defaults to AGENT_MAX_STEPS.
+
+    Yields:
+        dict: The agent events, ending with 'answer' or 'error'.
+    """
+    deadline = time.monotonic() + (deadline_seconds or AGENT_DEADLINE_SECONDS)
+    max_steps = max_steps or AGENT_MAX_STEPS
+    # One trace per question: the node, tool and LLM spans of the run are children of this span.
+    with tracer.span("agent_run", thread_id=thread_id) as span:
+        for event in _agent_events(user_command, thread_id, deadline, max_steps):
+            if event["event"] == "error":
+                span.status = "error"
+                span.set("error", event["content"])
+            yield event
+
+
+def _agent_events(user_command, thread_id, deadline, max_steps):
+    try:
+        intent = classify_intent(user_command)
+        current_span().set("intent", intent)
+        if intent != FREE_FORM:
+            for event in _stream_forecast_pipeline(user_command, intent, deadline, max_steps):
+                if event["event"] == "answer":
+                    remember_turn(user_command, event["content"], thread_id)
+                    yield event
+                    return
+                yield event
+
+        yield from _stream_react_agent(user_command, thread_id, deadline, max_steps)
+    except TimeoutError:
+        yield {"event": "error", "content": "tempo limite excedido."}
+    except GraphRecursionError:
+        yield {"event": "error", "content": "limite de etapas do agente excedido."}
+
+
+def _answer_token(chunk, node: str):
+    message_chunk, metadata = chunk
+    if (metadata.get("langgraph_node") == node and isinstance(message_chunk, AIMessageChunk)
+            and isinstance(message_chunk.content, str) and message_chunk.content):
+        return {"event": "token", "content": message_chunk.content}
+    return None
+
+
+def _rows_fetched(output: dict) -> dict:
+    query_result = result_store.get(output.get("result_id", ""))
+    return {
+        "event": "rows_fetched",
+        "rows": query_result.row_count if query_result is not None else 0,
+        "preview": output.get("result", ""),
+    }
+
+
+def _tool_output(message: ToolMessage) -> dict:
+    try:
+        return json.loads(message.content)
+    except (TypeError, ValueError):
+        return {}
+
+
+def _stream_react_agent(user_command, thread_id, deadline, max_steps):
+    inputs = {"messages": user_command}
+    run_config = {**config_for(thread_id), "recursion_limit": max_steps}
+    stream = get_graph().stream(inputs, stream_mode=["updates", "messages"], config=run_config)
+    answer_event = None
+    for mode, chunk in _bounded(stream, deadline):
+        if mode == "messages":
+            token = _answer_token(chunk, "tools")
+            if token is not None:
+                yield token
+            continue
+
+        for update in chunk.values():
+            for message in (update or {}).get("messages", []):
+                answer = final_answer(message)
+                if answer is not None:
+                    # generate_answer is return_direct, so the run ends right after this step. The
+                    # answer is yielded once the stream is drained: callers that stop at the answer
+                    # would otherwise close the stream before the step is checkpointed, leaving the
+                    # thread with a tool call without its result.
+                    answer_event = {"event": "answer", "content": answer.answer}
+                elif isinstance(message, AIMessage):
+                    for tool_call in message.tool_calls:
+                        yield {"event": "tool_started", "tool": tool_call["name"], "args": tool_call["args"]}
+                elif isinstance(message, ToolMessage):
+                    output = _tool_output(message)
+                    if message.name == "write_query" and "query" in output:
+                        yield {"event": "sql_generated", "query": output["query"]}
+                    elif message.name == "execute_query":
+                        yield _rows_fetched(output)
+
+    if answer_event is not None:
+        yield answer_event
+    else:
+        # When the step budget runs out the agent stops on its own, without calling generate_answer.
+        yield {"event": "error", "content": "o agente encerrou sem gerar uma resposta final."}
+
+
+def _stream_forecast_pipeline(user_command, intent, deadline, max_steps):
+    inputs = pipeline_inputs(user_command, intent)
+    yield {"event": "tool_started", "tool": "write_query", "args": {"intent": intent}}
+    stream = get_forecast_pipeline().stream(
+        inputs, stream_mode=["updates", "messages"], config={"recursion_limit": max_steps}
+    )
+    for mode, chunk in _bounded(stream, deadline):
+        if mode == "messages":
+            token = _answer_token(chunk, "generate_answer")
+            if token is not None:
+                yield token
+            continue
+
+        for node, update in chunk.items():
+            update = update or {}
+            if node == "write_query":
+                yield {"event": "sql_generated", "query": update.get("query", "")}
+                yield {"event": "tool_started", "tool": "execute_query", "args": {}}
+            elif node == "execute_query":
+                yield _rows_fetched(update)
+                if update.get("result_id"):
+                    yield {"event": "tool_started", "tool": route_forecast({**inputs, **update}), "args": {}}
+            elif node in ("predict_overdue_risk_tool", "forecast_liquidity_risk_tool", "forecast_horizons_tool"):
+                yield {"event": "tool_started", "tool": "generate_answer", "args": {}}
+            elif node == "generate_answer" and update.get("answer"):
+                yield {"event": "answer", "content": update["answer"]}
+                return
@@ -11,6 +11,8 @@ from langgraph.checkpoint.memory import MemorySaver
 
 from sqlalchemy import create_engine
 from llm.azure_llm import create_azure_chat_llm
+from utils import parse_databases_markers
+from db.schema_context import SchemaContextCache
 import json
 
 memory = MemorySaver()
@@ -19,6 +21,8 @@ config = {"configurable": {"thread_id": "2"}} # CONFIG (memory)
 db_name = "db/acelerador-analytics-finance.db"
 engine = create_engine(f"sqlite:///{db_name}")
 db = SQLDatabase(engine)
+schema_context = SchemaContextCache(db, db_name)
+schema_context.warm()
 
 ################################ MODELO ################################
 llm = create_azure_chat_llm()
@@ -51,7 +55,7 @@ def write_query(state: State):
         {
             "dialect": db.dialect,
             "top_k": 10,
-            "tables_info": "\n".join([db.get_table_info([table_name]) for table_name in db.get_usable_table_names()]),
+            "tables_info": schema_context.tables_info(parse_databases_markers(state["question"])),
             "input": state["question"],
         }
     )
@@ -1,10 +1,17 @@
 import os
+import json
 import uuid
-from flask import Flask, request, render_template, make_response, redirect, url_for, session, jsonify
+from flask import Flask, request, render_template, make_response, redirect, url_for, session, jsonify, Response, stream_with_context
 import identity.web
 from dotenv import load_dotenv
 # from agents.supervisor_langgraph import analytics_accelerator_function
-from agents.superagent_finance import analytics_accelerator_function
+from agents.superagent_finance import analytics_accelerator_function, stream_agent_events, warm_up
+from startup import start_warm_up
+from agent_jobs import job_runner
+from tracing import tracer
+from logger_config import logging_metrics
+from llm.azure_llm import llm_metrics
+from conversation_store import ConversationStore
 import markdown
 from utils import databases_markers, format_markdown_output
 
@@ -29,9 +36,28 @@ auth = identity.web.Auth(
     client_credential=CLIENT_SECRET,
 )
 
-    
-# Lista para armazenar as mensagens
-messages = [{'sender': 'bot', 'content': "Olá! Eu sou a LIA, sua especialista digital em insights financeiros. Como posso ajudar?"}]
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "50"))
+
+# Conversas por sessão (mensagens + thread do agente). A thread do agente é o user_id da sessão e
+# fica no checkpointer durável (com limite de tamanho próprio): sessões ociosas liberam só as
+# mensagens em memória, e a conversa continua após um restart ou em outro worker.
+conversations = ConversationStore()
+
+# Banco, LLM, caches e grafos do agente são criados no primeiro uso; com AGENT_WARM_UP
+# ("background" ou "blocking") são criados já na inicialização.
+start_warm_up(warm_up)
+
+def current_user_id():
+    """Retorna o user_id da sessão, criando um se ainda não existir."""
+    if not session.get('user_id'):
+        session['user_id'] = str(uuid.uuid4())
+    return session['user_id']
+
+def latest_messages(user_id):
+    """Retorna a última página de mensagens da conversa."""
+    total = conversations.count(user_id)
+    messages, _ = conversations.page(user_id, max(total - MESSAGES_PAGE_SIZE, 0), MESSAGES_PAGE_SIZE)
+    return messages
 
 @app.route("/")
 def index():
@@ -82,17 +108,85 @@ def send_message():
     user_message = request.json.get('message')
     selected_dbs = request.json.get('databases', [])
     db_marker = databases_markers(selected_dbs)
+    user_id = current_user_id()
     if user_message:
-        messages.append({'sender': 'user', 'content': user_message})
-        bot_response = analytics_accelerator_function(f"{db_marker} {user_message}")
+        conversations.append(user_id, 'user', user_message)
+        thread_id = conversations.get(user_id).thread_id
+        bot_response = analytics_accelerator_function(f"{db_marker} {user_message}", thread_id)
         bot_response_html = markdown.markdown(bot_response)
         formatted_bot_response_html = format_markdown_output(bot_response_html)
-        messages.append({'sender': 'bot', 'content': formatted_bot_response_html})
-    return jsonify(messages)
+        conversations.append(user_id, 'bot', formatted_bot_response_html)
+    return jsonify(latest_messages(user_id))
+
+@app.route('/send_message_async', methods=['POST'])
+def send_message_async():
+    """
+    Inicia a execução do agente em background e retorna o id do job.
+    Os eventos da execução são acompanhados em /stream/<job_id>.
+    """
+    user_message = request.json.get('message')
+    selected_dbs = request.json.get('databases', [])
+    db_marker = databases_markers(selected_dbs)
+    if not user_message:
+        return jsonify({'error': 'Missing message.'}), 400
+
+    user_id = current_user_id()
+    conversations.append(user_id, 'user', user_message)
+    thread_id = conversations.get(user_id).thread_id
+
+    def on_event(event):
+        if event['event'] == 'answer':
+            bot_response_html = markdown.markdown(event['content'])
+            formatted_bot_response_html = format_markdown_output(bot_response_html)
+            conversations.append(user_id, 'bot', formatted_bot_response_html)
+            return {**event, 'html': formatted_bot_response_html}
+
+    job_id = job_runner.submit(
+        stream_agent_events, f"{db_marker} {user_message}", thread_id, on_event=on_event, owner=user_id
+    )
+    return jsonify({'job_id': job_id}), 202
+
+@app.route('/stream/<job_id>', methods=['GET'])
+def stream(job_id):
+    """
+    Server-sent events com o progresso do agente: ferramentas, SQL gerado, linhas retornadas,
+    tokens e a resposta final. Só a sessão que iniciou o job recebe seus eventos.
+
+    Os jobs ficam na memória do processo: rode o app com um único worker (gunicorn -w 1 --threads N).
+    """
+    owner = session.get('user_id')
+
+    def event_stream():
+        for event in job_runner.events(job_id, owner):
+            yield f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream_with_context(event_stream()), mimetype='text/event-stream', headers=headers)
 
 @app.route('/get_messages', methods=['GET'])
 def get_messages():
-    return jsonify(messages)
+    """
+    Retorna as mensagens da sessão. Aceita paginação por `offset` e `limit`;
+    sem `offset`, retorna as últimas `limit` mensagens. O total vai no header X-Total-Count.
+    """
+    user_id = current_user_id()
+    limit = request.args.get('limit', MESSAGES_PAGE_SIZE, type=int)
+    offset = request.args.get('offset', type=int)
+    if offset is None:
+        offset = max(conversations.count(user_id) - limit, 0)
+    messages, total = conversations.page(user_id, offset, limit)
+    response = jsonify(messages)
+    response.headers['X-Total-Count'] = str(total)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Latência por span (p50/p95/p99, histograma cumulativo em ms) de cada nó, ferramenta,
+    chamada de LLM e fit/predict dos modelos, com tokens e linhas somados, mais os contadores
+    dos clientes de chat e do pipeline de logs (registros exportados e descartados por sink).
+    """
+    return jsonify({'spans': tracer.metrics.snapshot(), 'llm': llm_metrics(), 'logging': logging_metrics()})
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
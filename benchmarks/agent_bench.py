@@ -0,0 +1,249 @@
+"""
+Offline load test of the finance agent.
+
+Replays the questions of benchmarks/questions.json through `analytics_accelerator_function` and/or
+POST /send_message, with the scripted fake chat model (no network), and reports requests/sec,
+latency percentiles, the time spent per span (graph nodes, tools, LLM and model calls) and the
+peak RSS. The results are compared against a baseline generated on this machine with
+--save-baseline (benchmarks/baseline.json, not versioned): timings depend on the hardware, so a
+baseline of another host or run configuration is not used as a gate and the run is only reported.
+
+    python -m benchmarks.agent_bench
+    python -m benchmarks.agent_bench --target http --concurrency 8 --rounds 5
+    python -m benchmarks.agent_bench --save-baseline
+
+The caches, checkpoints, feature store and models of the run live in a temporary directory, so
+every run starts cold: a warm-up pass (model training, feature materialization, SQL cache fill)
+runs before the measured rounds and is reported separately.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import platform
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from benchmarks.common import bench_env, peak_rss_mb
+
+STATE_DIR = tempfile.mkdtemp(prefix="agent-bench-")
+# Set before the agent modules are imported: they read their configuration at import time.
+os.environ.update(bench_env(STATE_DIR))
+os.environ.setdefault("LOG_CONSOLE_LEVEL", "WARNING")
+
+from tracing import tracer, SpanMetrics  # noqa: E402
+from utils import databases_markers  # noqa: E402
+from agents.superagent_finance import analytics_accelerator_function, forget_thread  # noqa: E402
+from benchmarks.scripted_llm import load_corpus  # noqa: E402
+
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), "baseline.json")
+FAILED_ANSWER_PREFIX = "⚠️ Não foi possível"
+LATENCY_PERCENTILES = (50, 90, 95, 99)
+
+
+class FunctionClient:
+    """Calls the agent in process, one conversation thread per worker."""
+
+    def __init__(self):
+        self.thread_id = f"bench-{uuid.uuid4().hex[:8]}"
+
+    def ask(self, entry: dict) -> bool:
+        message = f"{databases_markers(entry['databases'])} {entry['message']}"
+        answer = analytics_accelerator_function(message, self.thread_id)
+        return not answer.startswith(FAILED_ANSWER_PREFIX)
+
+    def close(self):
+        forget_thread(self.thread_id)
+
+
+class HttpClient:
+    """Posts to /send_message with a Flask test client, one session (conversation) per worker."""
+
+    def __init__(self):
+        from app import app
+        self.client = app.test_client()
+
+    def ask(self, entry: dict) -> bool:
+        response = self.client.post("/send_message", json={"message": entry["message"], "databases": entry["databases"]})
+        if response.status_code != 200:
+            return False
+        messages = response.get_json()
+        return bool(messages) and FAILED_ANSWER_PREFIX not in str(messages[-1])
+
+    def close(self):
+        self.client.delete_cookie("session")
+
+
+CLIENTS = {"function": FunctionClient, "http": HttpClient}
+
+
+def latency_summary(latencies_ms: list) -> dict:
+    values = np.array(latencies_ms)
+    summary = {f"p{p}": round(float(v), 2) for p, v in zip(LATENCY_PERCENTILES, np.percentile(values, LATENCY_PERCENTILES))}
+    summary.update(mean=round(float(values.mean()), 2), max=round(float(values.max()), 2))
+    return summary
+
+
+def span_breakdown(snapshot: dict) -> dict:
+    """Time per span name, with its share of the total agent run time."""
+    run_total = snapshot.get("agent_run", {}).get("total_ms") or 1.0
+    return {
+        name: {
+            "count": s["count"],
+            "errors": s["errors"],
+            "mean_ms": s["mean_ms"],
+            "p95_ms": s["p95_ms"],
+            "total_ms": s["total_ms"],
+            "share": round(s["total_ms"] / run_total, 3),
+        }
+        for name, s in snapshot.items()
+    }
+
+
+def _replay(client_class, entries: list) -> tuple:
+    client = client_class()
+    latencies, errors = [], 0
+    try:
+        for entry in entries:
+            started = time.perf_counter()
+            try:
+                ok = client.ask(entry)
+            except Exception as e:
+                print(f"Request failed ({entry['message']}): {e!r}", file=sys.stderr)
+                ok = False
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += not ok
+    finally:
+        client.close()
+    return latencies, errors
+
+
+def run_target(target: str, corpus: list, concurrency: int, rounds: int) -> dict:
+    """
+    Replays the corpus once (warm-up) and then `rounds` times over `concurrency` workers.
+
+    Each worker is one conversation replaying its share of the requests in order.
+    """
+    client_class = CLIENTS[target]
+    started = time.perf_counter()
+    warmup_latencies, warmup_errors = _replay(client_class, corpus)
+    warmup_s = time.perf_counter() - started
+
+    tracer.metrics = SpanMetrics()
+    requests = corpus * rounds
+    shares = [requests[i::concurrency] for i in range(concurrency)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda entries: _replay(client_class, entries), shares))
+    wall_s = time.perf_counter() - started
+
+    latencies = [latency for worker_latencies, _ in results for latency in worker_latencies]
+    return {
+        "requests": len(latencies),
+        "errors": sum(errors for _, errors in results),
+        "wall_s": round(wall_s, 3),
+        "rps": round(len(latencies) / wall_s, 2),
+        "latency_ms": latency_summary(latencies),
+        "warmup": {"requests": len(corpus), "errors": warmup_errors, "wall_s": round(warmup_s, 3),
+                   "latency_ms": latency_summary(warmup_latencies)},
+        "spans": span_breakdown(tracer.metrics.snapshot()),
+    }
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns the regressions of the current run against the baseline: throughput, p95 latency
+    or peak RSS worse by more than `tolerance` (a fraction), or failed requests.
+    """
+    regressions = []
+    for target, result in current["targets"].items():
+        if result["errors"] or result["warmup"]["errors"]:
+            regressions.append(f"{target}: {result['errors'] + result['warmup']['errors']} failed requests")
+        reference = baseline.get("targets", {}).get(target)
+        if reference is None:
+            continue
+        if result["rps"] < reference["rps"] * (1 - tolerance):
+            regressions.append(f"{target}: rps {result['rps']} < baseline {reference['rps']}")
+        if result["latency_ms"]["p95"] > reference["latency_ms"]["p95"] * (1 + tolerance):
+            regressions.append(
+                f"{target}: p95 {result['latency_ms']['p95']} ms > baseline {reference['latency_ms']['p95']} ms"
+            )
+    if "peak_rss_mb" in baseline and current["peak_rss_mb"] > baseline["peak_rss_mb"] * (1 + tolerance):
+        regressions.append(f"peak RSS {current['peak_rss_mb']} MB > baseline {baseline['peak_rss_mb']} MB")
+    return regressions
+
+
+def print_report(report: dict, baseline: dict):
+    for target, result in report["targets"].items():
+        reference = baseline.get("targets", {}).get(target, {})
+        latency = result["latency_ms"]
+        print(f"\n== {target}: {result['requests']} requests, {result['errors']} errors, "
+              f"{report['config']['concurrency']} workers, {result['wall_s']} s")
+        print(f"   rps {result['rps']}" + (f" (baseline {reference['rps']})" if reference else ""))
+        print("   latency ms " + " ".join(f"{k}={v}" for k, v in latency.items())
+              + (f" (baseline p95={reference['latency_ms']['p95']})" if reference else ""))
+        print(f"   warm-up {result['warmup']['wall_s']} s, p50={result['warmup']['latency_ms']['p50']} ms")
+        print(f"   {'span':<30}{'count':>7}{'mean ms':>10}{'p95 ms':>10}{'total ms':>12}{'share':>8}")
+        for name, s in sorted(result["spans"].items(), key=lambda item: -item[1]["total_ms"]):
+            print(f"   {name:<30}{s['count']:>7}{s['mean_ms']:>10}{s['p95_ms']:>10}{s['total_ms']:>12}{s['share']:>8.1%}")
+    print(f"\npeak RSS {report['peak_rss_mb']} MB" + (f" (baseline {baseline['peak_rss_mb']} MB)" if "peak_rss_mb" in baseline else ""))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline load test of the finance agent with a scripted fake LLM.")
+    parser.add_argument("--target", choices=["function", "http", "all"], default="all")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--rounds", type=int, default=3, help="measured passes over the corpus")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed regression, as a fraction")
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    corpus = load_corpus()
+    targets = ["function", "http"] if args.target == "all" else [args.target]
+    report = {
+        "config": {"concurrency": args.concurrency, "rounds": args.rounds, "questions": len(corpus),
+                   "python": platform.python_version(), "machine": platform.machine(), "host": platform.node()},
+        "targets": {},
+    }
+    # The agent prints every state it handles; keep the report readable.
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for target in targets:
+            report["targets"][target] = run_target(target, corpus, args.concurrency, args.rounds)
+    report["peak_rss_mb"] = peak_rss_mb()
+
+    baseline = {}
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("config") != report["config"]:
+            print(f"Baseline {args.baseline} comes from another host or configuration and is ignored; "
+                  "regenerate it here with --save-baseline.")
+            baseline = {}
+    elif not args.save_baseline:
+        print(f"No baseline at {args.baseline}: this run is only reported; store one with --save-baseline.")
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2, ensure_ascii=False)
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    regressions = compare(report, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,28 @@
+import os
+import sys
+import resource
+
+
+def bench_env(state_dir: str) -> dict:
+    """
+    Environment of an offline benchmark run: the scripted fake LLM, no trace export, and the
+    caches, checkpoints, feature store and models of the run under `state_dir`.
+    """
+    return {
+        "LLM_PROVIDER": "fake",
+        "LLM_FAKE_SCRIPT": "benchmarks.scripted_llm",
+        "SQL_CACHE_EMBEDDINGS": "none",
+        "SQL_CACHE_DB": os.path.join(state_dir, "sql_cache.db"),
+        "AGENT_CHECKPOINT_DB": os.path.join(state_dir, "checkpoints.db"),
+        "FEATURE_STORE_DB": os.path.join(state_dir, "features.db"),
+        "PREDICTION_CACHE_DB": "",
+        "MODELS_DIR": os.path.join(state_dir, "models"),
+        "TRACE_EXPORT_PATH": "",
+        "SECRET_KEY": "agent-bench",
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of the process (ru_maxrss is in KB on Linux, bytes on macOS)."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
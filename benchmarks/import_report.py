@@ -0,0 +1,126 @@
+"""
+Import-time report of the web app (python -X importtime).
+
+Imports the module in a fresh interpreter with -X importtime and the offline benchmark environment,
+then reports the wall time of the import, the modules with the largest cumulative import time and
+the self time per top-level package. With --warm-up, also times the agent warm-up hook (database,
+schema, LLM client, caches and graphs) after the import.
+
+    python -m benchmarks.import_report
+    python -m benchmarks.import_report --module agents.superagent_finance --top 30 --warm-up
+
+Exits with 1 when one of the modules kept off the request path (LAZY_MODULES) was imported, or
+when the import itself created state files (databases, caches) instead of leaving them to first use.
+"""
+import os
+import re
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+from collections import defaultdict
+from benchmarks.common import bench_env
+
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Imported on first use only (training, PDF reports, DocumentDB, Azure Search), never by `import app`.
+LAZY_MODULES = ("sklearn", "reportlab", "pymongo", "langchain_community.vectorstores")
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+_RESULT_PREFIX = "IMPORT_REPORT "
+_CHILD = """
+import json, os, time
+started = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+result = {{"import_ms": (imported - started) * 1000, "files_created": sorted(os.listdir({state_dir!r}))}}
+if {warm_up}:
+    from agents.superagent_finance import warm_up
+    warm_up()
+    result["warm_up_ms"] = (time.perf_counter() - imported) * 1000
+print({prefix!r} + json.dumps(result))
+"""
+
+
+def parse_importtime(stderr: str) -> list:
+    """Returns (module, self_us, cumulative_us, depth) for each line of the -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            entries.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return entries
+
+
+def import_report(module: str, warm_up: bool = False, top: int = 20) -> dict:
+    state_dir = tempfile.mkdtemp(prefix="import-report-")
+    env = {**os.environ, **bench_env(state_dir), "LOG_CONSOLE_LEVEL": "WARNING"}
+    code = _CHILD.format(module=module, warm_up=warm_up, prefix=_RESULT_PREFIX, state_dir=state_dir)
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code], cwd=REPO_ROOT, env=env, capture_output=True, text=True
+    )
+    result_line = next((line for line in process.stdout.splitlines() if line.startswith(_RESULT_PREFIX)), None)
+    if process.returncode != 0 or result_line is None:
+        raise RuntimeError(f"import {module} failed:\n{process.stderr[-2000:]}")
+
+    entries = parse_importtime(process.stderr)
+    packages = defaultdict(int)
+    for name, self_us, _, _ in entries:
+        packages[name.split(".")[0]] += self_us
+    imported = {name for name, _, _, _ in entries}
+    return {
+        "module": module,
+        **{
+            key: round(value, 1) if isinstance(value, float) else value
+            for key, value in json.loads(result_line[len(_RESULT_PREFIX):]).items()
+        },
+        "modules_imported": len(entries),
+        "top_cumulative_ms": [
+            {"module": name, "cumulative_ms": round(cumulative_us / 1000, 1), "self_ms": round(self_us / 1000, 1)}
+            for name, self_us, cumulative_us, _ in sorted(entries, key=lambda e: -e[2])[:top]
+        ],
+        "packages_self_ms": {
+            name: round(us / 1000, 1) for name, us in sorted(packages.items(), key=lambda p: -p[1])[:top]
+        },
+        "lazy_modules_imported": [
+            name for name in LAZY_MODULES if name in imported
+        ],
+    }
+
+
+def print_report(report: dict):
+    print(f"== import {report['module']}: {report['import_ms']} ms, {report['modules_imported']} modules")
+    if "warm_up_ms" in report:
+        print(f"   warm_up(): {report['warm_up_ms']} ms")
+    print(f"\n   {'module':<60}{'cumulative ms':>15}{'self ms':>10}")
+    for entry in report["top_cumulative_ms"]:
+        print(f"   {entry['module']:<60}{entry['cumulative_ms']:>15}{entry['self_ms']:>10}")
+    print(f"\n   {'package':<60}{'self ms':>15}")
+    for name, ms in report["packages_self_ms"].items():
+        print(f"   {name:<60}{ms:>15}")
+    for name in report["lazy_modules_imported"]:
+        print(f"\nIMPORTED EAGERLY {name}")
+    for name in report["files_created"]:
+        print(f"\nCREATED AT IMPORT {name}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import-time report (python -X importtime) of the web app.")
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--warm-up", action="store_true", help="also time agents.superagent_finance.warm_up()")
+    parser.add_argument("--output", help="also write the report as JSON to this path")
+    args = parser.parse_args(argv)
+
+    report = import_report(args.module, args.warm_up, args.top)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    return 1 if report["lazy_modules_imported"] or report["files_created"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,168 @@
+"""
+Microbenchmarks of the forecasting tools and of `utils.get_column_names` over synthetic ledgers.
+
+For each size, `predict_overdue_risk` and `forecast_liquidity_risk` are timed:
+    - cold: the model is trained (model registry miss, each size has its own registry directory)
+      and the report computed;
+    - model cached: other parameters, so the report is recomputed with the registered model;
+    - memoized: the same call again, answered by the prediction cache (hashes the frame).
+`get_column_names` is timed against a SQLite table of the same size.
+
+    python -m benchmarks.micro_bench
+    python -m benchmarks.micro_bench --sizes 1000,100000,1000000 --output micro.json
+
+Cold runs train a 100-tree Random Forest on 80% of the rows: above ~1M rows they dominate the
+run (10M rows takes hours); use --skip-forecast to time only get_column_names at those sizes.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import sqlite3
+import tempfile
+from contextlib import closing
+import numpy as np
+import pandas as pd
+
+STATE_DIR = tempfile.mkdtemp(prefix="micro-bench-")
+# Fresh model registry, so the first call of each size trains.
+os.environ["MODELS_DIR"] = os.path.join(STATE_DIR, "models")
+os.environ["PREDICTION_CACHE_DB"] = ""
+os.environ["TRACE_EXPORT_PATH"] = ""
+
+from langchain_community.utilities import SQLDatabase  # noqa: E402
+from agents.agent_predict_tools import predict_overdue_risk, forecast_liquidity_risk  # noqa: E402
+from agents.model_registry import registry  # noqa: E402
+from db.ingest import LEDGER_TABLES, MONTH_YEAR_FORMAT  # noqa: E402
+from db.sqlite_access import create_read_engine  # noqa: E402
+from utils import get_column_names  # noqa: E402
+from benchmarks.common import peak_rss_mb  # noqa: E402
+
+
+DEFAULT_SIZES = "1000,10000,100000"
+MAX_MONTHS = 120
+DUE_INTERVALS = ["Not Due", "1-30", "31-60", "61-90", "90+"]
+
+
+def synthetic_ledger(rows: int, seed: int = 42) -> pd.DataFrame:
+    """
+    A ledger with the columns of trades_receivable and working_capital: up to MAX_MONTHS months
+    per country, as many countries as needed to reach `rows`.
+    """
+    rng = np.random.default_rng(seed)
+    months = max(1, min(MAX_MONTHS, rows // 24))
+    countries = -(-rows // months)
+    index = np.arange(rows)
+    month_year = pd.date_range("2015-01-01", periods=months, freq="MS").to_numpy()[index % months]
+    receivable = rng.uniform(1e4, 1e6, rows).round(2)
+    return pd.DataFrame({
+        "id": index + 1,
+        "id_trades": index + 1,
+        "month_year": month_year,
+        "country": np.char.add("Country ", (index // months % countries).astype(str)),
+        "trades_receivable": receivable,
+        "overdue": (receivable * rng.uniform(0, 0.4, rows)).round(2),
+        "dso": rng.uniform(10, 120, rows).round(1),
+        "sales": rng.uniform(1e4, 2e6, rows).round(2),
+        "cei": rng.uniform(0.5, 1, rows).round(3),
+        "art": rng.uniform(1, 12, rows).round(2),
+        "due_interval": np.array(DUE_INTERVALS)[rng.integers(0, len(DUE_INTERVALS), rows)],
+        "working_capital": rng.normal(0, 5e5, rows).round(2),
+    })
+
+
+def timed_ms(fn, repeat: int = 1) -> float:
+    """Best wall time of `repeat` calls, in ms."""
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, (time.perf_counter() - started) * 1000)
+    return round(best, 2)
+
+
+def bench_forecast(fn, df: pd.DataFrame, cold_kwargs: dict, cached_kwargs: dict, repeat: int) -> dict:
+    return {
+        "cold_ms": timed_ms(lambda: fn(df, **cold_kwargs)),
+        "model_cached_ms": timed_ms(lambda: fn(df, **cached_kwargs)),
+        "memoized_ms": timed_ms(lambda: fn(df, **cached_kwargs), repeat),
+    }
+
+
+def ledger_database(df: pd.DataFrame, table_name: str = "trades_receivable") -> str:
+    """Writes the ledger to a SQLite file with the schema of `table_name` (db/ingest.py)."""
+    path = os.path.join(STATE_DIR, f"ledger-{len(df)}.db")
+    columns = LEDGER_TABLES[table_name]
+    rows = df[[name for name, _ in columns]].assign(month_year=df["month_year"].dt.strftime(MONTH_YEAR_FORMAT))
+    with closing(sqlite3.connect(path)) as conn, conn:
+        conn.execute(f'CREATE TABLE "{table_name}" ({", ".join(f"{n} {t}" for n, t in columns)})')
+        conn.executemany(
+            f'INSERT INTO "{table_name}" VALUES ({", ".join("?" * len(columns))})',
+            rows.itertuples(index=False, name=None),
+        )
+    return path
+
+
+def bench_column_names(df: pd.DataFrame, repeat: int) -> dict:
+    path = ledger_database(df)
+    engine = create_read_engine(path, log_full_scans=False)
+    try:
+        cold = timed_ms(lambda: get_column_names(SQLDatabase(engine), "trades_receivable"))
+        db = SQLDatabase(engine)
+        return {
+            "cold_ms": cold,
+            "warm_ms": timed_ms(lambda: get_column_names(db, "trades_receivable"), repeat),
+        }
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+def run(sizes: list, repeat: int, skip_forecast: bool) -> dict:
+    results = {}
+    for rows in sizes:
+        df = synthetic_ledger(rows)
+        result = {"countries": int(df["country"].nunique()), "months": int(df["month_year"].nunique())}
+        if not skip_forecast:
+            # Models are keyed by the ingestion version, which the synthetic sizes share.
+            registry.models_dir = os.path.join(STATE_DIR, "models", str(rows))
+            result["predict_overdue_risk"] = bench_forecast(
+                predict_overdue_risk, df, {"increase_only": True}, {"increase_only": False}, repeat
+            )
+            result["forecast_liquidity_risk"] = bench_forecast(
+                forecast_liquidity_risk, df, {"threshold": 0.0}, {"threshold": 1.0}, repeat
+            )
+        result["get_column_names"] = bench_column_names(df, repeat)
+        result["peak_rss_mb"] = peak_rss_mb()
+        results[str(rows)] = result
+        print_result(rows, result)
+    return results
+
+
+def print_result(rows: int, result: dict):
+    print(f"\n== {rows:,} rows ({result['countries']} countries x {result['months']} months), "
+          f"peak RSS {result['peak_rss_mb']} MB")
+    for name in ("predict_overdue_risk", "forecast_liquidity_risk", "get_column_names"):
+        if name in result:
+            print(f"   {name:<26}" + "  ".join(f"{k}={v}" for k, v in result[name].items()))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks of the forecasting tools and get_column_names.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated ledger sizes (rows)")
+    parser.add_argument("--repeat", type=int, default=5, help="calls timed for the warm measurements (best kept)")
+    parser.add_argument("--skip-forecast", action="store_true", help="only time get_column_names")
+    parser.add_argument("--output", help="also write the results as JSON to this path")
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    results = run(sizes, args.repeat, args.skip_forecast)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
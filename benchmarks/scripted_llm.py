@@ -0,0 +1,90 @@
+"""
+Deterministic script for the fake chat model (llm/fake_llm.py), used by the benchmarks.
+
+Selected with LLM_PROVIDER=fake and LLM_FAKE_SCRIPT=benchmarks.scripted_llm. The SQL of each
+question comes from the corpus (benchmarks/questions.json); the ReAct agent is driven through
+write_query -> execute_query -> [prediction tool] -> generate_answer with canned tool calls.
+"""
+import os
+import re
+import json
+import itertools
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+
+CORPUS_PATH = os.path.join(os.path.dirname(__file__), "questions.json")
+FALLBACK_SQL = "SELECT * FROM trades_receivable LIMIT 10"
+ANSWER_PROMPT_PREFIX = "Given the following user question"
+
+_call_ids = itertools.count(1)
+
+
+def load_corpus(path: str = CORPUS_PATH) -> list:
+    """Returns the benchmark questions: dicts with 'databases', 'message', 'sql' and optional 'tools'."""
+    with open(path, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+corpus = load_corpus()
+# Longest messages first, so a question that contains another one is matched by its own entry.
+_entries = sorted(corpus, key=lambda entry: len(entry["message"]), reverse=True)
+
+
+def _text(messages) -> str:
+    return "\n".join(str(message.content) for message in messages)
+
+
+def corpus_entry(text: str) -> dict:
+    """Returns the corpus entry whose message appears in the text, or an empty dict."""
+    return next((entry for entry in _entries if entry["message"] in text), {})
+
+
+def structured_responses(messages, schema) -> dict:
+    """SQL of the question in the write_query prompt."""
+    return {"query": corpus_entry(_text(messages)).get("sql", FALLBACK_SQL)}
+
+
+def _state(question: str, **values) -> dict:
+    return {"question": question, "query": "", "result": "", "predict": "", "answer": "",
+            "increase_only": True, "threshold": 0.0, **values}
+
+
+def _tool_output(message: ToolMessage) -> dict:
+    try:
+        return json.loads(message.content)
+    except (TypeError, ValueError):
+        return {}
+
+
+def _answer(prompt: str) -> AIMessage:
+    question = re.search(r"Question: (.*)", prompt)
+    prediction = re.search(r"Prediction Result: (.*)", prompt)
+    lines = ["### 📊 Resposta", "", f"**Pergunta:** {question.group(1) if question else ''}", "",
+             "A consulta retornou os dados solicitados (valores em R$)."]
+    if prediction and prediction.group(1).strip():
+        lines += ["", f"**Previsão:** {prediction.group(1).strip()}"]
+    return AIMessage(content="\n".join(lines))
+
+
+def responses(messages) -> AIMessage:
+    """
+    Next message of the agent: the Markdown answer for the generate_answer prompt, otherwise the
+    next tool call of the current turn (after its last user message).
+    """
+    if len(messages) == 1 and str(messages[0].content).startswith(ANSWER_PROMPT_PREFIX):
+        return _answer(str(messages[0].content))
+
+    turn_start = max(i for i, message in enumerate(messages) if isinstance(message, HumanMessage))
+    question = str(messages[turn_start].content)
+    entry = corpus_entry(question)
+    outputs = {m.name: _tool_output(m) for m in messages[turn_start + 1:] if isinstance(m, ToolMessage)}
+    steps = ["write_query", "execute_query", *entry.get("tools", []), "generate_answer"]
+    pending = [step for step in steps if step not in outputs]
+    if not pending:
+        return AIMessage(content="ok")
+
+    values = {}
+    for output in outputs.values():
+        values.update({k: v for k, v in output.items() if k in ("query", "result", "result_id", "predict")})
+    tool_call = {"name": pending[0], "args": {"state": _state(question, **values)}, "id": f"call_{next(_call_ids)}"}
+    return AIMessage(content="", tool_calls=[tool_call])
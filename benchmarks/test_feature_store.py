@@ -0,0 +1,76 @@
+"""
+Tests of the incremental feature-store refresh over an ingested ledger. Run from the repository root:
+
+    python -m pytest benchmarks
+"""
+import sqlite3
+from contextlib import closing
+import pandas as pd
+import pytest
+from db.feature_store import FeatureStore
+from db.ingest import data_versions, ingest_table
+
+
+COUNTRIES = ["Brasil", "Chile"]
+
+
+def write_receivables(path, months: int):
+    month_year = pd.date_range("2024-01-01", periods=months, freq="MS")
+    rows = [
+        {
+            "id": i * len(COUNTRIES) + j, "id_trades": i * len(COUNTRIES) + j,
+            "month_year": month.strftime("%Y-%m-%d"), "country": country,
+            "trades_receivable": 1000.0 + 10 * i, "overdue": 100.0 + i + j, "dso": 40.0 + j,
+            "sales": 2000.0 + i, "cei": 0.8, "art": 1.5, "due_interval": "Not Due",
+        }
+        for i, month in enumerate(month_year) for j, country in enumerate(COUNTRIES)
+    ]
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger_path = str(tmp_path / "ledger.db")
+    csv_path = str(tmp_path / "trades_receivable.csv")
+
+    def ingest(months: int, replace: bool = False) -> dict:
+        write_receivables(csv_path, months)
+        with closing(sqlite3.connect(ledger_path)) as conn:
+            return ingest_table(conn, "trades_receivable", csv_path, replace=replace)
+
+    ingest(6)
+    store = FeatureStore(str(tmp_path / "features.db"), source_path=ledger_path)
+    return store, ingest
+
+
+def test_refresh_materializes_once_per_version(ledger):
+    store, _ = ledger
+    assert store.refresh("trades_receivable") == 6 * len(COUNTRIES)
+    fingerprint = store.fingerprint("trades_receivable")
+
+    assert store.refresh("trades_receivable") == 0
+    assert store.fingerprint("trades_receivable") == fingerprint
+
+
+def test_refresh_appends_only_the_new_months(ledger):
+    store, ingest = ledger
+    store.refresh("trades_receivable")
+    fingerprint = store.fingerprint("trades_receivable")
+
+    assert ingest(8)["inserted"] == 2 * len(COUNTRIES)
+    assert store.refresh("trades_receivable") == 2 * len(COUNTRIES)
+    assert store.fingerprint("trades_receivable") != fingerprint
+    latest = store.latest_by("trades_receivable", ["country"])
+    assert set(latest["month_year"]) == {pd.Timestamp("2024-08-01")}
+
+
+def test_reload_in_place_rebuilds_the_features(ledger):
+    store, ingest = ledger
+    store.refresh("trades_receivable")
+    version = data_versions(store.source_path)["trades_receivable"]
+    fingerprint = store.fingerprint("trades_receivable")
+
+    ingest(6, replace=True)
+    assert data_versions(store.source_path)["trades_receivable"] == version + 1
+    assert store.refresh("trades_receivable") == 6 * len(COUNTRIES)
+    assert store.fingerprint("trades_receivable") != fingerprint
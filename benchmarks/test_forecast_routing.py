@@ -0,0 +1,33 @@
+"""
+Tests of the forecast question routing (intent and horizons). Run from the repository root:
+
+    python -m pytest benchmarks
+"""
+import pytest
+from agents.superagent_finance import (
+    FREE_FORM, LIQUIDITY_FORECAST, OVERDUE_FORECAST, classify_intent, parse_horizons, route_forecast,
+)
+
+
+@pytest.mark.parametrize("question, intent, horizons", [
+    ("Com base nos últimos 12 meses, qual a previsão de inadimplência no próximo mês?", OVERDUE_FORECAST, [1]),
+    ("Qual o risco de liquidez no próximo mês considerando os dados dos últimos 6 meses?", LIQUIDITY_FORECAST, [1]),
+    ("Qual a projeção do capital de giro da Colombia para os próximos 3, 6 e 12 meses?", LIQUIDITY_FORECAST, [3, 6, 12]),
+    ("Como deve evoluir a inadimplência por país nos próximos 6 meses?", OVERDUE_FORECAST, [6]),
+    ("Forecast working capital for the next 12 months", LIQUIDITY_FORECAST, [12]),
+    ("Qual a previsão de inadimplência daqui a 6 meses?", OVERDUE_FORECAST, [6]),
+])
+def test_forecast_questions(question, intent, horizons):
+    assert classify_intent(question) == intent
+    assert parse_horizons(question) == horizons
+
+
+def test_past_windows_are_not_forecasts():
+    assert classify_intent("Qual foi o total de contas a receber nos últimos 6 meses?") == FREE_FORM
+
+
+def test_route_uses_the_horizon_tool_beyond_next_month():
+    state = {"result_id": "r", "intent": OVERDUE_FORECAST}
+    assert route_forecast({**state, "horizons": [1]}) == "predict_overdue_risk_tool"
+    assert route_forecast({**state, "horizons": [1, 6]}) == "forecast_horizons_tool"
+    assert route_forecast({**state, "intent": LIQUIDITY_FORECAST, "horizons": [1]}) == "forecast_liquidity_risk_tool"
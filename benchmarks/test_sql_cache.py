@@ -0,0 +1,45 @@
+"""
+Tests of the SQL cache literal guard. Run from the repository root:
+
+    python -m pytest benchmarks
+"""
+from agents.sql_cache import HashingEmbeddings, SQLQueryCache, question_literals
+
+
+COUNTRIES = frozenset({"Brasil", "Chile", "Coreia do Sul", "1-90 Days"})
+
+
+def semantic_cache(vocabulary=lambda: COUNTRIES) -> SQLQueryCache:
+    # A low threshold: only the literals keep these questions apart.
+    return SQLQueryCache(":memory:", embeddings=HashingEmbeddings(), similarity_threshold=0.5,
+                         vocabulary=vocabulary)
+
+
+def test_literals_match_the_vocabulary_whatever_the_case():
+    terms = semantic_cache()._terms()
+    assert question_literals("vendas do brasil em 2024", terms) == {"brasil", "2024"}
+    assert question_literals("Vendas do Brasil em 2024?", terms) == {"brasil", "2024"}
+    assert question_literals("saldo da coreia do sul no intervalo 1-90 days", terms) == {
+        "coreia do sul", "1 90 days", "1", "90"
+    }
+
+
+def test_literals_without_vocabulary_use_capitalized_words():
+    assert question_literals("Quais as vendas do Chile em 2024?") == {"chile", "2024"}
+
+
+def test_semantic_hit_needs_the_same_country():
+    cache = semantic_cache()
+    cache.put("Quais as vendas do brasil em 2024?", ["trades_receivable"], 1, "SELECT 'BR'")
+
+    assert cache.get("Quais as vendas do chile em 2024?", ["trades_receivable"], 1) is None
+    assert cache.get("quais foram as vendas do Brasil em 2024", ["trades_receivable"], 1) == "SELECT 'BR'"
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_semantic_hit_needs_the_same_scope():
+    cache = semantic_cache()
+    cache.put("Quais as vendas do brasil em 2024?", ["trades_receivable"], 1, "SELECT 'BR'")
+
+    assert cache.get("Quais as vendas do brasil em 2024?", ["trades_payable"], 1) is None
+    assert cache.get("Quais as vendas do brasil em 2024?", ["trades_receivable"], 2) is None
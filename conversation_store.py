@@ -0,0 +1,107 @@
+import os
+import time
+import threading
+from collections import deque, OrderedDict
+
+
+CONVERSATION_MAX_MESSAGES = int(os.getenv("CONVERSATION_MAX_MESSAGES", "200"))
+CONVERSATION_IDLE_SECONDS = int(os.getenv("CONVERSATION_IDLE_SECONDS", "3600"))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000"))
+
+GREETING = "Olá! Eu sou a LIA, sua especialista digital em insights financeiros. Como posso ajudar?"
+
+
+class Conversation:
+    """
+    Messages of one user session and the agent thread that holds its memory.
+
+    The thread id is the session `user_id`, so the durable checkpointer resumes the conversation
+    after a restart, on any worker and after the session was evicted from this store.
+    """
+
+    def __init__(self, user_id: str, max_messages: int):
+        self.thread_id = user_id
+        self.messages = deque([{'sender': 'bot', 'content': GREETING}], maxlen=max_messages)
+        self.last_seen = time.time()
+
+
+class ConversationStore:
+    """
+    Bounded per-session conversation store keyed by `session['user_id']`.
+
+    Each session keeps at most `max_messages` messages and its agent `thread_id`.
+    Sessions idle for more than `idle_seconds` are evicted (least recently used first
+    beyond `max_sessions`), calling `on_evict(thread_id)` if given.
+    """
+
+    def __init__(self, max_messages: int = CONVERSATION_MAX_MESSAGES, idle_seconds: int = CONVERSATION_IDLE_SECONDS,
+                 max_sessions: int = CONVERSATION_MAX_SESSIONS, on_evict=None):
+        self.max_messages = max_messages
+        self.idle_seconds = idle_seconds
+        self.max_sessions = max_sessions
+        self.on_evict = on_evict
+        self._conversations = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> Conversation:
+        """
+        Returns the conversation of a session, creating it if needed.
+        """
+        with self._lock:
+            evicted = self._evict_idle()
+            conversation = self._conversations.get(user_id)
+            if conversation is None:
+                conversation = Conversation(user_id, self.max_messages)
+                self._conversations[user_id] = conversation
+                while len(self._conversations) > self.max_sessions:
+                    _, oldest = self._conversations.popitem(last=False)
+                    evicted.append(oldest.thread_id)
+            conversation.last_seen = time.time()
+            self._conversations.move_to_end(user_id)
+
+        if self.on_evict is not None:
+            for thread_id in evicted:
+                self.on_evict(thread_id)
+        return conversation
+
+    def _evict_idle(self) -> list:
+        now = time.time()
+        evicted = []
+        while self._conversations:
+            user_id, oldest = next(iter(self._conversations.items()))
+            if now - oldest.last_seen <= self.idle_seconds:
+                break
+            del self._conversations[user_id]
+            evicted.append(oldest.thread_id)
+        return evicted
+
+    def append(self, user_id: str, sender: str, content: str):
+        """
+        Appends a message to the conversation of a session.
+        """
+        conversation = self.get(user_id)
+        with self._lock:
+            conversation.messages.append({'sender': sender, 'content': content})
+
+    def count(self, user_id: str) -> int:
+        """
+        Returns the number of messages kept for a session.
+        """
+        return len(self.get(user_id).messages)
+
+    def page(self, user_id: str, offset: int = 0, limit: int = None) -> tuple:
+        """
+        Returns a page of the session messages and the total number of messages.
+
+        Args:
+            offset (int): Index of the first message.
+            limit (int, optional): Maximum number of messages. All remaining messages when None.
+
+        Returns:
+            tuple: (messages, total)
+        """
+        conversation = self.get(user_id)
+        with self._lock:
+            messages = list(conversation.messages)
+        end = None if limit is None else offset + limit
+        return messages[offset:end], len(messages)
@@ -0,0 +1,309 @@
+import os
+import sqlite3
+import threading
+from contextlib import closing
+import pandas as pd
+from db.ingest import data_versions
+from startup import lazy_singleton
+
+
+FEATURE_STORE_DB = os.getenv("FEATURE_STORE_DB", "db/aa-finance-features.db")
+SOURCE_DB = "db/aa-finance-predict.db"
+ROLLING_WINDOW = 3
+# Bumped when the computed features change: older feature tables are rebuilt on the next refresh.
+FEATURES_FORMAT = 2
+
+# Source table -> base columns copied from the ledger, the series that gets lag/rolling features and
+# the keys of one series (working capital has one row per country and due interval each month).
+FEATURE_TABLES = {
+    "trades_receivable": {
+        "columns": ["trades_receivable", "overdue", "dso", "sales", "cei", "art"],
+        "series": "overdue_ratio",
+        "series_keys": ["country"],
+    },
+    "trades_payable": {
+        "columns": ["trades_payable", "overdue", "dpo", "tr_ico_to_pay"],
+        "series": "overdue_ratio",
+        "series_keys": ["country"],
+    },
+    "working_capital": {
+        "columns": ["working_capital"],
+        "series": "working_capital",
+        "series_keys": ["country", "due_interval"],
+    },
+}
+CATEGORY_COLUMNS = ["country", "due_interval"]
+KEY_COLUMNS = ["id_trades", "country", "month_year"]
+
+
+def feature_table(table_name: str) -> str:
+    return f"{table_name}_features"
+
+
+class FeatureStore:
+    """
+    Materialized features of the finance time series, kept in a SQLite file next to the ledger.
+
+    For each source table a `<table>_features` table holds, per `id_trades`/`country`/`month_year`,
+    the calendar columns, the encoded categories, the overdue ratio and the lag/rolling features
+    of the table series. `refresh` only appends the months newer than the last materialized one
+    (the table is rebuilt if older months changed), so the forecasting tools read the latest rows
+    per country and the training columns without recomputing features over the whole ledger.
+    Tables loaded by `db.ingest` are checked against their ingestion version first: while it
+    has not moved, `refresh` does not read the ledger at all.
+
+    Category codes are append-only: values are numbered in sorted order the first time they are
+    seen, so existing codes never change when new countries or intervals show up.
+    """
+
+    def __init__(self, path: str = FEATURE_STORE_DB, source_path: str = SOURCE_DB):
+        self.path = path
+        self.source_path = source_path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS feature_watermarks (
+                table_name TEXT PRIMARY KEY,
+                month_year TEXT,
+                row_count INTEGER,
+                data_version INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS feature_categories (
+                column_name TEXT,
+                value TEXT,
+                code INTEGER,
+                PRIMARY KEY (column_name, value)
+            );
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(feature_watermarks)")}
+        if "data_version" not in columns:
+            self._conn.execute("ALTER TABLE feature_watermarks ADD COLUMN data_version INTEGER")
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] < FEATURES_FORMAT:
+            self._conn.execute("DELETE FROM feature_watermarks")
+            self._conn.execute(f"PRAGMA user_version = {FEATURES_FORMAT}")
+            self._conn.commit()
+        self._lock = threading.Lock()
+
+    def _source_watermark(self, source, table_name: str, month_year=None) -> tuple:
+        if month_year is None:
+            return source.execute(f'SELECT MAX(month_year), COUNT(*) FROM "{table_name}"').fetchone()
+        row_count = source.execute(
+            f'SELECT COUNT(*) FROM "{table_name}" WHERE month_year <= ?', (month_year,)
+        ).fetchone()[0]
+        return month_year, row_count
+
+    def _watermark(self, table_name: str) -> tuple:
+        row = self._conn.execute(
+            "SELECT month_year, row_count, data_version FROM feature_watermarks WHERE table_name = ?", (table_name,)
+        ).fetchone()
+        return row if row is not None else (None, 0, None)
+
+    def refresh(self, table_name: str) -> int:
+        """
+        Brings the features of a table up to date with the ledger.
+
+        The ingestion version of the table (`db.ingest.data_versions`) is compared first; the
+        ledger is only read when it moved or when the table was never ingested. A new version
+        with the same months and row count means the table was reloaded in place: the features
+        are rebuilt. Runs in one write transaction, so concurrent workers never append the same
+        months twice.
+
+        Returns:
+            int: Number of rows materialized by this call.
+        """
+        version = data_versions(self.source_path).get(table_name)
+        month_year, _, materialized_version = self._watermark(table_name)
+        if version is not None and version == materialized_version and month_year is not None:
+            return 0
+
+        with self._lock, closing(sqlite3.connect(self.source_path)) as source:
+            latest, total = self._source_watermark(source, table_name)
+            if (latest, total, version) == self._watermark(table_name):
+                return 0
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                month_year, row_count, materialized_version = self._watermark(table_name)
+                if (latest, total, version) == (month_year, row_count, materialized_version):
+                    self._conn.rollback()
+                    return 0
+                rebuild = (
+                    month_year is None
+                    or self._source_watermark(source, table_name, month_year)[1] != row_count
+                    or (latest, total) == (month_year, row_count)
+                )
+                rows = self._source_rows(source, table_name, None if rebuild else month_year)
+                features = self._compute(table_name, rows, history=None if rebuild else month_year)
+                self._append(table_name, features, rebuild)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO feature_watermarks (table_name, month_year, row_count, data_version) "
+                    "VALUES (?, ?, ?, ?)",
+                    (table_name, latest, total, version),
+                )
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+        return len(features)
+
+    def _source_rows(self, source, table_name: str, month_year=None) -> pd.DataFrame:
+        columns = list(dict.fromkeys(KEY_COLUMNS + CATEGORY_COLUMNS + FEATURE_TABLES[table_name]["columns"]))
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        query = f'SELECT {column_list} FROM "{table_name}"'
+        params = ()
+        if month_year is not None:
+            query += " WHERE month_year > ?"
+            params = (month_year,)
+        return pd.read_sql_query(query + " ORDER BY month_year, rowid", source, params=params)
+
+    def _append(self, table_name: str, features: pd.DataFrame, rebuild: bool):
+        table = feature_table(table_name)
+        if rebuild:
+            self._conn.execute(f'DROP TABLE IF EXISTS "{table}"')
+        schema = pd.io.sql.get_schema(features, table, con=self._conn)
+        self._conn.execute(schema.replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{table}_country_month" ON "{table}" (country, month_year)')
+        placeholders = ", ".join("?" * len(features.columns))
+        self._conn.executemany(
+            f'INSERT INTO "{table}" VALUES ({placeholders})',
+            features.astype(object).where(features.notna(), None).values.tolist(),
+        )
+
+    def _compute(self, table_name: str, rows: pd.DataFrame, history=None) -> pd.DataFrame:
+        spec = FEATURE_TABLES[table_name]
+        series = spec["series"]
+        keys = spec["series_keys"]
+        df = rows.copy()
+        if series == "overdue_ratio":
+            df["overdue_ratio"] = df["overdue"] / df[table_name]
+
+        month_year = pd.to_datetime(df["month_year"])
+        df["month"] = month_year.dt.month
+        df["year"] = month_year.dt.year
+        for column in CATEGORY_COLUMNS:
+            df[f"{column}_encoded"] = self._encode(column, df[column])
+
+        # The lag/rolling windows of the new months need the last months already materialized.
+        context = self._series_tail(table_name, series, keys, history) if history is not None else None
+        window = df
+        if context is not None:
+            window = pd.concat([context, df[[*keys, "month_year", series]]], ignore_index=True)
+        grouped = window.groupby(keys, sort=False)[series]
+        df[f"{series}_lag1"] = grouped.shift(1).iloc[len(window) - len(df):].to_numpy()
+        df[f"{series}_rolling{ROLLING_WINDOW}"] = (
+            grouped.rolling(ROLLING_WINDOW, min_periods=1).mean()
+            .reset_index(level=list(range(len(keys))), drop=True).sort_index()
+            .iloc[len(window) - len(df):].to_numpy()
+        )
+        return df
+
+    def _series_tail(self, table_name: str, series: str, keys: list, month_year: str) -> pd.DataFrame:
+        key_list = ", ".join(f'"{k}"' for k in keys)
+        return pd.read_sql_query(
+            f"""
+            SELECT {key_list}, month_year, {series} FROM (
+                SELECT {key_list}, month_year, {series},
+                       ROW_NUMBER() OVER (PARTITION BY {key_list} ORDER BY month_year DESC) AS recent
+                FROM "{feature_table(table_name)}" WHERE month_year <= ?
+            ) WHERE recent < {ROLLING_WINDOW} ORDER BY month_year
+            """,
+            self._conn, params=(month_year,),
+        )
+
+    def _encode(self, column: str, values: pd.Series) -> pd.Series:
+        vocabulary = dict(self._conn.execute(
+            "SELECT value, code FROM feature_categories WHERE column_name = ?", (column,)
+        ).fetchall())
+        unseen = sorted(set(values.dropna().unique()) - set(vocabulary))
+        if unseen:
+            next_code = len(vocabulary)
+            new_codes = [(column, value, next_code + i) for i, value in enumerate(unseen)]
+            self._conn.executemany(
+                "INSERT INTO feature_categories (column_name, value, code) VALUES (?, ?, ?)", new_codes
+            )
+            vocabulary.update((value, code) for _, value, code in new_codes)
+        return values.map(vocabulary).fillna(-1).astype(int)
+
+    def categories(self, column: str) -> list:
+        """
+        Returns the vocabulary of a category column, ordered by code.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT value FROM feature_categories WHERE column_name = ? ORDER BY code", (column,)
+            ).fetchall()
+        return [value for (value,) in rows]
+
+    def fingerprint(self, table_name: str) -> str:
+        """
+        Fingerprint of the materialized rows: row count, latest month, ingestion version and
+        feature format (e.g. "288:2025-04-01:v3:f2"). Models and memoized reports keyed by it
+        are retrained/recomputed when the table is reloaded, even with the same months.
+        """
+        month_year, row_count, version = self._watermark(table_name)
+        latest = pd.to_datetime(month_year).strftime("%Y-%m-%d") if month_year is not None else "none"
+        return f"{row_count}:{latest}:v{version or 0}:f{FEATURES_FORMAT}"
+
+    def read(self, table_name: str, columns: list) -> pd.DataFrame:
+        """
+        Reads some columns of every materialized row, e.g. the features and target of a model.
+        """
+        column_list = ", ".join(f'"{c}"' for c in columns)
+        with self._lock:
+            return pd.read_sql_query(f'SELECT {column_list} FROM "{feature_table(table_name)}"', self._conn)
+
+    def latest_rows(self, table_name: str, countries, as_of) -> pd.DataFrame:
+        """
+        Reads the most recent row of each country up to `as_of`.
+
+        Args:
+            table_name (str): Source table of the features.
+            countries (list): Countries to read; the result keeps this order.
+            as_of: Latest `month_year` to consider.
+
+        Returns:
+            pd.DataFrame: One row per country, indexed by country.
+        """
+        countries = list(countries)
+        as_of = pd.Timestamp(as_of).strftime("%Y-%m-%d %H:%M:%S.%f")
+        table = feature_table(table_name)
+        placeholders = ", ".join("?" * len(countries))
+        with self._lock:
+            rows = pd.read_sql_query(
+                f"""
+                SELECT * FROM "{table}" AS f
+                WHERE country IN ({placeholders}) AND month_year = (
+                    SELECT MAX(month_year) FROM "{table}" AS latest
+                    WHERE latest.country = f.country AND latest.month_year <= ?
+                )
+                ORDER BY rowid
+                """,
+                self._conn, params=(*countries, as_of), parse_dates=["month_year"],
+            )
+        return rows.groupby("country", sort=False).tail(1).set_index("country").reindex(countries).dropna(how="all")
+
+    def latest_by(self, table_name: str, keys: list) -> pd.DataFrame:
+        """
+        Reads the most recent row of every combination of `keys` (e.g. country and due_interval).
+        """
+        partition = ", ".join(f'"{k}"' for k in keys)
+        with self._lock:
+            rows = pd.read_sql_query(
+                f"""
+                SELECT * FROM (
+                    SELECT *, ROW_NUMBER() OVER (PARTITION BY {partition} ORDER BY month_year DESC, rowid DESC) AS recent
+                    FROM "{feature_table(table_name)}"
+                ) WHERE recent = 1 ORDER BY {partition}
+                """,
+                self._conn, parse_dates=["month_year"],
+            )
+        return rows.drop(columns="recent")
+
+
+# Opened on first use (the forecasting tools, warm_up), not when the agent module is imported.
+@lazy_singleton
+def get_feature_store() -> FeatureStore:
+    return FeatureStore()
@@ -0,0 +1,288 @@
+import os
+import time
+import sqlite3
+import datetime
+import argparse
+from contextlib import closing
+from typing import Iterable, Iterator
+import numpy as np
+import pandas as pd
+from db.sqlite_access import SQLITE_WAL, ensure_indexes
+
+
+LEDGER_DB = "db/aa-finance-predict.db"
+LEDGER_SOURCE = "inputs/Databases/versao_demo"
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "50000"))
+DATA_VERSIONS_TABLE = "_data_versions"
+MONTH_YEAR_FORMAT = "%Y-%m-%d %H:%M:%S.%f"  # format pandas.to_sql stored the dates in
+
+# Schema of the ledger tables (the one the notebooks created with pandas.to_sql). Other sheet
+# columns (the unnamed index, overdue_ratio) are not loaded.
+LEDGER_TABLES = {
+    "trades_receivable": [
+        ("id", "BIGINT"), ("id_trades", "BIGINT"), ("month_year", "DATETIME"), ("country", "TEXT"),
+        ("trades_receivable", "FLOAT"), ("overdue", "FLOAT"), ("dso", "FLOAT"), ("sales", "FLOAT"),
+        ("cei", "FLOAT"), ("art", "FLOAT"), ("due_interval", "TEXT"),
+    ],
+    "trades_payable": [
+        ("id", "BIGINT"), ("id_trades", "BIGINT"), ("month_year", "DATETIME"), ("country", "TEXT"),
+        ("trades_payable", "FLOAT"), ("overdue", "FLOAT"), ("dpo", "FLOAT"), ("tr_ico_to_pay", "FLOAT"),
+        ("due_interval", "TEXT"),
+    ],
+    "working_capital": [
+        ("id_trades", "BIGINT"), ("month_year", "DATETIME"), ("country", "TEXT"),
+        ("working_capital", "FLOAT"), ("due_interval", "TEXT"),
+    ],
+}
+
+
+def _to_datetime(value) -> str:
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.strip())
+    elif isinstance(value, datetime.date) and not isinstance(value, datetime.datetime):
+        value = datetime.datetime(value.year, value.month, value.day)
+    return value.strftime(MONTH_YEAR_FORMAT)
+
+# Types the CSV parser produces directly; dates are kept as text and formatted per distinct value.
+CSV_DTYPES = {"BIGINT": "Int64", "FLOAT": "float64", "TEXT": str, "DATETIME": str}
+
+
+def _with_nulls(values: list, nulls: np.ndarray) -> list:
+    for i in np.flatnonzero(nulls):
+        values[i] = None
+    return values
+
+
+def convert_column(values: pd.Series, sql_type: str) -> list:
+    """
+    Converts a column of a batch (raw cell values) to the Python values stored for `sql_type`.
+
+    Numbers are parsed by pandas in one pass; dates have few distinct values (one per month),
+    so each distinct value is formatted once. Empty cells become NULL.
+    """
+    if values.dtype == object:
+        values = values.mask(values.eq(""), None)
+    if sql_type in ("BIGINT", "FLOAT"):
+        numbers = values if pd.api.types.is_numeric_dtype(values) else pd.to_numeric(values)
+        nulls = numbers.isna().to_numpy()
+        if sql_type == "BIGINT":
+            numbers = numbers.fillna(0).astype(np.int64)
+        return _with_nulls(numbers.tolist(), nulls)
+    if sql_type == "DATETIME":
+        codes, uniques = pd.factorize(values)
+        formatted = np.array([_to_datetime(value) for value in uniques] + [None], dtype=object)
+        return formatted[codes].tolist()
+    nulls = values.isna().to_numpy()
+    return _with_nulls(values.astype(str).tolist(), nulls)
+
+
+def table_name_for(sheet_title: str) -> str:
+    """
+    Table loaded from a sheet: 'Trades Receivable' -> 'trades_receivable'.
+    """
+    return sheet_title.strip().lower().replace(" ", "_")
+
+
+def _sheet_batches(path: str, table_name: str, columns: list, batch_size: int):
+    from openpyxl import load_workbook  # only for workbooks; the agent imports this module for LEDGER_TABLES
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheets = {table_name_for(ws.title): ws for ws in workbook.worksheets}
+        sheet = sheets.get(table_name, workbook.worksheets[0] if len(workbook.worksheets) == 1 else None)
+        if sheet is None:
+            raise ValueError(f"No sheet for table '{table_name}' in {path}.")
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+        missing = [name for name in columns if name not in header]
+        if missing:
+            raise ValueError(f"Sheet of '{table_name}' in {path} is missing the columns {missing}.")
+        positions = [header.index(name) for name in columns]
+
+        batch = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            batch.append([row[p] for p in positions])
+            if len(batch) >= batch_size:
+                yield pd.DataFrame.from_records(batch, columns=columns)
+                batch = []
+        if batch:
+            yield pd.DataFrame.from_records(batch, columns=columns)
+    finally:
+        workbook.close()
+
+
+def read_batches(path: str, table_name: str, batch_size: int = INGEST_BATCH_SIZE):
+    """
+    Streams a ledger table from a CSV export or an Excel file, in DataFrames of `batch_size` rows
+    holding the schema columns as read.
+
+    `path` is either a directory with one file per table (`<table>.csv`, or `<table>.xlsx` read
+    from its first sheet), a CSV file, or a workbook with one sheet per table ('Trades
+    Receivable', ...). Workbooks are streamed in openpyxl read-only mode, which still parses every
+    cell in Python; CSV is read by the pandas C parser and is the fast path for large ledgers.
+    """
+    columns = [name for name, _ in LEDGER_TABLES[table_name]]
+    if os.path.isdir(path):
+        csv_path = os.path.join(path, f"{table_name}.csv")
+        path = csv_path if os.path.exists(csv_path) else os.path.join(path, f"{table_name}.xlsx")
+    if not path.lower().endswith(".csv"):
+        yield from _sheet_batches(path, table_name, columns, batch_size)
+        return
+
+    header = pd.read_csv(path, nrows=0, encoding="utf-8-sig").columns
+    missing = [name for name in columns if name not in header]
+    if missing:
+        raise ValueError(f"{path} is missing the columns {missing} of '{table_name}'.")
+    dtypes = {name: CSV_DTYPES[sql_type] for name, sql_type in LEDGER_TABLES[table_name]}
+    with pd.read_csv(path, usecols=columns, dtype=dtypes, encoding="utf-8-sig",
+                     float_precision="round_trip", chunksize=batch_size) as chunks:
+        for chunk in chunks:
+            yield chunk[columns]
+
+
+def converted_batches(frames: Iterable[pd.DataFrame], table_name: str) -> Iterator[list]:
+    """
+    Converts streamed batches to lists of row tuples in the table schema (see `convert_column`).
+    """
+    schema = LEDGER_TABLES[table_name]
+    for frame in frames:
+        yield list(zip(*(convert_column(frame[name], sql_type) for name, sql_type in schema)))
+
+
+def _ensure_data_versions(conn):
+    conn.execute(
+        f'CREATE TABLE IF NOT EXISTS "{DATA_VERSIONS_TABLE}" ('
+        "table_name TEXT PRIMARY KEY, version INTEGER NOT NULL, month_year TEXT, "
+        "row_count INTEGER, source TEXT, loaded_at TEXT)"
+    )
+
+
+def data_versions(path: str = LEDGER_DB) -> dict:
+    """
+    Returns the data version of every ingested table, `{table_name: version}`.
+
+    The version is bumped by each ingestion that changes a table, so caches of derived data
+    can compare it instead of scanning the tables. Empty if nothing was ingested yet.
+    """
+    if not os.path.exists(path):
+        return {}
+    with closing(sqlite3.connect(path)) as conn:
+        try:
+            return dict(conn.execute(f'SELECT table_name, version FROM "{DATA_VERSIONS_TABLE}"').fetchall())
+        except sqlite3.OperationalError:
+            return {}
+
+
+def ingest_table(conn, table_name: str, source: str, replace: bool = False,
+                 batch_size: int = INGEST_BATCH_SIZE) -> dict:
+    """
+    Loads a ledger table from Excel/CSV into SQLite, in one write transaction.
+
+    By default the load is incremental: only the rows of months newer than the latest
+    `month_year` already in the table are appended. With `replace`, the table is dropped and
+    reloaded. When rows are written, the table version in `_data_versions` is bumped in the
+    same transaction.
+
+    Returns:
+        dict: 'table', 'inserted' and 'skipped' row counts, 'version' and 'seconds'.
+    """
+    schema = LEDGER_TABLES[table_name]
+    month_year_position = [name for name, _ in schema].index("month_year")
+    column_list = ", ".join(f'"{name}" {sql_type}' for name, sql_type in schema)
+    placeholders = ", ".join("?" * len(schema))
+    start = time.perf_counter()
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        _ensure_data_versions(conn)
+        if replace:
+            conn.execute(f'DROP TABLE IF EXISTS "{table_name}"')
+        conn.execute(f'CREATE TABLE IF NOT EXISTS "{table_name}" ({column_list})')
+        watermark = None if replace else conn.execute(f'SELECT MAX(month_year) FROM "{table_name}"').fetchone()[0]
+
+        inserted = skipped = 0
+        for batch in converted_batches(read_batches(source, table_name, batch_size), table_name):
+            if watermark is not None:
+                new_rows = [row for row in batch if row[month_year_position] > watermark]
+                skipped += len(batch) - len(new_rows)
+                batch = new_rows
+            conn.executemany(f'INSERT INTO "{table_name}" VALUES ({placeholders})', batch)
+            inserted += len(batch)
+
+        version = conn.execute(
+            f'SELECT version FROM "{DATA_VERSIONS_TABLE}" WHERE table_name = ?', (table_name,)
+        ).fetchone()
+        version = version[0] if version else 0
+        if inserted or replace:
+            version += 1
+            month_year, row_count = conn.execute(f'SELECT MAX(month_year), COUNT(*) FROM "{table_name}"').fetchone()
+            conn.execute(
+                f'INSERT OR REPLACE INTO "{DATA_VERSIONS_TABLE}" VALUES (?, ?, ?, ?, ?, ?)',
+                (table_name, version, month_year, row_count, os.path.abspath(source),
+                 datetime.datetime.now().isoformat(timespec="seconds")),
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return {"table": table_name, "inserted": inserted, "skipped": skipped, "version": version,
+            "seconds": time.perf_counter() - start}
+
+
+def ingest(source: str = LEDGER_SOURCE, path: str = LEDGER_DB, tables=None, replace: bool = False,
+           batch_size: int = INGEST_BATCH_SIZE) -> list:
+    """
+    Loads the ledger tables from Excel/CSV, then builds the read-path indexes.
+
+    Parameters:
+    -----------
+    source : str
+        Directory with one file per table (`<table>.csv` or `<table>.xlsx`), a CSV file (with
+        a single table in `tables`) or a workbook with one sheet per table.
+
+    tables : list, optional
+        Tables to load (default: every ledger table).
+
+    replace : bool, optional (default=False)
+        Reload the tables from scratch instead of appending the new months.
+
+    Returns:
+    --------
+    list
+        One report per table (see `ingest_table`).
+    """
+    reports = []
+    with closing(sqlite3.connect(path, isolation_level=None)) as conn:
+        if SQLITE_WAL:
+            conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA cache_size=-262144")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        for table_name in tables or LEDGER_TABLES:
+            reports.append(ingest_table(conn, table_name, source, replace, batch_size))
+
+    # Indexes are built after the bulk load (a replaced table lost them); appends only need fresh statistics.
+    created = ensure_indexes(path)
+    if not created and any(report["inserted"] for report in reports):
+        with closing(sqlite3.connect(path)) as conn:
+            conn.execute("ANALYZE")
+    return reports
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Loads the finance ledger from Excel/CSV into SQLite.")
+    parser.add_argument("source", nargs="?", default=LEDGER_SOURCE,
+                        help="directory with <table>.csv/.xlsx files, a CSV file or a workbook with one sheet per table")
+    parser.add_argument("--db", default=LEDGER_DB, help="SQLite database to load")
+    parser.add_argument("--tables", nargs="+", choices=list(LEDGER_TABLES), help="tables to load")
+    parser.add_argument("--replace", action="store_true", help="reload the tables instead of appending new months")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    for report in ingest(args.source, args.db, args.tables, args.replace, args.batch_size):
+        print(
+            f"{report['table']}: {report['inserted']} rows inserted, {report['skipped']} skipped "
+            f"(version {report['version']}, {report['seconds']:.2f}s)"
+        )
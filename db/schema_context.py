@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+from langchain_community.utilities import SQLDatabase
+from db.ingest import LEDGER_TABLES, data_versions
+
+# Text columns of the ledger tables (country, due_interval): their values are the literals of a question.
+CATEGORY_COLUMNS = {
+    table_name: [name for name, sql_type in columns if sql_type == "TEXT"]
+    for table_name, columns in LEDGER_TABLES.items()
+}
+
+
+class SchemaContextCache:
+    """
+    Cache of the schema context (`tables_info`) rendered into the write_query prompt.
+
+    `SQLDatabase.get_table_info` reflects the schema and runs sample-row SELECTs on every call.
+    This cache renders each table once and keeps the joined string per table subset. It is
+    invalidated when SQLite reports a change through `PRAGMA schema_version` (DDL) or
+    `PRAGMA data_version` (commits from any other connection, which changes the sample rows).
+    """
+
+    def __init__(self, db: SQLDatabase, db_path: str):
+        self.db = db
+        self.db_path = db_path
+        # data_version is per connection: it only moves when *other* connections commit,
+        # so a dedicated long-lived connection is kept just to watch it.
+        self._version_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._version = None
+        self._table_names = []
+        self._table_info = {}
+        self._subsets = {}
+        self._data_versions = {}
+        self._category_values = None
+
+    def version(self) -> tuple:
+        """
+        Returns the current (schema_version, data_version) pair of the database.
+        """
+        with self._lock:
+            schema_version = self._version_conn.execute("PRAGMA schema_version").fetchone()[0]
+            data_version = self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+        return schema_version, data_version
+
+    def _refresh_if_stale(self):
+        version = self.version()
+        if version == self._version:
+            return
+        with self._lock:
+            self._table_names = list(self.db.get_usable_table_names())
+            self._table_info = {}
+            self._subsets = {}
+            self._data_versions = data_versions(self.db_path)
+            self._category_values = None
+            self._version = version
+
+    def warm(self):
+        """
+        Renders the schema context of every table. Called once at startup.
+        """
+        self.tables_info()
+
+    def table_names(self) -> list:
+        self._refresh_if_stale()
+        return list(self._table_names)
+
+    def table_versions(self) -> dict:
+        """
+        Returns the data version of each table: the ingestion version recorded in `_data_versions`
+        (db/ingest.py), or the database (schema_version, data_version) pair for tables that were
+        never ingested (any commit to the database then counts as a change).
+        """
+        self._refresh_if_stale()
+        return {
+            table_name: self._data_versions.get(table_name, self._version)
+            for table_name in self._table_names
+        }
+
+    def category_values(self) -> frozenset:
+        """
+        Returns the distinct values of the category columns (CATEGORY_COLUMNS) of the ledger tables,
+        e.g. the countries and due intervals. Recomputed when the database changes.
+        """
+        self._refresh_if_stale()
+        with self._lock:
+            if self._category_values is None:
+                selects = [
+                    f'SELECT DISTINCT "{column}" FROM "{table_name}"'
+                    for table_name, columns in CATEGORY_COLUMNS.items() if table_name in self._table_names
+                    for column in columns
+                ]
+                rows = self._version_conn.execute(" UNION ".join(selects)).fetchall() if selects else []
+                self._category_values = frozenset(value for (value,) in rows if value)
+            return self._category_values
+
+    def tables_info(self, tables: list = None) -> str:
+        """
+        Returns the rendered schema context for a subset of tables.
+
+        Args:
+            tables (list, optional): Table names to include, usually taken from the "@" markers.
+                Unknown names are ignored; when none is left, every usable table is included.
+
+        Returns:
+            str: The `tables_info` string for the prompt.
+        """
+        self._refresh_if_stale()
+        selected = tuple(t for t in self._table_names if t in set(tables or []))
+        if not selected:
+            selected = tuple(self._table_names)
+
+        rendered = self._subsets.get(selected)
+        if rendered is None:
+            for table_name in selected:
+                if table_name not in self._table_info:
+                    self._table_info[table_name] = self.db.get_table_info([table_name])
+            rendered = "\n".join(self._table_info[table_name] for table_name in selected)
+            self._subsets[selected] = rendered
+        return rendered
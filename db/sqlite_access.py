@@ -0,0 +1,174 @@
+import os
+import re
+import sqlite3
+import logging
+import threading
+from contextlib import closing
+from sqlalchemy import create_engine, event, Engine
+from sqlalchemy.pool import QueuePool
+
+
+logger = logging.getLogger(__name__)
+
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", str(64 * 1024)))
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "16"))
+SQLITE_POOL_OVERFLOW = int(os.getenv("SQLITE_POOL_OVERFLOW", "16"))
+# WAL is opt-in at runtime: the database shipped in the repo stays in rollback-journal mode, which
+# read-only deployments can open without creating the -wal/-shm files.
+SQLITE_WAL = os.getenv("SQLITE_WAL", "0") == "1"
+
+# A scan bounded by a trailing LIMIT (schema sample rows, "top N" queries) is cheap whatever the table size.
+_TRAILING_LIMIT = re.compile(r"\blimit\s+(\?|\d+)(\s+offset\s+(\?|\d+))?\s*;?\s*$", re.IGNORECASE)
+
+# Access patterns of the generated SQL: filters on country/month_year/due_interval, joins on id_trades.
+# The (country, month_year) indexes also carry the measures most queries aggregate, so they cover them.
+INDEXES = {
+    "trades_receivable": [
+        ("country", "month_year", "overdue", "trades_receivable"),
+        ("month_year",),
+        ("id_trades",),
+        ("due_interval", "month_year"),
+    ],
+    "trades_payable": [
+        ("country", "month_year", "overdue", "trades_payable"),
+        ("month_year",),
+        ("id_trades",),
+        ("due_interval", "month_year"),
+    ],
+    "working_capital": [
+        ("country", "month_year", "working_capital"),
+        ("month_year",),
+        ("id_trades",),
+        ("due_interval", "month_year"),
+    ],
+}
+
+
+def index_name(table_name: str, columns: tuple) -> str:
+    return f"ix_{table_name}_{'_'.join(columns)}"
+
+
+def ensure_indexes(path: str, indexes: dict = INDEXES) -> list:
+    """
+    Creates the read-path indexes and refreshes the planner statistics; with SQLITE_WAL, also
+    switches the database to WAL.
+
+    Idempotent: nothing is written when every index already exists. Tables missing from the
+    database are skipped.
+
+    Returns:
+        list: Names of the indexes created.
+    """
+    created = []
+    with closing(sqlite3.connect(path)) as conn, conn:
+        tables = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        existing = {name for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        for table_name, table_indexes in indexes.items():
+            if table_name not in tables:
+                continue
+            for columns in table_indexes:
+                name = index_name(table_name, columns)
+                if name in existing:
+                    continue
+                column_list = ", ".join(f'"{c}"' for c in columns)
+                conn.execute(f'CREATE INDEX "{name}" ON "{table_name}" ({column_list})')
+                created.append(name)
+        if created:
+            conn.execute("ANALYZE")
+    if SQLITE_WAL:
+        with closing(sqlite3.connect(path)) as conn:
+            if conn.execute("PRAGMA journal_mode").fetchone()[0] != "wal":
+                conn.execute("PRAGMA journal_mode=WAL")
+    return created
+
+
+def full_scans(conn, statement: str, parameters=()) -> list:
+    """
+    Returns the tables an SQLite statement reads with a full scan, according to EXPLAIN QUERY PLAN.
+    """
+    plan = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters or ()).fetchall()
+    # SQLite reports "SCAN <table>" for full scans and "SCAN <table> USING [COVERING] INDEX ..." otherwise;
+    # scans of constant rows, subqueries and the catalog (SQLAlchemy reflection) are not table scans.
+    return [
+        detail for detail in (row[-1] for row in plan)
+        if detail.startswith("SCAN ") and " USING " not in detail
+        and not detail[5:].startswith(("CONSTANT ROW", "(", "sqlite_"))
+    ]
+
+
+class FullScanLogger:
+    """
+    Logs, once per statement, the SELECTs that still full-scan a table (unbounded by a LIMIT).
+    """
+
+    def __init__(self, max_statements: int = 1024):
+        self.max_statements = max_statements
+        self.full_scans = 0
+        self._checked = set()
+        self._lock = threading.Lock()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().lower().startswith(("select", "with")):
+            return
+        if _TRAILING_LIMIT.search(statement):
+            return
+        with self._lock:
+            if statement in self._checked:
+                return
+            if len(self._checked) >= self.max_statements:
+                self._checked.clear()
+            self._checked.add(statement)
+        try:
+            scans = full_scans(cursor.connection, statement, parameters)
+        except sqlite3.Error:
+            return
+        if scans:
+            with self._lock:
+                self.full_scans += 1
+            logger.warning("Full table scan (%s): %s", "; ".join(scans), " ".join(statement.split())[:500])
+
+
+full_scan_logger = FullScanLogger()
+
+
+def create_read_engine(path: str, pool_size: int = SQLITE_POOL_SIZE, max_overflow: int = SQLITE_POOL_OVERFLOW,
+                       log_full_scans: bool = True) -> Engine:
+    """
+    Creates the read-only SQLAlchemy engine of the finance database.
+
+    Connections are checked out of a QueuePool for the duration of each use, so a connection is
+    never closed under the thread using it; up to `pool_size` idle connections are kept and
+    `max_overflow` more are opened under load. They are opened read-only (`mode=ro`,
+    `query_only`) with memory-mapped I/O and a larger page cache. When the
+    database directory is not writable (read-only deployment) it is also opened `immutable=1`:
+    nothing can write it there, and a WAL database could not create its -shm file. With
+    `log_full_scans`, SELECTs are checked with EXPLAIN QUERY PLAN the first time they run and
+    those that still full-scan a table are logged.
+    """
+    uri = f"file:{os.path.abspath(path)}?mode=ro"
+    if not os.access(os.path.dirname(os.path.abspath(path)), os.W_OK):
+        uri += "&immutable=1"
+
+    def connect():
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        conn.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA query_only=1")
+        return conn
+
+    engine = create_engine(
+        "sqlite://", creator=connect, poolclass=QueuePool, pool_size=pool_size, max_overflow=max_overflow
+    )
+    if log_full_scans:
+        event.listen(engine, "before_cursor_execute", full_scan_logger)
+    return engine
+
+
+if __name__ == "__main__":
+    import sys
+
+    db_path = sys.argv[1] if len(sys.argv) > 1 else "db/aa-finance-predict.db"
+    for name in ensure_indexes(db_path):
+        print(f"created {name}")
@@ -1,65 +1,481 @@
-from llm.azure_llm import create_azure_embeddings_llm
-from langchain_community.document_loaders import TextLoader
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_community.vectorstores.azure_cosmos_db import (
-    AzureCosmosDBVectorSearch,
-    CosmosDBSimilarityType,
-    CosmosDBVectorSearchType,
-)
-from langchain_text_splitters import MarkdownHeaderTextSplitter
 import os
-from utils import get_connection
+import sys
+import json
+import math
+import time
+import random
+import hashlib
+import argparse
+import threading
+from types import SimpleNamespace
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import numpy as np
+from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
 
-SOURCE_FILE_NAME = "Docs/Business_DOC.txt"
-# Mongo
+
+# Source documents: files or directories (searched recursively for SOURCE_EXTENSIONS).
+VECTOR_SOURCES = os.getenv("VECTOR_SOURCES", "Docs")
+SOURCE_EXTENSIONS = (".txt", ".md")
+HEADERS_TO_SPLIT_ON = [("###", "Header 3")]
+CHUNK_MAX_CHARS = int(os.getenv("VECTOR_CHUNK_MAX_CHARS", "4000"))  # longer sections are split again
+CHUNK_OVERLAP_CHARS = 200
+
+# Embedding requests: at most EMBED_BATCH_SIZE chunks and EMBED_BATCH_MAX_CHARS characters each,
+# EMBED_CONCURRENCY in flight, retried with exponential backoff.
+EMBED_BATCH_SIZE = int(os.getenv("VECTOR_EMBED_BATCH_SIZE", "64"))
+EMBED_BATCH_MAX_CHARS = int(os.getenv("VECTOR_EMBED_BATCH_MAX_CHARS", "60000"))
+EMBED_CONCURRENCY = int(os.getenv("VECTOR_EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(os.getenv("VECTOR_EMBED_MAX_RETRIES", "5"))
+EMBED_BACKOFF_SECONDS = 1.0
+
+# Mongo: Azure Cosmos DB for MongoDB vCore (docdb_* credentials) or, with VECTOR_STORE_URI,
+# any Mongo-compatible server (e.g. mongodb://localhost:27017).
+VECTOR_STORE_URI = os.getenv("VECTOR_STORE_URI", "")
 DOCDB_PASSWORD = os.getenv("docdb_password")
 DOCDB_DBNAME = os.getenv("docdb_dbname")
 DOCDB_USERNAME = os.getenv("docdb_username")
+VECTOR_DB_NAME = "tutorial"
+VECTOR_COLLECTION = "orientation"
+VECTOR_INDEX = "orientation-index"
+VECTOR_INDEX_KIND = os.getenv("VECTOR_INDEX_KIND", "vector-ivf")  # or "vector-hnsw"
+VECTOR_SIMILARITY = "COS"
+
+# Fields read by langchain's AzureCosmosDBVectorSearch (see get_vector_store).
+TEXT_KEY = "textContent"
+EMBEDDING_KEY = "vectorContent"
+# Source of the chunks indexed before `metadata.source` was recorded (see tag_legacy_chunks).
+LEGACY_SOURCE = "Docs/Business_DOC.txt"
+
+
+@dataclass
+class Chunk:
+    """A piece of a source document, identified by the hash of its source, text and metadata."""
+    id: str
+    source: str
+    text: str
+    metadata: dict = field(default_factory=dict)
+
+
+def chunk_id(source: str, text: str, metadata: dict) -> str:
+    payload = json.dumps([source, text, metadata], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def source_files(paths: list) -> list:
+    """
+    Returns the source documents under `paths` (files, or directories searched recursively),
+    as sorted POSIX paths.
+    """
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.update(os.path.join(root, n) for n in names if n.lower().endswith(SOURCE_EXTENSIONS))
+        elif os.path.isfile(path):
+            files.add(path)
+        else:
+            print(f"Vector store: source not found: {path}")
+    return sorted(os.path.normpath(f).replace(os.sep, "/") for f in files)
+
+
+def split_source(source: str, text: str) -> list:
+    """
+    Splits a document by its '###' sections, and sections longer than CHUNK_MAX_CHARS again
+    by paragraphs/sentences. The section headers are kept as chunk metadata.
+    """
+    sections = MarkdownHeaderTextSplitter(HEADERS_TO_SPLIT_ON).split_text(text)
+    splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_MAX_CHARS, chunk_overlap=CHUNK_OVERLAP_CHARS)
+    chunks = {}
+    for document in splitter.split_documents(sections):
+        metadata = dict(document.metadata)
+        id = chunk_id(source, document.page_content, metadata)
+        chunks[id] = Chunk(id, source, document.page_content, metadata)
+    return list(chunks.values())
+
+
+def load_chunks(paths: list) -> tuple:
+    """
+    Returns (sources, chunks) of the documents under `paths`, chunks deduplicated by id.
+    """
+    sources = source_files(paths)
+    chunks = {}
+    for source in sources:
+        with open(source, "r", encoding="utf-8") as file:
+            for chunk in split_source(source, file.read()):
+                chunks[chunk.id] = chunk
+    return sources, list(chunks.values())
+
+
+def batches(chunks: list, max_items: int = EMBED_BATCH_SIZE, max_chars: int = EMBED_BATCH_MAX_CHARS):
+    """
+    Groups chunks into embedding requests of at most `max_items` chunks and `max_chars`
+    characters (a chunk longer than `max_chars` goes alone).
+    """
+    batch, chars = [], 0
+    for chunk in chunks:
+        if batch and (len(batch) >= max_items or chars + len(chunk.text) > max_chars):
+            yield batch
+            batch, chars = [], 0
+        batch.append(chunk)
+        chars += len(chunk.text)
+    if batch:
+        yield batch
+
+
+def embed_with_retry(embeddings, texts: list, max_retries: int = EMBED_MAX_RETRIES,
+                     backoff_seconds: float = EMBED_BACKOFF_SECONDS) -> tuple:
+    """
+    Embeds a batch, retrying failures (rate limits, timeouts) with exponential backoff and jitter.
+
+    Returns:
+        tuple: (vectors, retries)
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return embeddings.embed_documents(texts), attempt
+        except Exception as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_seconds * 2 ** attempt * (1 + random.random())
+            print(f"Vector store: embedding {len(texts)} chunks failed ({e}); retry in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def to_document(chunk: Chunk, vector: list) -> dict:
+    return {
+        "_id": chunk.id,
+        TEXT_KEY: chunk.text,
+        EMBEDDING_KEY: [float(v) for v in vector],
+        "metadata": {**chunk.metadata, "source": chunk.source},
+    }
+
+
+def insert_documents(collection, documents: list):
+    try:
+        collection.insert_many(documents, ordered=False)
+    except Exception as e:
+        # A concurrent run may already have stored the same chunks (same _id): duplicates are fine.
+        write_errors = (getattr(e, "details", None) or {}).get("writeErrors", [])
+        if not write_errors or any(error.get("code") != 11000 for error in write_errors):
+            raise
+
+
+def tuned_index_options(documents: int, dimensions: int, kind: str = VECTOR_INDEX_KIND) -> dict:
+    """
+    Vector index parameters for a collection of `documents` vectors.
+
+    IVF: numLists = documents / 1000 up to 1M documents and sqrt(documents) above (the Azure
+    Cosmos DB for MongoDB vCore guidance), at least 1. HNSW: larger graphs (m, efConstruction)
+    from 100k documents on.
+    """
+    options = {"kind": kind, "similarity": VECTOR_SIMILARITY, "dimensions": dimensions}
+    if kind == "vector-hnsw":
+        large = documents >= 100_000
+        options.update(m=32 if large else 16, efConstruction=128 if large else 64)
+    else:
+        num_lists = documents // 1000 if documents <= 1_000_000 else int(math.sqrt(documents))
+        options.update(numLists=max(1, num_lists))
+    return options
+
+
+def index_needs_rebuild(current: dict, wanted: dict) -> bool:
+    """
+    Whether the vector index must be rebuilt: a different kind, metric or dimension, different
+    HNSW parameters, or an IVF list count off by 2x or more (lists are trained on the data, so
+    a collection that grew or shrank that much is badly partitioned).
+    """
+    if current is None:
+        return True
+    if any(current.get(key) != wanted[key] for key in ("kind", "similarity", "dimensions")):
+        return True
+    if wanted["kind"] == "vector-hnsw":
+        return (current.get("m"), current.get("efConstruction")) != (wanted["m"], wanted["efConstruction"])
+    ratio = wanted["numLists"] / max(1, current.get("numLists", 1))
+    return ratio >= 2 or ratio <= 0.5
+
+
+def vector_index_options(collection, index_name: str = VECTOR_INDEX):
+    for index in collection.list_indexes():
+        if index.get("name") == index_name:
+            return index.get("cosmosSearchOptions")
+    return None
+
+
+def ensure_vector_index(collection, dimensions: int, index_name: str = VECTOR_INDEX,
+                        kind: str = VECTOR_INDEX_KIND) -> str:
+    """
+    Creates the vector index, or rebuilds it when its parameters no longer fit the collection size.
+
+    Returns:
+        str: 'created', 'rebuilt', 'unchanged' or 'unsupported' (server without vector indexes).
+    """
+    wanted = tuned_index_options(collection.count_documents({}), dimensions, kind)
+    current = vector_index_options(collection, index_name)
+    if not index_needs_rebuild(current, wanted):
+        return "unchanged"
+    if current is not None:
+        collection.drop_index(index_name)
+    command = {
+        "createIndexes": collection.name,
+        "indexes": [{"name": index_name, "key": {EMBEDDING_KEY: "cosmosSearch"}, "cosmosSearchOptions": wanted}],
+    }
+    try:
+        collection.database.command(command)
+    except Exception as e:
+        print(f"Vector store: could not create the vector index {index_name} ({e})")
+        return "unsupported"
+    return "created" if current is None else "rebuilt"
+
+
+def stored_dimensions(collection):
+    document = collection.find_one({EMBEDDING_KEY: {"$exists": True}}, {EMBEDDING_KEY: 1})
+    return len(document[EMBEDDING_KEY]) if document else None
+
+
+def tag_legacy_chunks(collection, source: str = LEGACY_SOURCE) -> int:
+    """
+    Backfills `metadata.source` on the chunks indexed before sources were recorded (by the original
+    indexing script, which loaded `source` through AzureCosmosDBVectorSearch.from_documents).
+
+    Tagged chunks are handled by `sync` like any other chunk of that source: deleted once its
+    current chunks are stored, or by `prune`. Idempotent; returns the number of chunks tagged.
+    """
+    result = collection.update_many(
+        {"metadata.source": {"$exists": False}}, {"$set": {"metadata.source": source}}
+    )
+    return result.modified_count
+
+
+def sync(collection, embeddings, paths: list, prune: bool = False, batch_size: int = EMBED_BATCH_SIZE,
+         batch_max_chars: int = EMBED_BATCH_MAX_CHARS, concurrency: int = EMBED_CONCURRENCY,
+         index_name: str = VECTOR_INDEX) -> dict:
+    """
+    Brings the vector collection in line with the documents under `paths`.
+
+    Chunks are keyed by the hash of their source, text and metadata, so only new or changed
+    chunks are embedded and inserted, and the chunks of the synced sources that no longer exist
+    are deleted: the cost of a re-run is proportional to the change. With `prune`, chunks of
+    sources outside `paths` are deleted too. Each embedded batch is inserted as soon as it
+    completes, so a failed run resumes where it stopped. Stale chunks are deleted only after the
+    replacements are stored, and kept for the sources with a failed batch, so a failed embedding
+    never leaves a section out of the store. Chunks indexed before sources were recorded are first
+    attributed to LEGACY_SOURCE (`tag_legacy_chunks`), so they are replaced the same way. The
+    vector index is then created or rebuilt if its parameters no longer fit the collection size.
+
+    Returns:
+        dict: Counts of sources, chunks, unchanged/embedded/deleted/failed chunks, batches,
+        retries and legacy chunks tagged, and the index action.
+    """
+    sources, chunks = load_chunks(paths)
+    collection.create_index("metadata.source")
+    legacy = tag_legacy_chunks(collection)
+    scope = {} if prune else {"metadata.source": {"$in": sources}}
+    existing = {
+        document["_id"]: (document.get("metadata") or {}).get("source")
+        for document in collection.find(scope, {"_id": 1, "metadata": 1})
+    }
+    pending = [chunk for chunk in chunks if chunk.id not in existing]
+
+    stats = {"sources": len(sources), "chunks": len(chunks), "unchanged": len(chunks) - len(pending),
+             "embedded": 0, "deleted": 0, "failed": 0, "batches": 0, "retries": 0, "legacy_tagged": legacy}
+    failed_sources = set()
+    dimensions = None
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {
+            executor.submit(embed_with_retry, embeddings, [chunk.text for chunk in batch]): batch
+            for batch in batches(pending, batch_size, batch_max_chars)
+        }
+        for future in as_completed(futures):
+            batch = futures[future]
+            stats["batches"] += 1
+            try:
+                vectors, retries = future.result()
+            except Exception as e:
+                stats["failed"] += len(batch)
+                failed_sources.update(chunk.source for chunk in batch)
+                print(f"Vector store: {len(batch)} chunks not embedded ({e}); they are retried on the next run")
+                continue
+            insert_documents(collection, [to_document(chunk, vector) for chunk, vector in zip(batch, vectors)])
+            stats["embedded"] += len(batch)
+            stats["retries"] += retries
+            dimensions = dimensions or len(vectors[0])
+
+    wanted = {chunk.id for chunk in chunks}
+    stale = [id for id, source in existing.items() if id not in wanted and source not in failed_sources]
+    for start in range(0, len(stale), 1000):
+        collection.delete_many({"_id": {"$in": stale[start:start + 1000]}})
+    stats["deleted"] = len(stale)
+
+    dimensions = dimensions or stored_dimensions(collection)
+    stats["index"] = ensure_vector_index(collection, dimensions, index_name) if dimensions else "empty"
+    return stats
+
+
+class InMemoryVectorCollection:
+    """
+    In-memory stand-in for the Mongo collection, for tests and offline runs.
+
+    Implements the subset of the pymongo Collection API used by `sync` and by langchain's
+    AzureCosmosDBVectorSearch (cosmosSearch `$search` aggregation, by cosine similarity): queries
+    on `_id`/dotted fields with equality, `$in`, `$nin` and `$exists`, `update_many` with `$set`,
+    and the `createIndexes` command.
+    """
+
+    def __init__(self, name: str = VECTOR_COLLECTION):
+        self.name = name
+        self.documents = {}
+        self.indexes = {}
+        self.embedded = 0
+        self._lock = threading.Lock()
+
+    @property
+    def database(self):
+        return self
+
+    @staticmethod
+    def _value(document: dict, path: str):
+        for key in path.split("."):
+            if not isinstance(document, dict) or key not in document:
+                return None
+            document = document[key]
+        return document
+
+    def _matches(self, document: dict, query: dict) -> bool:
+        for path, condition in (query or {}).items():
+            value = self._value(document, path)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+                if operator == "$exists" and (value is not None) != bool(operand):
+                    return False
+        return True
+
+    @staticmethod
+    def _project(document: dict, projection: dict) -> dict:
+        if not projection:
+            return dict(document)
+        return {key: document[key] for key in ("_id", *projection) if key in document}
+
+    def find(self, query: dict = None, projection: dict = None) -> list:
+        with self._lock:
+            return [self._project(d, projection) for d in self.documents.values() if self._matches(d, query)]
+
+    def find_one(self, query: dict = None, projection: dict = None):
+        return next(iter(self.find(query, projection)), None)
+
+    def count_documents(self, query: dict) -> int:
+        return len(self.find(query))
+
+    def insert_many(self, documents: list, ordered: bool = True):
+        with self._lock:
+            for document in documents:
+                self.documents[document["_id"]] = dict(document)
+            self.embedded += len(documents)
+
+    def update_many(self, query: dict, update: dict):
+        with self._lock:
+            matched = [d for d in self.documents.values() if self._matches(d, query)]
+            for document in matched:
+                for path, value in update["$set"].items():
+                    *parents, key = path.split(".")
+                    target = document
+                    for parent in parents:
+                        target = target.setdefault(parent, {})
+                    target[key] = value
+        return SimpleNamespace(matched_count=len(matched), modified_count=len(matched))
+
+    def delete_many(self, query: dict):
+        with self._lock:
+            for id in [id for id, d in self.documents.items() if self._matches(d, query)]:
+                del self.documents[id]
+
+    def create_index(self, keys, **kwargs):
+        name = keys if isinstance(keys, str) else "_".join(k for k, _ in keys)
+        self.indexes.setdefault(name, {"name": name})
+        return name
+
+    def list_indexes(self) -> list:
+        return list(self.indexes.values())
+
+    def drop_index(self, name: str):
+        self.indexes.pop(name, None)
 
-# loader = TextLoader(SOURCE_FILE_NAME)
-# documents = loader.load()
-# text_splitter = CharacterTextSplitter(chunk_size=1000, chunk_overlap=0)
-# docs = text_splitter.split_documents(documents)
+    def command(self, command: dict):
+        for index in command.get("indexes", []):
+            self.indexes[index["name"]] = dict(index)
+        return {"ok": 1}
 
-with open(SOURCE_FILE_NAME, "r") as file:
-    documents = file.read()
-file.close()
+    def aggregate(self, pipeline: list) -> list:
+        search = pipeline[0]["$search"]["cosmosSearch"]
+        candidates = self.find(search.get("filter"))
+        if not candidates:
+            return []
+        matrix = np.array([d[search["path"]] for d in candidates], dtype=np.float32)
+        query = np.array(search["vector"], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1) * (np.linalg.norm(query) or 1.0)
+        scores = matrix @ query / np.where(norms == 0, 1.0, norms)
+        top = np.argsort(-scores)[:search.get("k", 4)]
+        return [{"similarityScore": float(scores[i]), "document": candidates[i]} for i in top]
 
-headers_to_split_on = [
-    ("###", "Header 3"),
-]
 
-markdown_splitter = MarkdownHeaderTextSplitter(headers_to_split_on)
-docs = markdown_splitter.split_text(documents)
+def connect_collection(backend: str = "mongo"):
+    """
+    Returns the vector collection: the in-memory stand-in, a Mongo-compatible server at
+    VECTOR_STORE_URI or Azure Cosmos DB for MongoDB vCore (docdb_* credentials).
+    """
+    if backend == "memory":
+        return InMemoryVectorCollection()
+    if VECTOR_STORE_URI:
+        from pymongo import MongoClient
+        client = MongoClient(VECTOR_STORE_URI)
+    else:
+        from mongo_utils import get_connection
+        client = get_connection(username=DOCDB_USERNAME, password=DOCDB_PASSWORD, db_name=DOCDB_DBNAME)
+    return client[VECTOR_DB_NAME][VECTOR_COLLECTION]
 
-openai_embeddings = create_azure_embeddings_llm()
 
+def get_vector_store(collection, embeddings, index_name: str = VECTOR_INDEX):
+    """
+    Returns the langchain vector store (similarity search) over a synced collection.
+    """
+    from langchain_community.vectorstores.azure_cosmos_db import AzureCosmosDBVectorSearch
 
+    return AzureCosmosDBVectorSearch(
+        collection, embeddings, index_name=index_name, text_key=TEXT_KEY, embedding_key=EMBEDDING_KEY
+    )
 
-client = get_connection(username=DOCDB_USERNAME, password=DOCDB_PASSWORD, db_name=DOCDB_DBNAME)
-db = client["tutorial"]
-collection_name = "orientation"
-index_name = "orientation-index"
-collection = db[collection_name]
 
-vectorstore = AzureCosmosDBVectorSearch.from_documents(
-    docs,
-    openai_embeddings,
-    collection=collection,
-    index_name=index_name,
-)
+def create_embeddings(kind: str = "azure"):
+    if kind == "local":
+        from agents.sql_cache import HashingEmbeddings
+        return HashingEmbeddings()
+    from llm.azure_llm import create_azure_embeddings_llm
+    return create_azure_embeddings_llm()
 
-num_lists=100
-dimensions = 1536
-similarity_algorithm = CosmosDBSimilarityType.COS
-kind = CosmosDBVectorSearchType.VECTOR_IVF
-m = 16
-ef_construction = 64
-ef_search = 40
-score_threshold = 0.1
 
-vectorstore.create_index(
-    num_lists, dimensions, similarity_algorithm, kind, m, ef_construction
-)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally embed source documents into the vector store.")
+    parser.add_argument("paths", nargs="*", default=[VECTOR_SOURCES], help="files or directories (.txt, .md)")
+    parser.add_argument("--backend", choices=["mongo", "memory"], default="mongo")
+    parser.add_argument("--embeddings", choices=["azure", "local"], default="azure",
+                        help="'local': hashing embeddings, no network")
+    parser.add_argument("--prune", action="store_true", help="also delete chunks of sources not in the paths")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE)
+    parser.add_argument("--batch-max-chars", type=int, default=EMBED_BATCH_MAX_CHARS)
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY)
+    args = parser.parse_args()
 
-print("\nVector Store available.\n")
\ No newline at end of file
+    started = time.perf_counter()
+    stats = sync(
+        connect_collection(args.backend), create_embeddings(args.embeddings), args.paths, args.prune,
+        args.batch_size, args.batch_max_chars, args.concurrency,
+    )
+    print(" ".join(f"{key}={value}" for key, value in stats.items()) + f" ({time.perf_counter() - started:.1f}s)")
+    sys.exit(1 if stats["failed"] else 0)
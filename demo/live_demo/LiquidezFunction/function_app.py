@@ -1,26 +1,65 @@
+import time
+_cold_start_begin = time.perf_counter()
+
 import azure.functions as func
 import pandas as pd
 import numpy as np
+import joblib
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import train_test_split
 import datetime
 import json
 import logging
+import os
 
 app = func.FunctionApp()
 
-def predict_overdue_risk(df_receivable: pd.DataFrame, country: str) -> str:
-    df = df_receivable.copy()
+FEATURES = ['dso', 'sales', 'cei', 'art', 'month', 'year', 'country_encoded']
+TARGET = 'overdue_ratio'
+
+# Artefato gravado por train_overdue_model.py (FUNCTION_MODEL_PATH) e publicado com a função. Sem ele,
+# ou se o vocabulário de países do artefato não cobrir os dados, o modelo é treinado no cold start.
+MODEL_PATH = os.getenv(
+    'OVERDUE_MODEL_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'overdue_model.joblib')
+)
+
+
+def encode_categories(df: pd.DataFrame, categories: dict) -> pd.DataFrame:
+    # Mesmo formato do artefato do agente ({'model', 'categories'}): o código é a posição do
+    # valor no vocabulário salvo com o modelo; valores fora dele recebem -1.
+    for column, vocabulary in categories.items():
+        values = df.index if df.index.name == column else df[column]
+        df[f'{column}_encoded'] = pd.Categorical(values, categories=vocabulary).codes.astype(int)
+    return df
+
+
+def load_receivables() -> pd.DataFrame:
+    # Simulando dataframe com dados fictícios
+    data = {
+        'month_year': ['2024-03-01', '2024-04-01', '2024-05-01'] * 2,
+        # Mesmos nomes de países do ledger (aa-finance-predict.db), vocabulário do artefato treinado nele
+        'country': ['Brasil', 'Brasil', 'Brasil', 'Chile', 'Chile', 'Chile'],
+        'trades_receivable': [100000, 110000, 105000, 95000, 97000, 98000],
+        'overdue': [5000, 5200, 5300, 4000, 4100, 4200],
+        'dso': [45, 46, 44, 50, 49, 48],
+        'sales': [200000, 210000, 205000, 195000, 197000, 198000],
+        'cei': [0.85, 0.86, 0.84, 0.80, 0.82, 0.83],
+        'art': [1.5, 1.6, 1.55, 1.4, 1.45, 1.5]
+    }
+
+    df = pd.DataFrame(data)
     df['overdue_ratio'] = df['overdue'] / df['trades_receivable']
     df['month'] = pd.to_datetime(df['month_year']).dt.month
     df['year'] = pd.to_datetime(df['month_year']).dt.year
-    df['country_encoded'] = df['country'].astype('category').cat.codes
+    return df
+
 
-    features = ['dso', 'sales', 'cei', 'art', 'month', 'year', 'country_encoded']
-    target = 'overdue_ratio'
+def train_model(df: pd.DataFrame) -> dict:
+    categories = {'country': sorted(df['country'].unique().tolist())}
+    df = encode_categories(df.copy(), categories)
 
-    X = df[features]
-    y = df[target]
+    X = df[FEATURES]
+    y = df[TARGET]
 
     X_train, X_test, y_train, y_test = train_test_split(
         X, y, test_size=0.2, random_state=42
@@ -28,73 +67,118 @@ def predict_overdue_risk(df_receivable: pd.DataFrame, country: str) -> str:
 
     model = RandomForestRegressor(n_estimators=100, random_state=42)
     model.fit(X_train, y_train)
-
+    return {'model': model, 'categories': categories}
+
+
+def load_model(df: pd.DataFrame) -> dict:
+    if not os.path.exists(MODEL_PATH):
+        logging.warning(f"Model artifact not found at {MODEL_PATH}; training on the bundled data.")
+        return train_model(df)
+    artifact = joblib.load(MODEL_PATH, mmap_mode='r')
+    unknown = set(df['country']) - set(artifact['categories'].get('country', []))
+    if unknown:
+        logging.warning(f"Countries {sorted(unknown)} are not in the vocabulary of {MODEL_PATH}; "
+                        "training on the bundled data.")
+        return train_model(df)
+    return artifact
+
+
+def build_prediction_table(df: pd.DataFrame, artifact: dict) -> dict:
+    """
+    Predicts the next-month overdue ratio of every country in one batch, keyed by country.
+    """
     latest_month = pd.to_datetime(df['month_year'].max())
     next_month = latest_month + pd.DateOffset(months=1)
 
-    if country not in df['country'].unique():
-        return f"Country '{country}' not found in data."
+    last_rows = df.sort_values('month_year', kind='stable').groupby('country', sort=False).tail(1).set_index('country')
+    last_rows['month'] = next_month.month
+    last_rows['year'] = next_month.year
+    last_rows = encode_categories(last_rows, artifact['categories'])
+
+    last_ratios = last_rows['overdue_ratio'].to_numpy()
+    predicted_ratios = artifact['model'].predict(last_rows[FEATURES])
+
+    table = {}
+    for country, last_ratio, predicted_ratio in zip(last_rows.index, last_ratios, predicted_ratios):
+        delta = predicted_ratio - last_ratio
+        table[country] = {
+            "country": country,
+            "last_overdue_ratio": f"{last_ratio:.2%}",
+            "predicted_overdue_ratio": f"{predicted_ratio:.2%}",
+            "delta": f"{delta:+.2%}",
+            "next_month": next_month.strftime('%B/%Y'),
+            "status": "increased" if delta > 0 else "stable/decreased",
+            "emoji": "🔺" if delta > 0 else "✅"
+        }
+    return table
 
-    last_row = df[df['country'] == country].sort_values('month_year').iloc[-1].copy()
-    last_ratio = last_row['overdue_ratio']
-
-    last_row['month'] = next_month.month
-    last_row['year'] = next_month.year
-    X_pred = pd.DataFrame([last_row[features]])
-    predicted_ratio = model.predict(X_pred)[0]
-
-    delta = predicted_ratio - last_ratio
-    emoji = "🔺" if delta > 0 else "✅"
-
-    result = {
-        "country": country,
-        "last_overdue_ratio": f"{last_ratio:.2%}",
-        "predicted_overdue_ratio": f"{predicted_ratio:.2%}",
-        "delta": f"{delta:+.2%}",
-        "next_month": next_month.strftime('%B/%Y'),
-        "status": "increased" if delta > 0 else "stable/decreased",
-        "emoji": emoji
-    }
 
-    return result
+# Carregados uma única vez por worker, no cold start: as requisições só consultam a tabela.
+_receivables = load_receivables()
+PREDICTIONS = build_prediction_table(_receivables, load_model(_receivables))
+COLD_START_MS = (time.perf_counter() - _cold_start_begin) * 1000
+logging.info(f"LiquidezFunction cold start: {COLD_START_MS:.0f} ms ({len(PREDICTIONS)} countries)")
+_first_request = True
+
+
+# Nomes aceitos pela API antes do alinhamento com o vocabulário do ledger ('Brasil').
+COUNTRY_ALIASES = {'Brazil': 'Brasil'}
+
+
+def predict_overdue_risk(country: str):
+    prediction = PREDICTIONS.get(COUNTRY_ALIASES.get(country, country))
+    if prediction is None:
+        return f"Country '{country}' not found in data."
+    # A resposta mantém o nome enviado pelo chamador
+    return {**prediction, "country": country}
+
 
 @app.route(route="previsaoRisco", auth_level=func.AuthLevel.Anonymous)
 def previsaoRisco(req: func.HttpRequest) -> func.HttpResponse:
+    global _first_request
     logging.info('Python HTTP trigger function processed a request.')
 
     try:
         req_body = req.get_json()
         country = req_body.get('country')
-    except ValueError:
+        countries = req_body.get('countries')
+    except (ValueError, AttributeError):
         return func.HttpResponse(
-            "Invalid request body. Expected JSON with 'country'.",
+            "Invalid request body. Expected JSON with 'country' or 'countries'.",
             status_code=400
         )
 
-    if not country:
+    if not country and not countries:
         return func.HttpResponse(
-            "Missing 'country' in request body.",
+            "Missing 'country' or 'countries' in request body.",
             status_code=400
         )
 
-    # Simulando dataframe com dados fictícios
-    data = {
-        'month_year': ['2024-03-01', '2024-04-01', '2024-05-01'] * 2,
-        'country': ['Brazil', 'Brazil', 'Brazil', 'Chile', 'Chile', 'Chile'],
-        'trades_receivable': [100000, 110000, 105000, 95000, 97000, 98000],
-        'overdue': [5000, 5200, 5300, 4000, 4100, 4200],
-        'dso': [45, 46, 44, 50, 49, 48],
-        'sales': [200000, 210000, 205000, 195000, 197000, 198000],
-        'cei': [0.85, 0.86, 0.84, 0.80, 0.82, 0.83],
-        'art': [1.5, 1.6, 1.55, 1.4, 1.45, 1.5]
-    }
-
-    df_receivable = pd.DataFrame(data)
+    if countries is not None and not (
+        isinstance(countries, list) and all(isinstance(c, str) for c in countries)
+    ):
+        return func.HttpResponse(
+            "'countries' must be a list of strings.",
+            status_code=400
+        )
+    if country is not None and not isinstance(country, str):
+        return func.HttpResponse(
+            "'country' must be a string.",
+            status_code=400
+        )
 
-    result = predict_overdue_risk(df_receivable, country)
+    if countries:
+        result = [predict_overdue_risk(c) for c in countries]
+    else:
+        result = predict_overdue_risk(country)
 
+    cold_start, _first_request = _first_request, False
     return func.HttpResponse(
         json.dumps(result, indent=4),
         status_code=200,
-        mimetype="application/json"
+        mimetype="application/json",
+        headers={
+            "X-Cold-Start": str(cold_start).lower(),
+            "X-Cold-Start-Ms": f"{COLD_START_MS:.0f}",
+        },
     )
@@ -4,7 +4,7 @@ from langchain_core.messages import HumanMessage
 from langgraph.checkpoint.memory import MemorySaver
 from llm.azure_llm import create_azure_chat_llm
 import pandas as pd
-from utils import txt_para_pdf, create_pdf
+from pdf_utils import txt_para_pdf, create_pdf
 
 
 DOC_NAME = "Docs/Business_DOC_2"
@@ -2,7 +2,12 @@ from langchain_openai import AzureChatOpenAI, AzureOpenAIEmbeddings
 AzureChatOpenAI.model_rebuild()
 
 import os
+import time
+import threading
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
 from dotenv import load_dotenv
+from tracing import span_handler
 
 
 load_dotenv()
@@ -13,10 +18,159 @@ azure_endpoint = os.getenv('AZURE_OPENAI_ENDPOINT')
 api_version = os.getenv('AZURE_OPENAI_API_VERSION')
 api_type = os.getenv('AZURE_OPENAI_API_TYPE')
 
+# "azure" (padrão) ou "fake" (modelo local para testes)
+LLM_PROVIDER = os.getenv('LLM_PROVIDER', 'azure')
+LLM_MAX_CONCURRENCY = int(os.getenv('AZURE_OPENAI_MAX_CONCURRENCY', '8'))
+LLM_TOKENS_PER_MINUTE = int(os.getenv('AZURE_OPENAI_TOKENS_PER_MINUTE', '0'))  # 0 = sem limite
+LLM_MAX_RETRIES = int(os.getenv('AZURE_OPENAI_MAX_RETRIES', '3'))
+LLM_TIMEOUT_SECONDS = float(os.getenv('AZURE_OPENAI_TIMEOUT_SECONDS', '60'))
+# Uso de tokens também nas respostas em streaming (stream_options.include_usage, API 2024-09-01 ou mais nova)
+LLM_STREAM_USAGE = os.getenv('AZURE_OPENAI_STREAM_USAGE', 'true').lower() == 'true'
+
+
+class TokenRateLimiter:
+  """
+    Token bucket para manter o consumo abaixo da cota de tokens por minuto (TPM) da Azure.
+    """
+
+  def __init__(self, tokens_per_minute: int):
+    self.tokens_per_minute = tokens_per_minute
+    self.available = float(tokens_per_minute)
+    self.updated_at = time.monotonic()
+    self.lock = threading.Lock()
+
+  def acquire(self, tokens: int):
+    if self.tokens_per_minute <= 0:
+      return
+    tokens = min(tokens, self.tokens_per_minute)
+    while True:
+      with self.lock:
+        now = time.monotonic()
+        self.available = min(
+          self.tokens_per_minute,
+          self.available + (now - self.updated_at) * self.tokens_per_minute / 60.0,
+        )
+        self.updated_at = now
+        if self.available >= tokens:
+          self.available -= tokens
+          return
+        wait = (tokens - self.available) * 60.0 / self.tokens_per_minute
+      time.sleep(wait)
+
+
+class LLMUsageLimiter(BaseCallbackHandler):
+  """
+    Callback compartilhado pelos clientes de chat: limita o número de chamadas simultâneas,
+    aplica o limite de tokens por minuto e acumula contadores de latência e tokens.
+    """
+
+  run_inline = True
+
+  def __init__(self, max_concurrency: int, tokens_per_minute: int):
+    self.semaphore = threading.BoundedSemaphore(max_concurrency)
+    self.rate_limiter = TokenRateLimiter(tokens_per_minute)
+    self.lock = threading.Lock()
+    self.started = {}
+    self.metrics = {
+      "calls": 0,
+      "errors": 0,
+      "in_flight": 0,
+      "latency_seconds_total": 0.0,
+      "prompt_tokens": 0,
+      "completion_tokens": 0,
+    }
+
+  def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+    estimated_tokens = sum(len(str(m.content)) for batch in messages for m in batch) // 4
+    self.rate_limiter.acquire(estimated_tokens)
+    self.semaphore.acquire()
+    with self.lock:
+      self.started[run_id] = time.perf_counter()
+      self.metrics["in_flight"] += 1
+
+  def _finish(self, run_id):
+    with self.lock:
+      started = self.started.pop(run_id, None)
+      if started is None:
+        return False
+      self.metrics["in_flight"] -= 1
+      self.metrics["calls"] += 1
+      self.metrics["latency_seconds_total"] += time.perf_counter() - started
+    self.semaphore.release()
+    return True
+
+  def on_llm_end(self, response, *, run_id, **kwargs):
+    if not self._finish(run_id):
+      return
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    prompt_tokens = usage.get("prompt_tokens", 0)
+    completion_tokens = usage.get("completion_tokens", 0)
+    if not usage:
+      for generation in (g for batch in response.generations for g in batch):
+        usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+        prompt_tokens += usage_metadata.get("input_tokens", 0)
+        completion_tokens += usage_metadata.get("output_tokens", 0)
+    with self.lock:
+      self.metrics["prompt_tokens"] += prompt_tokens
+      self.metrics["completion_tokens"] += completion_tokens
+
+  def on_llm_error(self, error, *, run_id, **kwargs):
+    if self._finish(run_id):
+      with self.lock:
+        self.metrics["errors"] += 1
+
+
+class StreamUsageAzureChatOpenAI(AzureChatOpenAI):
+  """
+    AzureChatOpenAI que pede o uso de tokens também nas respostas em streaming, para que os
+    callbacks (limite de TPM, spans de tracing) recebam os tokens das respostas transmitidas.
+    """
+
+  def _stream(self, *args, **kwargs):
+    kwargs.setdefault("stream_options", {"include_usage": True})
+    return super()._stream(*args, **kwargs)
+
+
+usage_limiter = LLMUsageLimiter(LLM_MAX_CONCURRENCY, LLM_TOKENS_PER_MINUTE)
+_http_client = None
+_chat_llms = {}
+_clients_lock = threading.Lock()
+
+
+def get_http_client():
+  """
+    Retorna o cliente httpx compartilhado pelo processo (pool de conexões com keep-alive).
+    """
+  global _http_client
+  with _clients_lock:
+    if _http_client is None:
+      _http_client = httpx.Client(
+        limits=httpx.Limits(
+          max_connections=LLM_MAX_CONCURRENCY * 2,
+          max_keepalive_connections=LLM_MAX_CONCURRENCY,
+        ),
+        timeout=LLM_TIMEOUT_SECONDS,
+      )
+  return _http_client
+
+
+def llm_metrics():
+  """
+    Retorna os contadores de uso dos modelos de chat (chamadas, erros, latência e tokens).
+    """
+  with usage_limiter.lock:
+    metrics = dict(usage_limiter.metrics)
+  metrics["latency_seconds_avg"] = metrics["latency_seconds_total"] / metrics["calls"] if metrics["calls"] else 0.0
+  return metrics
+
 
 def create_azure_chat_llm(temperature=0.5, deployment_name = "gpt-4o"):
   """
-    Cria um modelo de linguagem de chat utilizando as bibliotecas da Azure OpenAI.
+    Retorna o modelo de linguagem de chat da Azure OpenAI para o deployment e temperatura.
+
+    Os clientes são criados uma única vez por (deployment, temperatura) e compartilham o pool
+    de conexões HTTP, o limite de concorrência e o limite de tokens por minuto.
+    Com LLM_PROVIDER=fake, retorna um modelo local para testes.
 
     Args:
         temperature (float, opcional): Controla a aleatoriedade da resposta gerada. O padrão é 0.5.
@@ -24,14 +178,31 @@ def create_azure_chat_llm(temperature=0.5, deployment_name = "gpt-4o"):
     Returns:
         AzureChatOpenAI: Um modelo de linguagem de chat da Azure OpenAI.
     """
-  llm = AzureChatOpenAI(
-    deployment_name=deployment_name,
-    azure_endpoint=azure_endpoint,
-    openai_api_key=api_key,
-    openai_api_version=api_version,
-    temperature=temperature
-  )
+  key = (LLM_PROVIDER, deployment_name, temperature)
+  with _clients_lock:
+    llm = _chat_llms.get(key)
+  if llm is not None:
+    return llm
 
+  if LLM_PROVIDER == "fake":
+    from llm.fake_llm import create_fake_chat_llm
+    llm = create_fake_chat_llm()
+    llm.callbacks = [usage_limiter, span_handler]
+  else:
+    llm_class = StreamUsageAzureChatOpenAI if LLM_STREAM_USAGE else AzureChatOpenAI
+    llm = llm_class(
+      deployment_name=deployment_name,
+      azure_endpoint=azure_endpoint,
+      openai_api_key=api_key,
+      openai_api_version=api_version,
+      temperature=temperature,
+      http_client=get_http_client(),
+      max_retries=LLM_MAX_RETRIES,
+      callbacks=[usage_limiter, span_handler],
+    )
+
+  with _clients_lock:
+    llm = _chat_llms.setdefault(key, llm)
   return llm
 
 def create_azure_embeddings_llm():
@@ -48,5 +219,5 @@ def create_azure_embeddings_llm():
     openai_api_type=api_type,
     openai_api_version=api_version,
   )
-  
-  return embeddings
\ No newline at end of file
+
+  return embeddings
@@ -0,0 +1,81 @@
+import os
+import importlib
+import itertools
+from typing import Any, List, Optional
+from langchain_core.callbacks import CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+# Módulo com um roteiro (`responses` e `structured_responses`) usado quando nenhuma resposta é
+# passada a create_fake_chat_llm, p.ex. "benchmarks.scripted_llm"
+LLM_FAKE_SCRIPT = os.getenv('LLM_FAKE_SCRIPT', '')
+
+
+class FakeChatLLM(BaseChatModel):
+  """
+    Modelo de chat local e determinístico, usado em testes e benchmarks sem acesso à rede.
+
+    Args:
+        responses: Lista de respostas (AIMessage ou texto) devolvidas em ciclo, ou uma função
+            que recebe as mensagens do prompt e devolve a resposta.
+        structured_responses: Função que recebe as mensagens do prompt e o schema pedido em
+            `with_structured_output` e devolve o dict estruturado.
+    """
+
+  responses: Any = ["ok"]
+  structured_responses: Any = None
+  _cycle: Any = None
+
+  @property
+  def _llm_type(self) -> str:
+    return "fake-chat-llm"
+
+  def _next_response(self, messages: List[BaseMessage]) -> AIMessage:
+    if callable(self.responses):
+      response = self.responses(messages)
+    else:
+      if self._cycle is None:
+        self._cycle = itertools.cycle(self.responses)
+      response = next(self._cycle)
+    return response if isinstance(response, AIMessage) else AIMessage(content=response)
+
+  def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+    message = self._next_response(messages)
+    prompt_tokens = sum(len(str(m.content)) for m in messages) // 4
+    completion_tokens = len(str(message.content)) // 4
+    message.usage_metadata = {
+      "input_tokens": prompt_tokens,
+      "output_tokens": completion_tokens,
+      "total_tokens": prompt_tokens + completion_tokens,
+    }
+    return ChatResult(generations=[ChatGeneration(message=message)])
+
+  def bind_tools(self, tools, **kwargs):
+    return self
+
+  def with_structured_output(self, schema, **kwargs):
+    def invoke_structured(prompt):
+      messages = prompt.to_messages() if hasattr(prompt, "to_messages") else prompt
+      if self.structured_responses is not None:
+        return self.structured_responses(messages, schema)
+      return {"query": str(self._next_response(messages).content)}
+    return RunnableLambda(invoke_structured)
+
+
+def create_fake_chat_llm(responses=None, structured_responses=None):
+  """
+    Cria um modelo de chat fake, sem acesso à rede.
+
+    Sem respostas explícitas e com LLM_FAKE_SCRIPT definido, usa o roteiro desse módulo.
+
+    Returns:
+        FakeChatLLM: Modelo de chat local e determinístico.
+    """
+  if responses is None and structured_responses is None and LLM_FAKE_SCRIPT:
+    script = importlib.import_module(LLM_FAKE_SCRIPT)
+    responses, structured_responses = script.responses, script.structured_responses
+  return FakeChatLLM(responses=responses or ["ok"], structured_responses=structured_responses)
@@ -1,30 +1,225 @@
 import os
-from loguru import logger
-from opencensus.ext.azure.log_exporter import AzureLogHandler
+import sys
+import json
+import atexit
 import logging
+import threading
+import traceback
+from collections import deque
+from loguru import logger
 
 # Carregar a variável de ambiente para Application Insights
 APPLICATIONINSIGHTS_CONNECTION_STRING = os.getenv("APPLICATIONINSIGHTS_CONNECTION_STRING")
 
+# Exportação em lotes: o sink só enfileira o registro; uma thread exporta a cada LOG_BATCH_SIZE
+# registros ou LOG_FLUSH_SECONDS segundos. Acima de LOG_BUFFER_SIZE pendentes, os mais antigos são descartados.
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "200"))
+LOG_FLUSH_SECONDS = float(os.getenv("LOG_FLUSH_SECONDS", "2"))
+LOG_BUFFER_SIZE = int(os.getenv("LOG_BUFFER_SIZE", "10000"))
+# Sink local em JSONL (um registro por linha); substitui o Application Insights em testes
+LOG_JSONL_PATH = os.getenv("LOG_JSONL_PATH", "")
+LOG_CONSOLE_LEVEL = os.getenv("LOG_CONSOLE_LEVEL", "DEBUG")
+
+
+def record_to_dict(message) -> dict:
+    """
+    Copia os campos de um registro do loguru para um dict simples, formatado no momento do log.
+    """
+    record = message.record
+    exception = record["exception"]
+    return {
+        "time": record["time"].isoformat(),
+        "timestamp": record["time"].timestamp(),
+        "level": record["level"].name,
+        "levelno": record["level"].no,
+        "name": record["name"],
+        "function": record["function"],
+        "line": record["line"],
+        "file": record["file"].path,
+        "message": record["message"],
+        "text": str(message),
+        "extra": {k: v if isinstance(v, (str, int, float, bool)) else str(v) for k, v in record["extra"].items()},
+        "exc_info": (exception.type, exception.value, exception.traceback) if exception else None,
+    }
+
+
+class BatchingSink:
+    """
+    Sink do loguru que não bloqueia quem loga: o registro é copiado para um buffer limitado e
+    exportado em lotes por uma thread em segundo plano.
+
+    O lote é exportado quando atinge `batch_size` registros ou a cada `flush_seconds`. Com o buffer
+    cheio, o registro mais antigo é descartado e contado em `dropped`. Falhas do exportador
+    contam em `failed` e não interrompem a thread.
+    """
+
+    def __init__(self, name: str, export_batch, batch_size: int = LOG_BATCH_SIZE,
+                 flush_seconds: float = LOG_FLUSH_SECONDS, max_buffer: int = LOG_BUFFER_SIZE):
+        self.name = name
+        self.export_batch = export_batch
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.buffer = deque()
+        self.max_buffer = max_buffer
+        self.metrics = {"queued": 0, "exported": 0, "dropped": 0, "failed": 0, "batches": 0}
+        self._condition = threading.Condition()
+        self._exporting = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name=f"log-export-{name}", daemon=True)
+        self._thread.start()
+
+    def __call__(self, message):
+        entry = record_to_dict(message)
+        with self._condition:
+            if len(self.buffer) >= self.max_buffer:
+                self.buffer.popleft()
+                self.metrics["dropped"] += 1
+            self.buffer.append(entry)
+            self.metrics["queued"] += 1
+            if len(self.buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def _take(self) -> list:
+        with self._condition:
+            count = min(len(self.buffer), self.batch_size)
+            return [self.buffer.popleft() for _ in range(count)]
+
+    def _export(self, batch: list):
+        try:
+            self.export_batch(batch)
+            with self._condition:
+                self.metrics["exported"] += len(batch)
+                self.metrics["batches"] += 1
+        except Exception as e:
+            with self._condition:
+                self.metrics["failed"] += len(batch)
+            print(f"Log export ({self.name}) failed: {e}", file=sys.stderr)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._stopped and len(self.buffer) < self.batch_size:
+                    self._condition.wait(self.flush_seconds)
+                if self._stopped and not self.buffer:
+                    return
+            with self._exporting:
+                batch = self._take()
+                if batch:
+                    self._export(batch)
+
+    def flush(self):
+        """
+        Exporta tudo o que está pendente, na thread de quem chama.
+        """
+        with self._exporting:
+            while True:
+                batch = self._take()
+                if not batch:
+                    return
+                self._export(batch)
+
+    def stop(self):
+        self.flush()
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        self._thread.join(timeout=self.flush_seconds + 5)
+
+
+def jsonl_exporter(path: str):
+    """
+    Exportador que acrescenta os registros ao arquivo JSONL, um write por lote.
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    def line(entry: dict) -> str:
+        fields = {k: v for k, v in entry.items() if k not in ("text", "exc_info")}
+        if entry["exc_info"]:
+            fields["exception"] = "".join(traceback.format_exception(*entry["exc_info"]))
+        return json.dumps(fields, ensure_ascii=False)
+
+    def export(batch: list):
+        lines = [line(entry) for entry in batch]
+        with open(path, "a", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+    return export
+
+
+def console_exporter(stream=sys.stdout):
+    """
+    Exportador que escreve o lote já formatado no console, com um único flush.
+    """
+    def export(batch: list):
+        stream.write("".join(entry["text"] for entry in batch))
+        stream.flush()
+    return export
+
+
+def azure_exporter(handler: logging.Handler):
+    """
+    Exportador que repassa os registros ao AzureLogHandler, fora da thread da requisição.
+    """
+    def export(batch: list):
+        for entry in batch:
+            record = logging.LogRecord(
+                entry["name"], entry["levelno"], entry["file"], entry["line"],
+                entry["message"], None, entry["exc_info"], entry["function"],
+            )
+            record.created = entry["timestamp"]
+            record.custom_dimensions = entry["extra"]
+            handler.emit(record)
+    return export
+
+
+sinks = []
+
+
+def add_batching_sink(name: str, export_batch, level: str = "INFO", **options) -> BatchingSink:
+    sink = BatchingSink(name, export_batch, **options)
+    logger.add(sink, level=level)
+    sinks.append(sink)
+    return sink
+
+
+def logging_metrics() -> dict:
+    """
+    Retorna, por sink, os registros enfileirados, exportados, descartados e com falha, e o tamanho do buffer.
+    """
+    metrics = {}
+    for sink in sinks:
+        with sink._condition:
+            metrics[sink.name] = {**sink.metrics, "buffered": len(sink.buffer)}
+    return metrics
+
+
+def flush_logs():
+    """
+    Exporta os registros pendentes de todos os sinks (chamado também na saída do processo).
+    """
+    for sink in sinks:
+        sink.flush()
+
+
 # Configurar Loguru
 logger.remove()  # Remove o handler padrão do Loguru
 # logger.add("app.log", rotation="10 MB", retention="7 days", level="INFO")  # Salvar em arquivo
 
 if APPLICATIONINSIGHTS_CONNECTION_STRING:
-    # Criar o AzureLogHandler para o Application Insights
+    # Criar o AzureLogHandler para o Application Insights, alimentado em lotes pela thread de exportação
+    from opencensus.ext.azure.log_exporter import AzureLogHandler  # importado só quando configurado
+
     azure_handler = AzureLogHandler(connection_string=APPLICATIONINSIGHTS_CONNECTION_STRING)
+    add_batching_sink("azure", azure_exporter(azure_handler), level="INFO")
 
-    # Criar um interceptor para direcionar logs do Loguru para o Application Insights
-    class InterceptHandler(logging.Handler):
-        def emit(self, record):
-            # Repassa os logs do Loguru para o AzureLogHandler
-            azure_handler.emit(record)
+if LOG_JSONL_PATH:
+    add_batching_sink("jsonl", jsonl_exporter(LOG_JSONL_PATH), level="DEBUG")
 
-    # Adicionar o InterceptHandler ao Loguru
-    logger.add(InterceptHandler(), level="INFO")
+# Console: mesmo pipeline em lotes, sem flush a cada mensagem
+add_batching_sink("console", console_exporter(), level=LOG_CONSOLE_LEVEL)
+
+atexit.register(flush_logs)
 
 # Configuração para usar o logger em todos os módulos
 logger.info("Logger configurado com sucesso!")
-
-# Exemplo de como adicionar um log adicional no console (opcional):
-logger.add(lambda msg: print(msg, flush=True), level="DEBUG")
@@ -0,0 +1,30 @@
+from pymongo import MongoClient
+
+
+def save_conversation(client, conversation):
+    db = client['TimeCodeBot']
+    collection = db['conversations']
+    result = collection.insert_one(conversation)
+    print(f"New conversation inserted with the following id: {result.inserted_id}")
+
+
+
+def get_connection(username, password, db_name):
+    """
+    Estabelece uma conexão com o DocumentDB usando as credenciais fornecidas.
+
+    Returns:
+        pymongo.MongoClient: Uma instância do cliente MongoDB configurada com as credenciais e SSL.
+    """
+
+    # "connectionString": "mongodb+srv://<user>:<password>@db-to-vectorstore.mongocluster.cosmos.azure.com/?tls=true&authMechanism=SCRAM-SHA-256&retrywrites=false&maxIdleTimeMS=120000"
+    url = f"mongodb+srv://{username}:{password}@{db_name}.mongocluster.cosmos.azure.com/?tls=true&authMechanism=SCRAM-SHA-256&retrywrites=false&maxIdleTimeMS=120000"
+    try:
+        # logger.info("Connecting to CosmoDB...")
+        client = MongoClient(url)
+        print("Successful!")
+        # logger.info("Successful!")
+    except Exception as e:
+        print(e)
+        # logger.error(f"MongoClient: Error connecting to CosmoDB: {e}")
+    return client
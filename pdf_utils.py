@@ -0,0 +1,72 @@
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from reportlab.lib.units import inch
+import re
+
+
+def create_pdf(filename, text):
+    """Converte markdown simples em elementos formatados para PDF."""
+    lines = text.split("\n")
+    formatted_elements = []
+    
+    styles = getSampleStyleSheet()
+    title_style = styles["Title"]
+    subtitle_style = styles["Heading1"]
+    subsubtitle_style = styles["Heading2"]
+    normal_style = styles["BodyText"]
+
+    for line in lines:
+        line = line.strip()
+        
+        if line.startswith("### "):  # Subtítulo menor
+            formatted_elements.append(Paragraph(line[4:], subsubtitle_style))
+        elif line.startswith("## "):  # Subtítulo
+            formatted_elements.append(Paragraph(line[3:], subtitle_style))
+        elif line.startswith("# "):  # Título principal
+            formatted_elements.append(Paragraph(line[2:], title_style))
+        elif "**" in line:  # Negrito
+            line = re.sub(r"\*\*(.*?)\*\*", r"<b>\1</b>", line)  # Converte **texto** para <b>texto</b>
+            formatted_elements.append(Paragraph(line, normal_style))
+        else:  # Texto normal
+            formatted_elements.append(Paragraph(line, normal_style))
+        
+        formatted_elements.append(Spacer(1, 0.2 * inch))
+
+
+    """Cria um PDF formatado a partir de texto markdown-like."""
+    doc = SimpleDocTemplate(filename, pagesize=A4)
+    doc.build(formatted_elements)
+    print("PDF generated.")
+
+
+
+def txt_para_pdf(arquivo_txt, arquivo_pdf):
+    # Criar o documento PDF
+    doc = SimpleDocTemplate(arquivo_pdf, pagesize=A4)
+    estilos = getSampleStyleSheet()
+    
+    estilo_titulo = ParagraphStyle(
+        "Titulo", parent=estilos["Heading1"], spaceAfter=12
+    )
+    estilo_texto = estilos["BodyText"]
+
+    elementos = []
+
+    with open(arquivo_txt, "r", encoding="utf-8") as file:
+        for linha in file:
+            linha = linha.strip()
+
+            # Identificar títulos no formato ###
+            if linha.startswith("###"):
+                titulo = linha[3:].strip()
+                elementos.append(Paragraph(f"<b>{titulo}</b>", estilo_titulo))
+                elementos.append(Spacer(1, 12))
+            else:
+                # Substituir **texto** por <b>texto</b> para negrito
+                linha_formatada = re.sub(r'\*\*(.*?)\*\*', r'<b>\1</b>', linha)
+                elementos.append(Paragraph(linha_formatada, estilo_texto))
+                elementos.append(Spacer(1, 6))
+
+    doc.build(elementos)
+    print(f"PDF gerado com sucesso: {arquivo_pdf}")
@@ -0,0 +1,53 @@
+import os
+import threading
+import functools
+from tracing import tracer
+
+
+# Aquecimento dos singletons na inicialização: "off" (padrão; construídos na primeira requisição),
+# "background" (thread em segundo plano, sem atrasar o início do servidor) ou "blocking".
+WARM_UP_MODE = os.getenv("AGENT_WARM_UP", "off")
+
+
+def lazy_singleton(factory):
+    """
+    Transforma uma factory sem argumentos em um getter que constrói o objeto na primeira chamada
+    e devolve a mesma instância nas seguintes.
+
+    Chamadas concorrentes na primeira vez constroem o objeto uma única vez (as demais esperam).
+    A construção é registrada no span `init.<nome>` (sem o prefixo `get_`).
+    """
+    lock = threading.Lock()
+    instance = []
+    span_name = f"init.{factory.__name__.removeprefix('get_')}"
+
+    @functools.wraps(factory)
+    def get():
+        if instance:
+            return instance[0]
+        with lock:
+            if not instance:
+                with tracer.span(span_name):
+                    instance.append(factory())
+        return instance[0]
+
+    get.initialized = lambda: bool(instance)
+    return get
+
+
+def start_warm_up(warm_up, mode: str = WARM_UP_MODE):
+    """
+    Executa o hook de aquecimento conforme o modo: "blocking" na thread atual, "background" em
+    uma thread daemon; "off" não faz nada. Falhas são apenas reportadas: a requisição que usar o
+    singleton tenta construí-lo de novo.
+    """
+    def run():
+        try:
+            warm_up()
+        except Exception as e:
+            print(f"Warm-up failed: {e}")
+
+    if mode == "blocking":
+        run()
+    elif mode == "background":
+        threading.Thread(target=run, name="warm-up", daemon=True).start()
@@ -0,0 +1,326 @@
+import os
+import sys
+import json
+import time
+import atexit
+import uuid
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from collections import deque
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")  # opt-in, e.g. logs/traces.jsonl
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+TRACE_EXPORT_BACKUPS = int(os.getenv("TRACE_EXPORT_BACKUPS", "5"))
+TRACE_EXPORT_BUFFER = int(os.getenv("TRACE_EXPORT_BUFFER", "10000"))
+TRACE_FLUSH_SECONDS = float(os.getenv("TRACE_FLUSH_SECONDS", "2"))
+TRACE_METRICS_WINDOW = int(os.getenv("TRACE_METRICS_WINDOW", "2048"))
+
+# Upper bounds (ms) of the cumulative latency buckets reported by /metrics.
+LATENCY_BUCKETS_MS = (10, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 20000, 60000)
+# Numeric span attributes summed per span name in the metrics.
+SUMMED_ATTRIBUTES = ("llm.prompt_tokens", "llm.completion_tokens", "sql.rows", "model.rows")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """
+    A timed operation of a request (graph node, tool, LLM call, model fit/predict).
+
+    Spans started while another one is current become its children and share its trace id.
+    """
+
+    def __init__(self, name: str, parent=None, attributes: dict = None):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def add(self, key: str, amount):
+        self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    def end(self):
+        if self.duration_ms is None:
+            self.duration_ms = (time.perf_counter() - self._started) * 1000
+
+    def to_dict(self) -> dict:
+        """
+        Exported form, following the field names of the OpenTelemetry JSON span.
+        """
+        return {
+            "name": self.name,
+            "context": {"trace_id": self.trace_id, "span_id": self.span_id},
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.start_time + (self.duration_ms or 0.0) / 1000,
+            "duration_ms": self.duration_ms,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class JsonlSpanExporter:
+    """
+    Appends finished spans to a JSONL file, one span per line, from a background thread.
+
+    `export` only queues the span, so the request thread never touches the file. The thread
+    serializes and writes the queued spans in one batch every `flush_seconds`. Above `max_buffer`
+    pending spans the oldest are dropped (counted in `dropped`). The file is rotated once it
+    reaches `max_bytes`, keeping `backups` older files (path.1 is the most recent).
+    """
+
+    def __init__(self, path: str, max_bytes: int = TRACE_EXPORT_MAX_BYTES, backups: int = TRACE_EXPORT_BACKUPS,
+                 max_buffer: int = TRACE_EXPORT_BUFFER, flush_seconds: float = TRACE_FLUSH_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.max_buffer = max_buffer
+        self.flush_seconds = flush_seconds
+        self.dropped = 0
+        self._buffer = deque()
+        self._condition = threading.Condition()
+        self._writing = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+        self._thread.start()
+        atexit.register(self.flush)
+
+    def export(self, span: Span):
+        with self._condition:
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.dropped += 1
+            self._buffer.append(span)
+
+    def _take(self) -> list:
+        with self._condition:
+            batch = list(self._buffer)
+            self._buffer.clear()
+        return batch
+
+    def _rotate(self):
+        if not os.path.exists(self.path) or os.path.getsize(self.path) < self.max_bytes:
+            return
+        if self.backups < 1:
+            os.remove(self.path)
+            return
+        for index in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{index}"):
+                os.replace(f"{self.path}.{index}", f"{self.path}.{index + 1}")
+        os.replace(self.path, f"{self.path}.1")
+
+    def _write(self, batch: list):
+        lines = "".join(json.dumps(span.to_dict(), ensure_ascii=False, default=str) + "\n" for span in batch)
+        try:
+            self._rotate()
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(lines)
+        except OSError as e:
+            print(f"Tracing: could not export {len(batch)} spans ({e})", file=sys.stderr)
+
+    def flush(self):
+        """
+        Writes the queued spans in the caller's thread (also called at process exit).
+        """
+        with self._writing:
+            batch = self._take()
+            if batch:
+                self._write(batch)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait(self.flush_seconds)
+            self.flush()
+
+
+class SpanMetrics:
+    """
+    Latency distribution of the spans, per span name.
+
+    Percentiles are computed over the last `window` spans of each name; counts, errors, total time,
+    cumulative buckets and the summed attributes (tokens, rows) cover the whole process lifetime.
+    """
+
+    def __init__(self, window: int = TRACE_METRICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def record(self, span: Span):
+        with self._lock:
+            series = self._series.get(span.name)
+            if series is None:
+                series = self._series[span.name] = {
+                    "count": 0, "errors": 0, "total_ms": 0.0, "durations": deque(maxlen=self.window),
+                    "buckets": [0] * (len(LATENCY_BUCKETS_MS) + 1), "totals": {},
+                }
+            series["count"] += 1
+            series["errors"] += span.status != "ok"
+            series["total_ms"] += span.duration_ms
+            series["durations"].append(span.duration_ms)
+            series["buckets"][int(np.searchsorted(LATENCY_BUCKETS_MS, span.duration_ms))] += 1
+            for key in SUMMED_ATTRIBUTES:
+                if isinstance(span.attributes.get(key), (int, float)):
+                    series["totals"][key] = series["totals"].get(key, 0) + span.attributes[key]
+
+    def snapshot(self) -> dict:
+        """
+        Returns, per span name, the count, errors, total time and p50/p95/p99/mean/max latency (ms),
+        the cumulative latency buckets and the summed attributes.
+        """
+        with self._lock:
+            series = {name: {**s, "durations": np.array(s["durations"]), "buckets": list(s["buckets"]),
+                             "totals": dict(s["totals"])} for name, s in self._series.items()}
+        snapshot = {}
+        for name, s in sorted(series.items()):
+            p50, p95, p99 = np.percentile(s["durations"], [50, 95, 99])
+            cumulative = np.cumsum(s["buckets"]).tolist()
+            snapshot[name] = {
+                "count": s["count"],
+                "errors": s["errors"],
+                "total_ms": round(s["total_ms"], 2),
+                "p50_ms": round(float(p50), 2),
+                "p95_ms": round(float(p95), 2),
+                "p99_ms": round(float(p99), 2),
+                "mean_ms": round(float(s["durations"].mean()), 2),
+                "max_ms": round(float(s["durations"].max()), 2),
+                "buckets_ms": {**{str(b): c for b, c in zip(LATENCY_BUCKETS_MS, cumulative)}, "+Inf": cumulative[-1]},
+                "totals": s["totals"],
+            }
+        return snapshot
+
+
+class Tracer:
+    """
+    Records spans, exports them and feeds the latency metrics.
+    """
+
+    def __init__(self, exporter: JsonlSpanExporter = None, metrics: SpanMetrics = None):
+        self.exporter = exporter
+        self.metrics = metrics or SpanMetrics()
+
+    def start(self, name: str, parent: Span = None, **attributes) -> Span:
+        """
+        Starts a span without making it current (e.g. for callbacks that end it elsewhere).
+        """
+        return Span(name, parent if parent is not None else _current_span.get(), attributes)
+
+    def finish(self, span: Span):
+        span.end()
+        self.metrics.record(span)
+        if self.exporter is not None:
+            try:
+                self.exporter.export(span)
+            except OSError as e:
+                print(f"Tracing: could not export span {span.name} ({e})")
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """
+        Runs the block in a new span, current for the operations started inside it.
+        """
+        span = self.start(name, **attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            if not isinstance(e, GeneratorExit):
+                span.status = "error"
+                span.set("error", repr(e)[:500])
+            raise
+        finally:
+            try:
+                _current_span.reset(token)
+            except ValueError:
+                # Ended from another context (e.g. a generator closed by another thread).
+                _current_span.set(span.parent)
+            self.finish(span)
+
+    def traced(self, name: str = None):
+        """
+        Decorator running each call of the function in a span named after it.
+        """
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.span(name or fn.__name__):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+
+def current_span() -> Span:
+    """
+    Returns the current span, or a detached one when there is none, so callers can always set attributes.
+    """
+    return _current_span.get() or Span("detached")
+
+
+class SpanCallbackHandler(BaseCallbackHandler):
+    """
+    Records each chat model call as an 'llm' span, child of the current span, with its token usage.
+
+    The tokens are also added to the parent span, so a node span carries the tokens of the LLM
+    calls it made.
+    """
+
+    run_inline = True
+
+    def __init__(self, tracer: Tracer):
+        self.tracer = tracer
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        span = self.tracer.start("llm", model=(kwargs.get("metadata") or {}).get("ls_model_name", ""))
+        with self._lock:
+            self._spans[run_id] = span
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens", 0)
+        completion_tokens = usage.get("completion_tokens", 0)
+        if not usage:
+            for generation in (g for batch in response.generations for g in batch):
+                usage_metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+                prompt_tokens += usage_metadata.get("input_tokens", 0)
+                completion_tokens += usage_metadata.get("output_tokens", 0)
+        for target in (span, span.parent):
+            if target is not None:
+                target.add("llm.prompt_tokens", prompt_tokens)
+                target.add("llm.completion_tokens", completion_tokens)
+        self.tracer.finish(span)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            span = self._spans.pop(run_id, None)
+        if span is not None:
+            span.status = "error"
+            span.set("error", repr(error)[:500])
+            self.tracer.finish(span)
+
+
+tracer = Tracer(JsonlSpanExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None)
+traced = tracer.traced
+span_handler = SpanCallbackHandler(tracer)
@@ -1,28 +1,36 @@
-import pandas as pd
+import os
 import joblib
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.model_selection import train_test_split
-
-# Suponha que df_receivable já esteja carregado
+from agents.agent_predict_tools import (
+    train_from_store, OVERDUE_FEATURES, OVERDUE_TARGET, LIQUIDITY_FEATURES, LIQUIDITY_TARGET,
+)
+from agents.model_registry import registry
+from db.feature_store import get_feature_store
 
-df_receivable = pd.read_excel("inputs/Databases/versao_demo/trades_receivable.xlsx")  
-df_receivable['overdue_ratio'] = df_receivable['overdue'] / df_receivable['trades_receivable']
-df_receivable['month'] = pd.to_datetime(df_receivable['month_year']).dt.month
-df_receivable['year'] = pd.to_datetime(df_receivable['month_year']).dt.year
-df_receivable['country_encoded'] = df_receivable['country'].astype('category').cat.codes
+# Treina offline os modelos usados pelas ferramentas preditivas e registra no model registry.
+# As features vêm do feature store (db/aa-finance-features.db), atualizado aqui de forma incremental;
+# as ferramentas carregam o artefato (memory-mapped) enquanto a tabela não mudar.
+# O modelo de inadimplência também é gravado em FUNCTION_MODEL_PATH, o artefato que a Azure Function
+# (demo/live_demo/LiquidezFunction) carrega no cold start: rode este script antes de publicá-la.
+FUNCTION_MODEL_PATH = os.getenv(
+    "FUNCTION_MODEL_PATH", "demo/live_demo/LiquidezFunction/overdue_model.joblib"
+)
 
-features = ['dso', 'sales', 'cei', 'art', 'month', 'year', 'country_encoded']
-target = 'overdue_ratio'
+models = [
+    ("trades_receivable", OVERDUE_FEATURES, OVERDUE_TARGET),
+    ("working_capital", LIQUIDITY_FEATURES, LIQUIDITY_TARGET),
+]
 
-X = df_receivable[features]
-y = df_receivable[target]
+feature_store = get_feature_store()
 
-X_train, X_test, y_train, y_test = train_test_split(
-    X, y, test_size=0.2, random_state=42
-)
+for table_name, features, target in models:
+    feature_store.refresh(table_name)
+    # O artefato guarda o modelo junto com o vocabulário das categorias (country, due_interval)
+    model = train_from_store(table_name, features, target, feature_store)
 
-model = RandomForestRegressor(n_estimators=100, random_state=42)
-model.fit(X_train, y_train)
+    # Salvar o modelo
+    path = registry.register(table_name, features, feature_store.fingerprint(table_name), model)
+    print(f"{table_name}: model saved to {path}")
 
-# Salvar o modelo
-joblib.dump(model, "overdue_risk_model.joblib")
+    if table_name == "trades_receivable" and FUNCTION_MODEL_PATH:
+        joblib.dump(model, FUNCTION_MODEL_PATH)
+        print(f"{table_name}: function artifact saved to {FUNCTION_MODEL_PATH}")